@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+# A development tool, run from a checkout rather than shipped with the
+# application: python benchmarks/bench.py --profile quick
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from cli import progress_printer
+from core.capacity import payload_capacity
+from core.plan import BINARY_ENCRYPTION
+from core.settings import Settings
+
+# Reproducible encode/decode benchmarks. Synthetic carriers of growing size are
+# generated from a fixed seed, every combination of the profile's settings is
+# encoded and decoded with LSBEncoder/LSBDecoder, and the timings are saved as
+# JSON so runs before and after a change can be compared.
+#
+# Results format:
+#
+#   {
+#     "meta": {"profile": "quick", "python": "3.11.4", "numpy": "2.4.6", ...},
+#     "results": [
+#       {"name": "image-1024x1024-p2-RGB-length-none", "media_type": "image", ...,
+#        "encode": {"seconds": 0.41, "mb_per_s": 7.6, "peak_mb": 25.0, "rss_peak_mb": 88.1},
+#        "decode": {...}, "ok": true}
+#     ]
+#   }
+
+# Image sizes as (width, height), up to 8K UHD
+IMAGE_SIZES = {
+    "quick": [(256, 256), (512, 512), (1024, 1024)],
+    "full": [(256, 256), (512, 512), (1024, 1024), (2048, 2048), (4096, 4096), (7680, 4320)],
+}
+# Audio lengths in seconds, up to an hour
+AUDIO_SECONDS = {
+    "quick": [1, 10],
+    "full": [1, 10, 60, 600, 3600],
+}
+PROFILES = tuple(IMAGE_SIZES)
+
+BIT_PLANES = [1, 2, 4]
+IMAGE_CHANNEL_SETS = [["R", "G", "B"], ["G"]]
+AUDIO_CHANNEL_SETS = [["L", "R"], ["L"]]
+DELIMITERS = ["NULL Terminator", "Magic Sequence", "Length Prefix"]
+ENCRYPTIONS = ["None", "AES", "AES-GCM", "AES Stream"]
+
+SAMPLERATE = 44100
+AUDIO_CHANNELS = 2
+SEED = 1234
+
+# Share of the carrier's payload capacity filled, and an upper bound so the
+# largest carriers measure embedding rather than encryption
+PAYLOAD_FILL = 0.5
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+# Password used for the encrypted cases
+PASSWORD = "benchmark"
+
+MB = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class BenchCase:
+    media_type: str
+    size: tuple          # (width, height) for images, (seconds,) for audio
+    bit_planes: int
+    channels: tuple
+    delimiter: str
+    encryption: str
+
+    @property
+    def name(self) -> str:
+        size = "x".join(map(str, self.size)) if self.media_type == "image" else f"{self.size[0]}s"
+        delimiter = self.delimiter.split()[0].lower()
+        return f"{self.media_type}-{size}-p{self.bit_planes}-{''.join(self.channels)}-{delimiter}-{self.encryption.lower().replace(' ', '-')}"
+
+    def settings(self) -> Settings:
+        key = "color_channels" if self.media_type == "image" else "audio_channels"
+        settings = Settings()
+        settings.update_settings({
+            "bit_planes": self.bit_planes,
+            key: list(self.channels),
+            "delimiter": self.delimiter,
+            "encryption": self.encryption,
+            "password": PASSWORD,
+        })
+        return settings
+
+
+def build_cases(profile: str = "quick", media_types=("image", "audio"), name_filter: str = None) -> list:
+    # Every size of the profile crossed with every settings combination
+    cases = []
+    for media_type in media_types:
+        if media_type == "image":
+            sizes, channel_sets = IMAGE_SIZES[profile], IMAGE_CHANNEL_SETS
+        else:
+            sizes, channel_sets = [(s,) for s in AUDIO_SECONDS[profile]], AUDIO_CHANNEL_SETS
+        for size, bit_planes, channels, delimiter, encryption in itertools.product(
+                sizes, BIT_PLANES, channel_sets, DELIMITERS, ENCRYPTIONS):
+            if encryption in BINARY_ENCRYPTION and delimiter != "Length Prefix":
+                continue
+            case = BenchCase(media_type, tuple(size), bit_planes, tuple(channels), delimiter, encryption)
+            if name_filter is None or name_filter in case.name:
+                cases.append(case)
+    return cases
+
+
+def make_carrier(media_type: str, size: tuple, directory: str, image_suffix: str = ".png") -> str:
+    # Noise carrier of the given size, written once per size and reused
+    rng = np.random.default_rng(SEED)
+    if media_type == "image":
+        from PIL import Image
+
+        width, height = size
+        path = os.path.join(directory, f"carrier_{width}x{height}{image_suffix}")
+        if not os.path.exists(path):
+            pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            Image.fromarray(pixels, "RGB").save(path)
+        return path
+
+    import soundfile as sf
+
+    path = os.path.join(directory, f"carrier_{size[0]}s.wav")
+    if not os.path.exists(path):
+        # Written in blocks so an hour of audio never sits in memory
+        frames = size[0] * SAMPLERATE
+        with sf.SoundFile(path, "w", SAMPLERATE, AUDIO_CHANNELS, subtype="PCM_16") as dst:
+            for start in range(0, frames, SAMPLERATE * 60):
+                count = min(SAMPLERATE * 60, frames - start)
+                dst.write(rng.integers(-32768, 32768, (count, AUDIO_CHANNELS), dtype=np.int16))
+    return path
+
+
+def carrier_bytes(case: BenchCase) -> int:
+    # Size of the carrier's samples, which throughput is measured against
+    if case.media_type == "image":
+        return case.size[0] * case.size[1] * 3
+    return case.size[0] * SAMPLERATE * AUDIO_CHANNELS * 2
+
+
+def _reset_rss_peak() -> bool:
+    # Linux lets a process reset its resident set high-water mark
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss_peak_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def measure(fn, repeat: int = 1, memory: bool = True) -> dict:
+    # Best wall time of repeat calls to fn, and the peak memory of one more
+    # call. peak_mb counts Python and NumPy allocations (tracemalloc);
+    # rss_peak_mb is the process high-water mark where the OS can reset it,
+    # which also covers Pillow's buffers but includes everything else loaded.
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    stats = {"seconds": min(seconds)}
+
+    if memory:
+        rss_reset = _reset_rss_peak()
+        tracemalloc.start()
+        try:
+            fn()
+            stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / MB
+        finally:
+            tracemalloc.stop()
+        stats["rss_peak_mb"] = _rss_peak_mb() if rss_reset else None
+    return stats
+
+
+def run_case(case: BenchCase, directory: str, repeat: int = 1, memory: bool = True, image_suffix: str = ".png") -> dict:
+    from core.decoders.lsb import LSBDecoder
+    from core.encoders.lsb import LSBEncoder
+
+    carrier = make_carrier(case.media_type, case.size, directory, image_suffix)
+    suffix = os.path.splitext(carrier)[1]
+    output = os.path.join(directory, f"encoded{suffix}")
+    settings = case.settings()
+
+    capacity = payload_capacity(carrier, case.media_type, settings)
+    # No zero bytes, so the NULL terminator cases decode the whole payload
+    length = min(int(capacity * PAYLOAD_FILL), MAX_PAYLOAD)
+    payload = np.random.default_rng(SEED).integers(1, 256, length, dtype=np.uint8).tobytes()
+    encoder, decoder = LSBEncoder(), LSBDecoder()
+    mismatches = []
+
+    def encode():
+        encoder.encode(carrier, payload, settings, output, case.media_type)
+
+    def decode():
+        if decoder.decode(output, settings, case.media_type) != payload:
+            mismatches.append(case.name)
+
+    try:
+        stats = {"encode": measure(encode, repeat, memory), "decode": measure(decode, repeat, memory)}
+    finally:
+        if os.path.exists(output):
+            os.remove(output)
+
+    size = carrier_bytes(case)
+    for op in ("encode", "decode"):
+        stats[op]["mb_per_s"] = size / MB / stats[op]["seconds"]
+    return {
+        "name": case.name,
+        **asdict(case),
+        "carrier_bytes": size,
+        "payload_bytes": len(payload),
+        **stats,
+        "ok": not mismatches,
+    }
+
+
+def run_benchmarks(cases: list, repeat: int = 1, memory: bool = True, directory: str = None,
+                   image_suffix: str = ".png", progress=None):
+    # Yield one result dict per case. Carriers are generated in directory, or
+    # in a temporary directory removed at the end.
+    with contextlib.ExitStack() as stack:
+        if directory is None:
+            directory = stack.enter_context(tempfile.TemporaryDirectory(prefix="stega_bench_"))
+        for done, case in enumerate(cases, start=1):
+            yield run_case(case, directory, repeat, memory, image_suffix)
+            if progress is not None:
+                progress(done, len(cases))
+
+
+def environment(profile: str) -> dict:
+    import PIL
+
+    return {
+        "profile": profile,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float = 0.1) -> list:
+    # One row per case and operation present in both runs. ratio is current
+    # over baseline time; a row regressed when it is slower than baseline by
+    # more than tolerance.
+    reference = {entry["name"]: entry for entry in baseline}
+    rows = []
+    for entry in results:
+        base = reference.get(entry["name"])
+        if base is None:
+            continue
+        for op in ("encode", "decode"):
+            before, after = base[op]["seconds"], entry[op]["seconds"]
+            ratio = after / before if before else float("inf")
+            rows.append({
+                "name": entry["name"],
+                "operation": op,
+                "baseline": before,
+                "current": after,
+                "ratio": ratio,
+                "regressed": ratio > 1 + tolerance,
+            })
+    return rows
+
+
+def format_result(entry: dict) -> str:
+    parts = [f"{entry['name']:<40}"]
+    for op in ("encode", "decode"):
+        stats = entry[op]
+        part = f"{op} {stats['seconds'] * 1000:9.1f} ms {stats['mb_per_s']:8.1f} MB/s"
+        if stats.get("peak_mb") is not None:
+            part += f" {stats['peak_mb']:7.1f} MB"
+        parts.append(part)
+    if not entry["ok"]:
+        parts.append("MISMATCH")
+    return "  ".join(parts)
+
+
+def format_comparison(row: dict) -> str:
+    flag = "  REGRESSED" if row["regressed"] else ""
+    return (f"{row['name']:<40}  {row['operation']}  {row['baseline'] * 1000:9.1f} ms -> "
+            f"{row['current'] * 1000:9.1f} ms  x{row['ratio']:.2f}{flag}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="bench", description="Benchmark encoding and decoding on synthetic carriers.")
+    parser.add_argument("--profile", choices=PROFILES, default="quick",
+                        help="Carrier sizes to run: quick, or full up to 8K images and an hour of audio")
+    parser.add_argument("--media", choices=["image", "audio"], help="Only benchmark this media type")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text, e.g. p2-RGB")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the best is kept (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the extra run that measures peak memory")
+    parser.add_argument("--image-format", choices=[".png", ".bmp"], default=".png", help="Image carrier format")
+    parser.add_argument("--workdir", help="Keep generated carriers here instead of a temporary directory")
+    parser.add_argument("-o", "--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="Compare against the JSON results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Slowdown over the baseline counted as a regression (default: 0.1)")
+    parser.add_argument("--progress", action="store_true", help="Show progress on stderr")
+    return parser
+
+
+def main(argv=None) -> int:
+    # The JSON report goes to stdout (or -o); per-case lines and the baseline
+    # comparison go to stderr. Exits 1 on a mismatch or a regression.
+    args = build_parser().parse_args(argv)
+    progress = progress_printer(sys.stderr) if args.progress else None
+    media_types = [args.media] if args.media else ["image", "audio"]
+    cases = build_cases(args.profile, media_types, args.filter)
+    results = []
+    for entry in run_benchmarks(cases, repeat=args.repeat, memory=not args.no_memory, directory=args.workdir,
+                                image_suffix=args.image_format, progress=progress):
+        results.append(entry)
+        print(format_result(entry), file=sys.stderr)
+
+    report = {"meta": environment(args.profile), "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        sys.stdout.write(json.dumps(report, indent=2) + "\n")
+
+    failed = sum(not entry["ok"] for entry in results)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.tolerance)
+        for row in rows:
+            print(format_comparison(row), file=sys.stderr)
+        regressed = sum(row["regressed"] for row in rows)
+        print(f"{regressed} of {len(rows)} timings regressed by more than {args.tolerance:.0%}", file=sys.stderr)
+        failed += regressed
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+
+from core.algo_configs import default_settings, get_algorithm_config
+from core.media import detect_media_type
+from core.progress import CancelToken, CarrierModified, OperationCancelled
+from core.settings import Settings
+
+# Headless entry point. Only core modules are imported here; the encoders and
+# decoders pull in PIL or soundfile for the media type actually used, and
+# nothing imports Qt or matplotlib.
+
+
+def build_settings(args, media_type: str, operation: str) -> Settings:
+    # Start from the same defaults the GUI panel shows, then apply the flags
+    values = default_settings(get_algorithm_config(f"{media_type}_{operation}", args.algorithm))
+    if args.bit_planes is not None:
+        values["bit_planes"] = args.bit_planes
+    if args.channels is not None:
+        key = "color_channels" if media_type == "image" else "audio_channels"
+        values[key] = [c.strip().upper() for c in args.channels.split(",") if c.strip()]
+    if args.delimiter is not None:
+        values["delimiter"] = args.delimiter
+    if args.encryption is not None:
+        values["encryption"] = args.encryption
+    # Compression is recorded in the payload header; decoding needs no flag
+    if operation == "encode" and args.compression is not None:
+        values["compression"] = args.compression
+    if operation == "encode" and args.compression_level is not None:
+        values["compression_level"] = args.compression_level
+    password = args.password if args.password is not None else os.environ.get("STEGA_PAL_PASSWORD")
+    if password is not None:
+        values["password"] = password
+
+    settings = Settings()
+    settings.update_settings(values)
+    return settings
+
+
+def engine_options(args) -> dict:
+    # Encoder/decoder options given on the command line
+    return {"memory_budget": args.memory_budget} if args.memory_budget is not None else {}
+
+
+def run_encode(args, out, progress=None, cancel=None) -> int:
+    from core.encoders import get_encoder
+
+    media_type = args.media or detect_media_type(args.carrier)
+    settings = build_settings(args, media_type, "encode")
+    output = args.output
+    if output is None:
+        root, ext = os.path.splitext(args.carrier)
+        output = f"{root}_steg{ext}"
+    with open(args.payload, 'rb') as f:
+        payload = f.read()
+
+    encoder = get_encoder(media_type, args.algorithm, **engine_options(args))
+    result = encoder.encode(args.carrier, payload, settings, output, media_type, in_place=args.in_place,
+                            progress=progress, cancel=cancel)
+    out.write(f"{result.output_path}\n")
+    return 0
+
+
+def run_decode(args, out, progress=None, cancel=None) -> int:
+    from core.decoders import get_decoder
+
+    media_type = args.media or detect_media_type(args.carrier)
+    settings = build_settings(args, media_type, "decode")
+
+    # Framed payloads are written out as they are extracted
+    decoder = get_decoder(media_type, args.algorithm, **engine_options(args))
+    chunks = decoder.iter_decode(args.carrier, settings, media_type, max_bytes=args.max_bytes,
+                                 progress=progress, cancel=cancel)
+    if args.output:
+        try:
+            with open(args.output, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except BaseException:
+            # Do not leave a partial or unverified payload behind
+            if os.path.exists(args.output):
+                os.remove(args.output)
+            raise
+    else:
+        for chunk in chunks:
+            out.buffer.write(chunk)
+    return 0
+
+
+def run_capacity(args, out, progress=None, cancel=None) -> int:
+    media_type = args.media or detect_media_type(args.carrier)
+    from core.capacity import carrier_info, payload_capacity_for, raw_capacity
+    from core.plan import EmbeddingPlan
+
+    plan = EmbeddingPlan.from_settings(build_settings(args, media_type, "encode"), media_type, args.algorithm)
+    info = carrier_info(args.carrier, media_type)
+    capacity = raw_capacity(info, plan) if args.raw else payload_capacity_for(info, plan)
+    out.write(f"{capacity}\n")
+    return 0
+
+
+def run_batch(args, out, progress=None, cancel=None) -> int:
+    from core.batch import load_manifest, run_batch as run_jobs
+
+    jobs = load_manifest(args.manifest, args.operation)
+    password = args.password if args.password is not None else os.environ.get("STEGA_PAL_PASSWORD")
+    if password is not None:
+        for job in jobs:
+            job.settings.setdefault("password", password)
+    if args.memory_budget is not None:
+        for job in jobs:
+            job.memory_budget = job.memory_budget or args.memory_budget
+
+    # One JSON line per job, in the order jobs finish
+    failed = 0
+    for result in run_jobs(jobs, workers=args.workers, retries=args.retries, progress=progress, cancel=cancel):
+        failed += not result.ok
+        out.write(json.dumps(result.to_dict()) + "\n")
+        out.flush()
+    print(f"{len(jobs) - failed} of {len(jobs)} jobs succeeded", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def progress_printer(stream):
+    # progress callback drawing a percentage on one terminal line
+    last = None
+
+    def report(done, total):
+        nonlocal last
+        percent = 100 * done // total if total else 100
+        if percent != last:
+            last = percent
+            stream.write(f"\r{percent:3d}%" + ("\n" if done >= total else ""))
+            stream.flush()
+    return report
+
+
+def mebibytes(value: str) -> int:
+    # --memory-budget value in MiB, as bytes
+    size = int(value)
+    if size <= 0:
+        raise argparse.ArgumentTypeError("must be a positive number of MiB")
+    return size * 1024 * 1024
+
+
+def add_memory_argument(parser):
+    parser.add_argument("--memory-budget", type=mebibytes, metavar="MIB",
+                        help="Memory for each block or strip of the carrier, in MiB (default: 64)")
+
+
+def add_setting_arguments(parser):
+    parser.add_argument("--media", choices=["image", "audio"], help="Carrier media type (default: from extension)")
+    parser.add_argument("--algorithm", default="LSB", help="Steganography algorithm (default: LSB)")
+    parser.add_argument("--bit-planes", type=int, choices=range(1, 5), help="Number of least significant bit planes")
+    parser.add_argument("--channels", help="Comma separated channels, e.g. R,G,B or L,R")
+    parser.add_argument("--delimiter", choices=["NULL Terminator", "Magic Sequence", "Length Prefix", "None"])
+    parser.add_argument("--encryption", choices=["None", "AES", "AES-GCM", "AES Stream"])
+    parser.add_argument("--password", help="Encryption password (default: $STEGA_PAL_PASSWORD)")
+    parser.add_argument("--compression", choices=["None", "Auto", "zlib", "bz2", "lzma"],
+                        help="Compress the payload before embedding (encode only)")
+    parser.add_argument("--compression-level", type=int, choices=range(0, 10), metavar="0-9",
+                        help="Compression level (default: 6)")
+    parser.add_argument("--progress", action="store_true", help="Show progress on stderr")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="stega_pal", description="Hide and extract data in images and audio.")
+    parser.add_argument("--metrics", metavar="FILE", help="Append a JSON line per timing span to FILE")
+    parser.add_argument("--prometheus", metavar="FILE", help="Write span totals to FILE in Prometheus text format")
+    parser.add_argument("--log-spans", action="store_true", help="Log each timing span to stderr")
+    parser.add_argument("--trace-memory", action="store_true", help="Record peak memory per operation (slower)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    encode = subparsers.add_parser("encode", help="Embed a payload file in a carrier")
+    encode.add_argument("carrier")
+    encode.add_argument("payload")
+    encode.add_argument("-o", "--output", help="Output path (default: <carrier>_steg.<ext>)")
+    encode.add_argument("--in-place", action="store_true", help="Patch an uncompressed WAV/BMP carrier directly")
+    add_memory_argument(encode)
+    add_setting_arguments(encode)
+    encode.set_defaults(func=run_encode)
+
+    decode = subparsers.add_parser("decode", help="Extract a payload from a carrier")
+    decode.add_argument("carrier")
+    decode.add_argument("-o", "--output", help="Write the payload here instead of stdout")
+    decode.add_argument("--max-bytes", type=int, help="Stop after this many payload bytes")
+    add_memory_argument(decode)
+    add_setting_arguments(decode)
+    decode.set_defaults(func=run_decode)
+
+    capacity = subparsers.add_parser("capacity", help="Print the largest payload a carrier can hold")
+    capacity.add_argument("carrier")
+    capacity.add_argument("--raw", action="store_true", help="Ignore delimiter and encryption overhead")
+    add_setting_arguments(capacity)
+    capacity.set_defaults(func=run_capacity)
+
+    batch = subparsers.add_parser("batch", help="Run the encode/decode jobs listed in a JSON manifest")
+    batch.add_argument("manifest")
+    batch.add_argument("--operation", choices=["encode", "decode"], help="Operation for jobs that do not name one")
+    batch.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    batch.add_argument("--retries", type=int, default=0, help="Retry failed jobs this many times")
+    batch.add_argument("--password", help="Password for jobs without one (default: $STEGA_PAL_PASSWORD)")
+    add_memory_argument(batch)
+    batch.add_argument("--progress", action="store_true", help="Show progress on stderr")
+    batch.set_defaults(func=run_batch)
+
+    return parser
+
+
+def start_metrics(args) -> list:
+    # Register the span sinks asked for on the command line
+    from core import metrics
+
+    sinks = []
+    if args.log_spans:
+        logging.basicConfig(stream=sys.stderr, format="%(name)s: %(message)s")
+        logging.getLogger("stega_pal.metrics").setLevel(logging.INFO)
+        sinks.append(metrics.LoggingSink())
+    if args.metrics:
+        sinks.append(metrics.JsonLinesSink(args.metrics))
+    if args.prometheus:
+        sinks.append(metrics.PrometheusSink())
+    for sink in sinks:
+        metrics.add_sink(sink, memory=args.trace_memory)
+    return sinks
+
+
+def stop_metrics(args, sinks):
+    from core import metrics
+
+    for sink in sinks:
+        metrics.remove_sink(sink)
+        if isinstance(sink, metrics.PrometheusSink):
+            sink.write(args.prometheus)
+        elif isinstance(sink, metrics.JsonLinesSink):
+            sink.close()
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    out = sys.stdout
+    progress = progress_printer(sys.stderr) if getattr(args, "progress", False) else None
+    sinks = start_metrics(args)
+
+    # Ctrl-C cancels cooperatively so partial output files are cleaned up
+    cancel = CancelToken()
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: cancel.cancel())
+    try:
+        return args.func(args, out, progress, cancel)
+    except CarrierModified as e:
+        print(f"stega_pal: cancelled: {e}", file=sys.stderr)
+        return 130
+    except OperationCancelled:
+        print("stega_pal: cancelled", file=sys.stderr)
+        return 130
+    except (OSError, ValueError) as e:
+        print(f"stega_pal: error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        stop_metrics(args, sinks)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
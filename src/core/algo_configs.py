@@ -39,7 +39,7 @@ LSB_IMAGE_ENCODE = AlgorithmConfig(
             label="Delimiter",
             widget_type=WidgetType.COMBOBOX,
             default="NULL",
-            options=["NULL Terminator", "Magic Sequence", "None"],
+            options=["NULL Terminator", "Magic Sequence", "Length Prefix", "None"],
             tooltip="Type of delimiter to use for the payload."
         ),
         SettingDef(
@@ -56,16 +56,33 @@ LSB_IMAGE_ENCODE = AlgorithmConfig(
             label="Color Channels",
             widget_type=WidgetType.MULTI_CHECKBOX,
             default=["R", "G", "B"],
-            options=["R", "G", "B"],
-            tooltip="Color channels to use for encoding."
+            options=["R", "G", "B", "A"],
+            tooltip="Color channels to use for encoding. A is used on carriers with an alpha channel; grayscale carriers use their gray channel when any of R, G and B is selected."
+        ),
+        SettingDef(
+            key="compression",
+            label="Compression",
+            widget_type=WidgetType.COMBOBOX,
+            default="None",
+            options=["None", "Auto", "zlib", "bz2", "lzma"],
+            tooltip="Compress the payload before encrypting and embedding it. Auto tries each codec on a sample and picks the fastest that compresses about as well as the best. Needs the Length Prefix delimiter."
+        ),
+        SettingDef(
+            key="compression_level",
+            label="Compression Level",
+            widget_type=WidgetType.SPINBOX,
+            default=6,
+            min_value=0,
+            max_value=9,
+            tooltip="Compression level: higher is smaller but slower. Ignored in Auto mode."
         ),
         SettingDef(
             key="encryption",
             label="Encryption",
             widget_type=WidgetType.COMBOBOX,
             default="None",
-            options=["None", "AES"],
-            tooltip="Encrypt the payload before encoding."
+            options=["None", "AES", "AES-GCM", "AES Stream"],
+            tooltip="Encrypt the payload before encoding. AES-GCM stores compact binary ciphertext and AES Stream encrypts large payloads in authenticated segments; both need the Length Prefix delimiter."
         ),
         SettingDef(
             key="password",
@@ -88,7 +105,7 @@ LSB_IMAGE_DECODE = AlgorithmConfig(
             label="Delimiter",
             widget_type=WidgetType.COMBOBOX,
             default="NULL",
-            options=["NULL Terminator", "Magic Sequence", "None"],
+            options=["NULL Terminator", "Magic Sequence", "Length Prefix", "None"],
             tooltip="Type of delimiter to use for the payload."
         ),
         SettingDef(
@@ -105,16 +122,16 @@ LSB_IMAGE_DECODE = AlgorithmConfig(
             label="Color Channels",
             widget_type=WidgetType.MULTI_CHECKBOX,
             default=["R", "G", "B"],
-            options=["R", "G", "B"],
-            tooltip="Color channels to read for decoding."
+            options=["R", "G", "B", "A"],
+            tooltip="Color channels to read for decoding. A is used on carriers with an alpha channel; grayscale carriers use their gray channel when any of R, G and B is selected."
         ),
         SettingDef(
             key="encryption",
             label="Encryption",
             widget_type=WidgetType.COMBOBOX,
             default="None",
-            options=["None", "AES"],
-            tooltip="Encrypt the payload before encoding."
+            options=["None", "AES", "AES-GCM", "AES Stream"],
+            tooltip="Encrypt the payload before encoding. AES-GCM stores compact binary ciphertext and AES Stream encrypts large payloads in authenticated segments; both need the Length Prefix delimiter."
         ),
         SettingDef(
             key="password",
@@ -136,7 +153,7 @@ LSB_AUDIO_ENCODE = AlgorithmConfig(
             label="Delimiter",
             widget_type=WidgetType.COMBOBOX,
             default="NULL",
-            options=["NULL Terminator", "Magic Sequence", "None"],
+            options=["NULL Terminator", "Magic Sequence", "Length Prefix", "None"],
             tooltip="Type of delimiter to use for the payload."
         ),
         SettingDef(
@@ -156,13 +173,30 @@ LSB_AUDIO_ENCODE = AlgorithmConfig(
             options=["L", "R"],
             tooltip="Audio channels to read for encoding."
         ),
+        SettingDef(
+            key="compression",
+            label="Compression",
+            widget_type=WidgetType.COMBOBOX,
+            default="None",
+            options=["None", "Auto", "zlib", "bz2", "lzma"],
+            tooltip="Compress the payload before encrypting and embedding it. Auto tries each codec on a sample and picks the fastest that compresses about as well as the best. Needs the Length Prefix delimiter."
+        ),
+        SettingDef(
+            key="compression_level",
+            label="Compression Level",
+            widget_type=WidgetType.SPINBOX,
+            default=6,
+            min_value=0,
+            max_value=9,
+            tooltip="Compression level: higher is smaller but slower. Ignored in Auto mode."
+        ),
         SettingDef(
             key="encryption",
             label="Encryption",
             widget_type=WidgetType.COMBOBOX,
             default="None",
-            options=["None", "AES"],
-            tooltip="Encrypt the payload before encoding."
+            options=["None", "AES", "AES-GCM", "AES Stream"],
+            tooltip="Encrypt the payload before encoding. AES-GCM stores compact binary ciphertext and AES Stream encrypts large payloads in authenticated segments; both need the Length Prefix delimiter."
         ),
         SettingDef(
             key="password",
@@ -184,7 +218,7 @@ LSB_AUDIO_DECODE = AlgorithmConfig(
             label="Delimiter",
             widget_type=WidgetType.COMBOBOX,
             default="NULL",
-            options=["NULL Terminator", "Magic Sequence", "None"],
+            options=["NULL Terminator", "Magic Sequence", "Length Prefix", "None"],
             tooltip="Type of delimiter to use for the payload."
         ),
         SettingDef(
@@ -209,8 +243,8 @@ LSB_AUDIO_DECODE = AlgorithmConfig(
             label="Encryption",
             widget_type=WidgetType.COMBOBOX,
             default="None",
-            options=["None", "AES"],
-            tooltip="Encrypt the payload before encoding."
+            options=["None", "AES", "AES-GCM", "AES Stream"],
+            tooltip="Encrypt the payload before encoding. AES-GCM stores compact binary ciphertext and AES Stream encrypts large payloads in authenticated segments; both need the Length Prefix delimiter."
         ),
         SettingDef(
             key="password",
@@ -234,4 +268,15 @@ def get_algorithm_config(section_id: str, algorithm_name: str) -> AlgorithmConfi
     config = ALGORITHM_REGISTRY.get(key)
     if not config:
         raise ValueError(f"Algorithm configuration for {section_id} and {algorithm_name} not found.")
-    return config
\ No newline at end of file
+    return config
+
+def default_settings(config: AlgorithmConfig) -> dict:
+    # The values the settings panel starts with. Combobox defaults that are not
+    # among the options fall back to the first option, as the panel does.
+    values = {}
+    for setting in config.settings:
+        default = setting.default
+        if setting.widget_type == WidgetType.COMBOBOX and setting.options and default not in setting.options:
+            default = setting.options[0]
+        values[setting.key] = default
+    return values
@@ -0,0 +1,214 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+
+from core.algo_configs import default_settings, get_algorithm_config
+from core.media import detect_media_type
+from core.plan import BINARY_ENCRYPTION
+from core.progress import ProgressTracker
+from core.settings import Settings
+
+# Batch encoding and decoding. A manifest lists carrier/payload/settings jobs;
+# each job runs in a worker process and results come back as jobs finish.
+#
+# Manifest format (JSON), paths relative to the manifest file:
+#
+#   {
+#     "defaults": {"algorithm": "LSB", "settings": {"delimiter": "Length Prefix"}},
+#     "jobs": [
+#       {"operation": "encode", "carrier": "a.png", "payload": "a.txt", "output": "a_steg.png"},
+#       {"operation": "decode", "carrier": "b_steg.png", "settings": {"bit_planes": 2}}
+#     ]
+#   }
+#
+# "memory_budget" (bytes) in a job or the defaults bounds the blocks and
+# strips the job's encoder or decoder works in.
+#
+# A bare list of jobs is accepted too. Job settings are applied on top of the
+# manifest defaults, which are applied on top of the algorithm's defaults.
+
+OPERATIONS = ("encode", "decode")
+
+
+@dataclass
+class BatchJob:
+    operation: str
+    carrier: str
+    payload: str = None
+    output: str = None
+    media_type: str = None
+    algorithm: str = "LSB"
+    settings: dict = field(default_factory=dict)
+    memory_budget: int = None   # bytes; the encoder's or decoder's default if None
+
+    def output_path(self) -> str:
+        # Explicit output, or the same default names the GUI uses
+        if self.output:
+            return self.output
+        root, ext = os.path.splitext(self.carrier)
+        if self.operation == "encode":
+            return f"{root}_steg{ext}"
+        return f"{root}_payload.bin"
+
+
+@dataclass
+class BatchResult:
+    job: BatchJob
+    ok: bool
+    output: str = None
+    error: str = None
+    size: int = 0
+    seconds: float = 0.0
+    attempts: int = 1
+    index: int = None
+
+    def to_dict(self) -> dict:
+        result = asdict(self)
+        result["job"] = {"operation": self.job.operation, "carrier": self.job.carrier}
+        return result
+
+
+def load_manifest(path: str, operation: str = None) -> list:
+    # Parse a manifest into jobs; operation is used for jobs that do not name one
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    defaults = dict(manifest.get("defaults", {}))
+    default_values = defaults.pop("settings", {})
+    base = os.path.dirname(os.path.abspath(path))
+
+    jobs = []
+    for number, entry in enumerate(manifest.get("jobs", []), start=1):
+        values = {"operation": operation, **defaults, **entry}
+        values["settings"] = {**default_values, **entry.get("settings", {})}
+        if values["operation"] not in OPERATIONS:
+            raise ValueError(f"Manifest job {number}: operation must be 'encode' or 'decode'.")
+        if not values.get("carrier"):
+            raise ValueError(f"Manifest job {number}: no carrier given.")
+        if values["operation"] == "encode" and not values.get("payload"):
+            raise ValueError(f"Manifest job {number}: no payload given.")
+        for key in ("carrier", "payload", "output"):
+            if values.get(key):
+                values[key] = os.path.join(base, values[key])
+        try:
+            jobs.append(BatchJob(**values))
+        except TypeError as e:
+            raise ValueError(f"Manifest job {number}: {e}")
+    return jobs
+
+
+def job_settings(job: BatchJob, media_type: str) -> Settings:
+    config = get_algorithm_config(f"{media_type}_{job.operation}", job.algorithm)
+    settings = Settings()
+    settings.update_settings(default_settings(config))
+    settings.update_settings(job.settings)
+    return settings
+
+
+def run_job(job: BatchJob) -> BatchResult:
+    # Run one job in the current process. Failures are returned, not raised,
+    # so one bad carrier does not stop the batch.
+    from core.decoders import get_decoder
+    from core.encoders import get_encoder
+
+    start = time.perf_counter()
+    options = {"memory_budget": job.memory_budget} if job.memory_budget else {}
+    try:
+        media_type = job.media_type or detect_media_type(job.carrier)
+        settings = job_settings(job, media_type)
+        output = job.output_path()
+        if job.operation == "encode":
+            # The encoder rejects a payload the carrier cannot hold
+            with open(job.payload, 'rb') as f:
+                payload = f.read()
+            encoder = get_encoder(media_type, job.algorithm, **options)
+            output = encoder.encode(job.carrier, payload, settings, output, media_type).output_path
+            size = len(payload)
+        else:
+            decoder = get_decoder(media_type, job.algorithm, **options)
+            size = 0
+            try:
+                with open(output, 'wb') as f:
+                    for chunk in decoder.iter_decode(job.carrier, settings, media_type):
+                        f.write(chunk)
+                        size += len(chunk)
+            except Exception:
+                # The output is only there if open() succeeded
+                if os.path.exists(output):
+                    os.remove(output)
+                raise
+    except Exception as e:
+        return BatchResult(job, ok=False, error=f"{type(e).__name__}: {e}", seconds=time.perf_counter() - start)
+    return BatchResult(job, ok=True, output=output, size=size, seconds=time.perf_counter() - start)
+
+
+def _seed_worker(shared):
+    # Pool initializer: start each worker with the parent's derived keys
+    from core.crypto.keys import key_cache
+
+    key_cache.import_entries(*shared)
+
+
+def shared_keys(jobs: list) -> tuple:
+    # Derive each encode password's key once in this process, for the workers
+    from core.crypto.keys import key_cache
+
+    passwords = {
+        job.settings["password"] for job in jobs
+        if job.operation == "encode" and job.settings.get("encryption") in BINARY_ENCRYPTION
+        and job.settings.get("password")
+    }
+    return key_cache.export_entries(sorted(passwords))
+
+
+# How often a running batch checks its cancel token, in seconds
+CANCEL_POLL_INTERVAL = 0.1
+
+
+def run_batch(jobs: list, workers: int = None, retries: int = 0, progress=None, cancel=None):
+    # Run jobs on a process pool, one worker per core by default, and yield a
+    # BatchResult for each job as it finishes. A failed job is resubmitted up
+    # to retries times and then reported with ok=False.
+    # progress(done, total) counts finished jobs. Cancelling drops the jobs
+    # that have not started, lets running ones finish and raises
+    # OperationCancelled; a token cannot reach into the worker processes.
+    # Encode jobs sharing a password share one key derivation across the pool.
+    jobs = list(jobs)
+    if not jobs:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    tracker = ProgressTracker(progress, cancel)
+    tracker.start(len(jobs))
+
+    # Workers are spawned, not forked: batches are started from GUI worker
+    # threads, and forking a multi-threaded Qt process is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_seed_worker,
+                             initargs=(shared_keys(jobs),)) as pool:
+        pending = {pool.submit(run_job, job): (index, 1) for index, job in enumerate(jobs)}
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                tracker.check()
+                for future in done:
+                    index, attempt = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The worker itself died; the job never reported back
+                        result = BatchResult(jobs[index], ok=False, error=f"{type(e).__name__}: {e}")
+                    if not result.ok and attempt <= retries:
+                        pending[pool.submit(run_job, jobs[index])] = (index, attempt + 1)
+                        continue
+                    result.index = index
+                    result.attempts = attempt
+                    yield result
+                    tracker.update(tracker.done + 1)
+        finally:
+            # Stopped early: drop jobs that have not started yet
+            for future in pending:
+                future.cancel()
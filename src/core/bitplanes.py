@@ -0,0 +1,214 @@
+import numpy as np
+
+# Whole-array helpers shared by the LSB encoders and decoders.
+#
+# A carrier is viewed as a 2-D array of "units" (pixels or audio frames) by
+# channels. Each selected channel of each unit is a "slot" holding bit_planes
+# payload bits, filled in unit-major order. Bit i of a slot carries payload
+# bit (slot * bit_planes + i), matching the original per-pixel loops.
+
+
+# Payload bytes unpacked to bits at a time, keeping memory near the payload size
+PAYLOAD_CHUNK_BYTES = 1 << 18
+
+
+def bits_to_slots(bits: np.ndarray, bit_planes: int) -> np.ndarray:
+    # Pack consecutive groups of bit_planes bits into slot values (LSB first).
+    # A short final group is zero padded, which is what the loop produced
+    # when it cleared every plane of the last channel it touched.
+    if bit_planes == 1:
+        return bits
+    n_slots = -(-len(bits) // bit_planes)
+    padded = np.zeros(n_slots * bit_planes, dtype=np.uint8)
+    padded[:len(bits)] = bits
+    weights = (1 << np.arange(bit_planes, dtype=np.uint8)).astype(np.uint8)
+    return (padded.reshape(n_slots, bit_planes) * weights).sum(axis=1, dtype=np.uint8)
+
+
+def iter_slots(data: bytes, bit_planes: int, chunk_bytes: int = PAYLOAD_CHUNK_BYTES, bitorder: str = "big"):
+    # Yield slot values for the payload bytes (MSB first for bitorder "big"), one chunk at a time.
+    # Chunks are a multiple of bit_planes bytes so no slot straddles two chunks.
+    chunk_bytes = max(bit_planes, chunk_bytes - chunk_bytes % bit_planes)
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_bytes):
+        bits = np.unpackbits(np.frombuffer(view[start:start + chunk_bytes], dtype=np.uint8), bitorder=bitorder)
+        yield bits_to_slots(bits, bit_planes)
+
+
+def iter_stream_slots(chunks, bit_planes: int, bitorder: str = "big"):
+    # iter_slots over a payload arriving as chunks of any size. Up to
+    # bit_planes - 1 bytes are carried between chunks so no slot straddles two
+    # of them; the chunks themselves are read in place.
+    carry = b""
+    for chunk in chunks:
+        view = memoryview(chunk)
+        if carry:
+            head = carry + bytes(view[:bit_planes - len(carry)])
+            view = view[len(head) - len(carry):]
+            if len(head) < bit_planes:
+                carry = head
+                continue
+            yield from iter_slots(head, bit_planes, bitorder=bitorder)
+        usable = len(view) - len(view) % bit_planes
+        if usable:
+            yield from iter_slots(view[:usable], bit_planes, bitorder=bitorder)
+        carry = bytes(view[usable:])
+    if carry:
+        yield from iter_slots(carry, bit_planes, bitorder=bitorder)
+
+
+class PayloadStream:
+    # A payload produced chunk by chunk, e.g. a header followed by cipher
+    # segments, whose total length is known before it is generated. Accepted
+    # wherever the embedders take payload bytes; it can be iterated once.
+
+    def __init__(self, chunks, length: int):
+        self.chunks = chunks
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+def write_slots(units: np.ndarray, channels: list, values: np.ndarray, bit_planes: int, start: int = 0) -> int:
+    # Write slot values into units in place, beginning at slot index start.
+    # Values that do not fit are dropped; returns the number written.
+    n_channels = len(channels)
+    if n_channels == 0:
+        return 0
+    count = min(len(values), units.shape[0] * n_channels - start)
+    if count <= 0:
+        return 0
+    first = start // n_channels
+    last = -(-(start + count) // n_channels)
+    offset = start - first * n_channels
+
+    keep = np.array(~((1 << bit_planes) - 1)).astype(units.dtype)
+    selected = np.ascontiguousarray(units[first:last][:, channels])
+    flat = selected.reshape(-1)[offset:offset + count]
+    flat[:] = (flat & keep) | values[:count].astype(units.dtype)
+    units[first:last, channels] = selected
+    return count
+
+
+def embed_bytes(units: np.ndarray, channels: list, data: bytes, bit_planes: int, bitorder: str = "big") -> int:
+    # Embed payload bytes into the leading slots of units; returns slots written
+    return embed_blocks([units], channels, data, bit_planes, bitorder=bitorder)
+
+
+def embed_blocks(blocks, channels: list, data: bytes, bit_planes: int, tracker=None, bitorder: str = "big") -> int:
+    # Embed payload bytes across consecutive blocks of units, pulling blocks
+    # only until the payload is written; returns slots written. tracker, a
+    # ProgressTracker, is updated with the slots written after each block.
+    writer = SlotWriter(data, channels, bit_planes, bitorder)
+    for units in blocks:
+        writer.write(units)
+        if tracker is not None:
+            tracker.update(writer.written)
+        if writer.done:
+            break
+    return writer.written
+
+
+def payload_slots(data, bit_planes: int) -> int:
+    # Number of slots needed to hold data (bytes or a PayloadStream)
+    return -(-len(data) * 8 // bit_planes)
+
+
+class SlotWriter:
+    # Embeds payload bytes into a sequence of blocks handed over one at a time,
+    # for callers that need to do something with each block afterwards
+
+    def __init__(self, data: bytes, channels: list, bit_planes: int, bitorder: str = "big"):
+        self.channels = channels
+        self.bit_planes = bit_planes
+        self.written = 0
+        if isinstance(data, PayloadStream):
+            self._values_iter = iter_stream_slots(data, bit_planes, bitorder)
+        else:
+            self._values_iter = iter_slots(data, bit_planes, bitorder=bitorder)
+        self._values = next(self._values_iter, None)
+        self._position = 0
+
+    @property
+    def done(self) -> bool:
+        return self._values is None
+
+    def write(self, units: np.ndarray) -> int:
+        # Fill as many slots of units as the remaining payload needs
+        offset = 0
+        capacity = units.shape[0] * len(self.channels)
+        while self._values is not None and offset < capacity:
+            count = write_slots(units, self.channels, self._values[self._position:], self.bit_planes, offset)
+            offset += count
+            self._position += count
+            self.written += count
+            if self._position == len(self._values):
+                self._values = next(self._values_iter, None)
+                self._position = 0
+        return offset
+
+
+def read_slots(units: np.ndarray, channels: list, bit_planes: int, count: int = None) -> np.ndarray:
+    # Read up to count slot values (all slots when count is None) as uint8
+    n_channels = len(channels)
+    capacity = units.shape[0] * n_channels
+    if count is None or count > capacity:
+        count = capacity
+    if count == 0:
+        return np.zeros(0, dtype=np.uint8)
+    n_units = -(-count // n_channels)
+
+    mask = (1 << bit_planes) - 1
+    selected = units[:n_units][:, channels].reshape(-1)[:count]
+    return (selected & mask).astype(np.uint8)
+
+
+def slots_to_bits(values: np.ndarray, bit_planes: int) -> np.ndarray:
+    # Expand slot values back into a flat uint8 bit array (LSB plane first)
+    if bit_planes == 1:
+        return values
+    planes = np.arange(bit_planes, dtype=np.uint8)
+    return ((values[:, None] >> planes) & 1).reshape(-1)
+
+
+def slots_to_bytes(values: np.ndarray, bit_planes: int, bitorder: str = "big") -> bytes:
+    # Pack slot values into bytes, MSB first for bitorder "big"; a trailing partial byte is dropped
+    bits = slots_to_bits(values, bit_planes)
+    n_bits = len(bits) - len(bits) % 8
+    return np.packbits(bits[:n_bits], bitorder=bitorder).tobytes()
+
+
+# Number of units (pixels or frames) processed per block by the streaming paths
+BLOCK_UNITS = 1 << 16
+
+
+# Default peak bytes per block for the streaming paths
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+def block_units_for_budget(memory_budget: int, n_channels: int) -> int:
+    # Units per block so a block and its working copies stay within memory_budget
+    # bytes: the samples themselves, the selected copy and the unpacked bits
+    return max(1024, memory_budget // (12 * max(1, n_channels)))
+
+
+def iter_blocks(units: np.ndarray, block_units: int = BLOCK_UNITS):
+    # Yield consecutive views of at most block_units units
+    for start in range(0, units.shape[0], block_units):
+        yield units[start:start + block_units]
+
+
+def iter_bytes(blocks, channels: list, bit_planes: int, bitorder: str = "big"):
+    # Yield packed bytes for each block of units, carrying partial bytes over
+    carry = np.zeros(0, dtype=np.uint8)
+    for units in blocks:
+        bits = slots_to_bits(read_slots(units, channels, bit_planes), bit_planes)
+        if len(carry):
+            bits = np.concatenate((carry, bits))
+        n_bits = len(bits) - len(bits) % 8
+        carry = bits[n_bits:].copy()
+        yield np.packbits(bits[:n_bits], bitorder=bitorder).tobytes()
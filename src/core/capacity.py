@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+
+from core.crypto.aead import AeadParams, aead_size
+from core.crypto.stream import StreamParams, stream_size
+from core.framing import EXTRA_RECORD_SIZE, HEADER_SIZE
+from core.plan import EmbeddingPlan
+
+# Payload capacity from file headers only: Pillow's lazy open reads the size
+# and mode, soundfile.info the frame and channel counts, so the cost does not
+# depend on the carrier's size.
+
+# Fernet token around n plaintext bytes: version (1), timestamp (8), IV (16),
+# AES-CBC ciphertext padded to whole 16-byte blocks, HMAC (32). The token is
+# urlsafe base64 text and encrypt_message base64-encodes it once more.
+FERNET_OVERHEAD = 1 + 8 + 16 + 32
+AES_BLOCK = 16
+
+
+@dataclass(frozen=True)
+class CarrierInfo:
+    media_type: str
+    units: int          # pixels or frames
+    channels: int       # channels per unit as stored in the file
+    mode: str = None    # Pillow mode images are embedded in
+    samplerate: int = None
+
+
+def carrier_info(path: str, media_type: str) -> CarrierInfo:
+    if media_type == "image":
+        from core.inplace import tiff_layout
+        from core.raster import band_layout, check_depth, native_mode
+        from core.tiles import open_carrier
+
+        layout = tiff_layout(path)
+        if layout is not None:
+            # 16-bit RGB(A) TIFF, embedded through a memory map
+            _, width, height, _, names = layout
+            return CarrierInfo("image", width * height, len(names), mode=names)
+        with open_carrier(path) as img:
+            check_depth(img)
+            mode = native_mode(img)
+            return CarrierInfo("image", img.width * img.height, len(band_layout(mode)), mode=mode)
+    import soundfile as sf
+    info = sf.info(path)
+    return CarrierInfo("audio", info.frames, info.channels, samplerate=info.samplerate)
+
+
+def raw_capacity(info: CarrierInfo, plan: EmbeddingPlan) -> int:
+    # Bytes the selected channels and bit planes hold, before any overhead.
+    # Images are embedded in their native mode (see core.raster).
+    if info.media_type == "image" and info.mode is not None:
+        from core.raster import band_layout
+
+        n_channels = len(plan.channel_indices(layout=band_layout(info.mode)))
+    else:
+        n_channels = len(plan.channel_indices(info.channels))
+    return info.units * n_channels * plan.bit_planes // 8
+
+
+def base64_size(n: int) -> int:
+    return (n + 2) // 3 * 4
+
+
+def encrypted_size(n: int) -> int:
+    # Size of encrypt_message output for n plaintext bytes
+    token = FERNET_OVERHEAD + (n // AES_BLOCK + 1) * AES_BLOCK
+    return base64_size(base64_size(token))
+
+
+def ciphertext_size(n: int, plan: EmbeddingPlan) -> int:
+    # Size of the encrypted form of n payload bytes
+    if plan.sealed:
+        return aead_size(n)
+    if plan.streamed:
+        return stream_size(n)
+    return encrypted_size(n)
+
+
+def framing_overhead(plan: EmbeddingPlan) -> int:
+    # Bytes added around the payload by the delimiter setting, including
+    # encryption parameters stored in the header
+    if plan.framed:
+        if plan.sealed:
+            return HEADER_SIZE + EXTRA_RECORD_SIZE + AeadParams.SIZE
+        if plan.streamed:
+            return HEADER_SIZE + EXTRA_RECORD_SIZE + StreamParams.SIZE
+        return HEADER_SIZE
+    return len(plan.delimiter_bytes) if plan.delimiter_bytes else 0
+
+
+def embedded_size(n: int, plan: EmbeddingPlan) -> int:
+    # Bytes written into the carrier for an n-byte payload
+    if plan.encrypted:
+        n = ciphertext_size(n, plan)
+    return n + framing_overhead(plan)
+
+
+def payload_capacity_for(info: CarrierInfo, plan: EmbeddingPlan) -> int:
+    # Largest payload, in bytes, that fits once framed and encrypted
+    available = raw_capacity(info, plan) - framing_overhead(plan)
+    if not plan.encrypted:
+        return max(0, available)
+    if ciphertext_size(0, plan) > available:
+        return 0
+    # ciphertext_size grows monotonically, so search for the largest fit
+    low, high = 0, available
+    while low < high:
+        middle = (low + high + 1) // 2
+        if ciphertext_size(middle, plan) <= available:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def payload_capacity(path: str, media_type: str, settings) -> int:
+    # Largest payload, in bytes, the carrier at path holds with these settings
+    return payload_capacity_for(carrier_info(path, media_type), EmbeddingPlan.from_settings(settings, media_type))
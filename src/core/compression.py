@@ -0,0 +1,175 @@
+import bz2
+import lzma
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+
+from core.framing import EXTRA_RECORD_SIZE
+
+# Optional payload compression, applied before encryption. The codec, level
+# and uncompressed length are stored in the payload header, so decoding needs
+# no setting:
+#
+#   codec (1) | level (1) | uncompressed length (8)
+#
+# "Auto" compresses a sample of the payload with each codec and weighs the
+# bytes each saves against the time it takes.
+
+CODECS = ("zlib", "bz2", "lzma")
+AUTO = "Auto"
+DEFAULT_LEVEL = 6
+
+_CODEC_IDS = {name: number for number, name in enumerate(CODECS, start=1)}
+_PARAMS = struct.Struct(">BBQ")
+
+# Auto mode: payloads shorter than this are stored as they are; longer ones are
+# sampled in SAMPLE_PIECES evenly spaced pieces totalling at most SAMPLE_SIZE
+AUTO_MIN_SIZE = 256
+SAMPLE_SIZE = 64 * 1024
+SAMPLE_PIECES = 4
+# A slower codec is only chosen over a faster one if it saves at least this
+# many bytes per extra second spent (the same for the sample as for the whole
+# payload), and a sample that shrinks less than MIN_SAVING is left alone
+AUTO_SAVING_RATE = 256 * 1024
+MIN_SAVING = 0.05
+AUTO_LEVELS = {"zlib": 6, "bz2": 9, "lzma": 6}
+
+# Largest piece of output a decompressor hands over at once
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class CompressionParams:
+    codec: str
+    level: int
+    length: int     # uncompressed bytes
+
+    SIZE = _PARAMS.size
+
+    def pack(self) -> bytes:
+        return _PARAMS.pack(_CODEC_IDS[self.codec], self.level, self.length)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "CompressionParams":
+        if len(data) < cls.SIZE:
+            raise ValueError("Corrupt compression parameters.")
+        codec, level, length = _PARAMS.unpack_from(data)
+        if not 1 <= codec <= len(CODECS):
+            raise ValueError(f"Unsupported compression codec {codec}.")
+        return cls(CODECS[codec - 1], level, length)
+
+
+def compress(data: bytes, codec: str, level: int = DEFAULT_LEVEL) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "bz2":
+        return bz2.compress(data, max(1, level))
+    if codec == "lzma":
+        return lzma.compress(data, preset=level)
+    raise ValueError(f"Unknown compression codec '{codec}'.")
+
+
+def _sample(data: bytes) -> bytes:
+    if len(data) <= SAMPLE_SIZE:
+        return data
+    piece = SAMPLE_SIZE // SAMPLE_PIECES
+    step = (len(data) - piece) // (SAMPLE_PIECES - 1)
+    view = memoryview(data)
+    return b"".join(view[i * step:i * step + piece] for i in range(SAMPLE_PIECES))
+
+
+def choose_codec(data: bytes):
+    # (codec, level) for compressing data in auto mode, or None when it is too
+    # short or does not compress
+    if len(data) < AUTO_MIN_SIZE:
+        return None
+    sample = _sample(data)
+    trials = []
+    for codec in CODECS:
+        level = AUTO_LEVELS[codec]
+        start = time.perf_counter()
+        size = len(compress(sample, codec, level))
+        trials.append((time.perf_counter() - start, size, codec, level))
+    trials.sort()
+
+    # From the fastest codec, move to a slower one when it pays for its time
+    best = trials[0]
+    for trial in trials[1:]:
+        extra_seconds = max(trial[0] - best[0], 1e-9)
+        if (best[1] - trial[1]) / extra_seconds >= AUTO_SAVING_RATE:
+            best = trial
+    if best[1] > len(sample) * (1 - MIN_SAVING):
+        return None
+    return best[2], best[3]
+
+
+def compress_payload(data: bytes, codec: str, level: int = DEFAULT_LEVEL):
+    # (params, compressed data), or None when compressing would not make the
+    # embedded payload smaller, header record included
+    if codec == AUTO:
+        choice = choose_codec(data)
+        if choice is None:
+            return None
+        codec, level = choice
+    compressed = compress(data, codec, level)
+    if len(compressed) + EXTRA_RECORD_SIZE + CompressionParams.SIZE >= len(data):
+        return None
+    return CompressionParams(codec, level, len(data)), compressed
+
+
+class Decompressor:
+    # Inflates a compressed payload as its pieces arrive, at most CHUNK_SIZE
+    # bytes at a time, and refuses output beyond the recorded length
+
+    def __init__(self, params: CompressionParams):
+        self.params = params
+        self.produced = 0
+        self.seconds = 0.0      # time spent decompressing
+        self._zlib = params.codec == "zlib"
+        if self._zlib:
+            self._obj = zlib.decompressobj()
+        elif params.codec == "bz2":
+            self._obj = bz2.BZ2Decompressor()
+        else:
+            self._obj = lzma.LZMADecompressor()
+
+    def update(self, data: bytes):
+        # Yield the output for the next piece of compressed data
+        if not data:
+            return
+        if self._obj.eof:
+            raise ValueError("Corrupt compressed payload.")
+        try:
+            chunk = self._decompress(data)
+            while True:
+                if chunk:
+                    self.produced += len(chunk)
+                    if self.produced > self.params.length:
+                        raise ValueError("Corrupt compressed payload.")
+                    yield chunk
+                if self._obj.eof:
+                    return
+                if self._zlib:
+                    # Input left over, or output held back by the size limit
+                    if not self._obj.unconsumed_tail and len(chunk) < CHUNK_SIZE:
+                        return
+                    chunk = self._decompress(self._obj.unconsumed_tail)
+                else:
+                    if self._obj.needs_input:
+                        return
+                    chunk = self._decompress(b"")
+        except (zlib.error, OSError, lzma.LZMAError, EOFError):
+            raise ValueError("Corrupt compressed payload.")
+
+    def _decompress(self, data: bytes) -> bytes:
+        start = time.perf_counter()
+        try:
+            return self._obj.decompress(data, CHUNK_SIZE)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def finalize(self):
+        # Check that the whole payload was inflated and nothing follows it
+        if not self._obj.eof or self._obj.unused_data or self.produced != self.params.length:
+            raise ValueError("Corrupt compressed payload.")
@@ -0,0 +1,64 @@
+import os
+from dataclasses import dataclass
+
+from core.crypto.kdf import KEY_NONCE_SIZE, KdfParams, message_key
+from core.crypto.stream import DECRYPTION_FAILED, TAG_SIZE
+
+# Compact AES-GCM: the whole payload is encrypted in one piece under a single
+# random nonce, and the carrier holds the raw ciphertext and its 16-byte tag.
+# The Fernet mode base64-encodes a base64 token, growing a payload by about
+# 78%; this one adds 16 bytes, so large payloads take about 44% fewer bits.
+# The payload is encrypted under its own subkey (see core.crypto.kdf).
+#
+# Packed parameters, stored in the payload header:
+#
+#   scheme (1) | KDF parameters | key nonce (16) | nonce (12)
+
+SCHEME_AEAD = 2
+
+NONCE_SIZE = 12
+
+
+@dataclass(frozen=True)
+class AeadParams:
+    kdf: KdfParams
+    key_nonce: bytes
+    nonce: bytes
+
+    SIZE = 1 + KdfParams.SIZE + KEY_NONCE_SIZE + NONCE_SIZE
+
+    @classmethod
+    def generate(cls, kdf: KdfParams = None) -> "AeadParams":
+        # Fresh nonces; a fresh salt too unless kdf is given
+        return cls(kdf or KdfParams.generate(), os.urandom(KEY_NONCE_SIZE), os.urandom(NONCE_SIZE))
+
+    def pack(self) -> bytes:
+        return bytes([SCHEME_AEAD]) + self.kdf.pack() + self.key_nonce + self.nonce
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "AeadParams":
+        if len(data) < cls.SIZE or data[0] != SCHEME_AEAD:
+            raise ValueError("Corrupt encryption parameters.")
+        start = 1 + KdfParams.SIZE
+        return cls(KdfParams.unpack(data[1:]), bytes(data[start:start + KEY_NONCE_SIZE]),
+                   bytes(data[start + KEY_NONCE_SIZE:cls.SIZE]))
+
+
+def aead_size(n: int) -> int:
+    return n + TAG_SIZE
+
+
+def encrypt_aead(data: bytes, key: bytes, params: AeadParams) -> bytes:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    return AESGCM(message_key(key, params.key_nonce)).encrypt(params.nonce, data, None)
+
+
+def decrypt_aead(data: bytes, key: bytes, params: AeadParams) -> bytes:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    try:
+        return AESGCM(message_key(key, params.key_nonce)).decrypt(params.nonce, data, None)
+    except InvalidTag:
+        raise ValueError(DECRYPTION_FAILED)
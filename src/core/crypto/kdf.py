@@ -0,0 +1,72 @@
+import os
+import struct
+from dataclasses import dataclass
+
+# Password-based key derivation for the binary encryption modes. The salt and
+# cost parameters travel with the payload (in the payload header), so any
+# carrier can be decrypted with just the password.
+#
+# Packed parameters: salt (16) | log2 N (1) | r (1) | p (1)
+#
+# The scrypt key is cached and shared by every encryption with the same
+# password within the cache TTL (core.crypto.keys), so no message is
+# encrypted under it directly. Each message draws a random 16-byte key nonce,
+# stored with its parameters, and is encrypted under message_key(key, nonce),
+# an HKDF-SHA256 subkey. Two messages share a subkey only if their key nonces
+# collide: below 2**-60 for 2**34 messages under one salt. Within a subkey
+# the cipher nonces are then used once, whatever their size.
+
+KEY_SIZE = 32
+SALT_SIZE = 16
+KEY_NONCE_SIZE = 16
+MESSAGE_KEY_INFO = b"stega_pal message key"
+
+# scrypt cost: N = 2 ** 15, r = 8, p = 1 takes about 32 MB and 0.1 s
+SCRYPT_LOG_N = 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+_PARAMS = struct.Struct(f">{SALT_SIZE}sBBB")
+
+
+@dataclass(frozen=True)
+class KdfParams:
+    salt: bytes
+    log_n: int = SCRYPT_LOG_N
+    r: int = SCRYPT_R
+    p: int = SCRYPT_P
+
+    SIZE = _PARAMS.size
+
+    @classmethod
+    def generate(cls) -> "KdfParams":
+        # Fresh random salt with the default costs
+        return cls(os.urandom(SALT_SIZE))
+
+    def pack(self) -> bytes:
+        return _PARAMS.pack(self.salt, self.log_n, self.r, self.p)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "KdfParams":
+        if len(data) < cls.SIZE:
+            raise ValueError("Corrupt encryption parameters.")
+        salt, log_n, r, p = _PARAMS.unpack_from(data)
+        # Refuse costs a tampered header could use to exhaust memory
+        if not 10 <= log_n <= 22 or not 1 <= r <= 32 or not 1 <= p <= 16:
+            raise ValueError("Unsupported key derivation parameters.")
+        return cls(salt, log_n, r, p)
+
+
+def derive_key(password: str, params: KdfParams) -> bytes:
+    from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+    kdf = Scrypt(salt=params.salt, length=KEY_SIZE, n=2 ** params.log_n, r=params.r, p=params.p)
+    return kdf.derive(password.encode("utf-8"))
+
+
+def message_key(key: bytes, key_nonce: bytes) -> bytes:
+    # The subkey one message is encrypted under, from the shared password key
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    return HKDF(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=key_nonce, info=MESSAGE_KEY_INFO).derive(key)
@@ -0,0 +1,139 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from core.crypto.kdf import KdfParams, derive_key
+
+# Derived-key cache for the scrypt-based encryption modes. Deriving a key is
+# deliberately slow, so keys are kept per (password, salt, KDF parameters)
+# for a limited time, and new encryptions within that time reuse one salt per
+# password so a batch of carriers needs one derivation rather than one each.
+# The shared key never encrypts a message itself: each carrier is encrypted
+# under an HKDF subkey over its own random key nonce (core.crypto.kdf).
+#
+# Passwords are never stored: entries are keyed by an HMAC of the password
+# under a random per-process secret. Evicted, expired and cleared keys are
+# overwritten with zeros; copies handed to callers are plain bytes and are
+# not.
+#
+# Each process has its own cache. Worker processes can be seeded with the
+# parent's encryption keys (export_entries / import_entries) so a process
+# pool derives nothing when encoding. What is shipped is the HMAC secret and
+# (digest, params, key) entries, never a password: the secret only lets the
+# worker match passwords it is given itself.
+
+KEY_CACHE_SIZE = 64
+KEY_CACHE_TTL = 300.0    # seconds
+
+
+class KeyCache:
+    def __init__(self, max_entries: int = KEY_CACHE_SIZE, ttl: float = KEY_CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._secret = os.urandom(32)
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()      # (password digest, KdfParams) -> (bytearray key, expiry)
+        self._salts = {}                # password digest -> (KdfParams, expiry)
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, password: str) -> bytes:
+        return hmac.new(self._secret, password.encode("utf-8"), hashlib.sha256).digest()
+
+    def derive(self, password: str, params: KdfParams) -> bytes:
+        # The key for password and params, derived at most once per TTL
+        entry_key = (self._digest(password), params)
+        with self._lock:
+            self._expire()
+            entry = self._keys.get(entry_key)
+            if entry is not None:
+                self._keys.move_to_end(entry_key)
+                self.hits += 1
+                return bytes(entry[0])
+            self.misses += 1
+
+        # Derive outside the lock so other passwords are not held up; two
+        # threads missing together both derive and store the same key
+        key = derive_key(password, params)
+        self._store(entry_key, key)
+        return key
+
+    def encryption_params(self, password: str) -> KdfParams:
+        # KDF parameters for a new encryption with password: the same salt
+        # for every call within the TTL, so derive() hits after the first
+        digest = self._digest(password)
+        now = self._clock()
+        with self._lock:
+            entry = self._salts.get(digest)
+            if entry is None or entry[1] <= now:
+                entry = (KdfParams.generate(), now + self.ttl)
+                self._salts[digest] = entry
+            return entry[0]
+
+    def export_entries(self, passwords) -> tuple:
+        # (secret, [(digest, params, key), ...]) for each password's current
+        # encryption key, deriving it if needed, to hand to import_entries in
+        # another process
+        entries = []
+        for password in passwords:
+            params = self.encryption_params(password)
+            entries.append((self._digest(password), params, self.derive(password, params)))
+        return self._secret, entries
+
+    def import_entries(self, secret: bytes, entries):
+        # Adopt the exporting cache's secret, so its digests match lookups
+        # here; keys cached under a different secret are dropped
+        if secret != self._secret:
+            self.clear()
+            self._secret = secret
+        for digest, params, key in entries:
+            with self._lock:
+                self._salts[digest] = (params, self._clock() + self.ttl)
+            self._store((digest, params), key)
+
+    def clear(self):
+        # Zero and drop every cached key and salt
+        with self._lock:
+            for key, _ in self._keys.values():
+                _zero(key)
+            self._keys.clear()
+            self._salts.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _store(self, entry_key, key: bytes):
+        with self._lock:
+            old = self._keys.pop(entry_key, None)
+            if old is not None:
+                _zero(old[0])
+            self._keys[entry_key] = (bytearray(key), self._clock() + self.ttl)
+            while len(self._keys) > self.max_entries:
+                _, (evicted, _) = self._keys.popitem(last=False)
+                _zero(evicted)
+
+    def _expire(self):
+        # Called with the lock held
+        now = self._clock()
+        for entry_key in [k for k, (_, expiry) in self._keys.items() if expiry <= now]:
+            _zero(self._keys.pop(entry_key)[0])
+        for digest in [d for d, (_, expiry) in self._salts.items() if expiry <= now]:
+            del self._salts[digest]
+
+    def _after_fork(self):
+        # A lock held by another thread at fork time would never be released
+        self._lock = threading.Lock()
+
+
+def _zero(buffer: bytearray):
+    buffer[:] = bytes(len(buffer))
+
+
+key_cache = KeyCache()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=key_cache._after_fork)
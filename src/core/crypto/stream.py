@@ -0,0 +1,132 @@
+import os
+import struct
+from dataclasses import dataclass
+
+from core.crypto.kdf import KEY_NONCE_SIZE, KdfParams, message_key
+
+# Segmented AES-GCM for payloads too large to encrypt in one piece. The
+# plaintext is cut into fixed-size segments, each encrypted and authenticated
+# on its own with the nonce
+#
+#   nonce prefix (7) | segment counter (4) | last segment flag (1)
+#
+# so segments cannot be reordered, dropped or cut off at a segment boundary
+# without failing authentication (the STREAM construction). Ciphertext is raw
+# binary: every segment grows by its 16-byte tag and nothing else. Segments
+# are encrypted under the message's own subkey (see core.crypto.kdf), so the
+# nonce prefix only has to be unique within one message.
+#
+# Packed parameters, stored in the payload header:
+#
+#   scheme (1) | KDF parameters | key nonce (16) | nonce prefix (7) | segment size (4)
+
+SCHEME_STREAM = 1
+
+SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+
+_TAIL = struct.Struct(f">{KEY_NONCE_SIZE}s{NONCE_PREFIX_SIZE}sI")
+_COUNTER = struct.Struct(">IB")
+MAX_SEGMENTS = 1 << 32
+
+DECRYPTION_FAILED = "Decryption failed. Check your password and try again."
+
+
+@dataclass(frozen=True)
+class StreamParams:
+    kdf: KdfParams
+    key_nonce: bytes
+    nonce_prefix: bytes
+    segment_size: int = SEGMENT_SIZE
+
+    SIZE = 1 + KdfParams.SIZE + _TAIL.size
+
+    @classmethod
+    def generate(cls, kdf: KdfParams = None, segment_size: int = SEGMENT_SIZE) -> "StreamParams":
+        # Fresh nonces; a fresh salt too unless kdf is given
+        return cls(kdf or KdfParams.generate(), os.urandom(KEY_NONCE_SIZE), os.urandom(NONCE_PREFIX_SIZE), segment_size)
+
+    def pack(self) -> bytes:
+        return bytes([SCHEME_STREAM]) + self.kdf.pack() + _TAIL.pack(self.key_nonce, self.nonce_prefix, self.segment_size)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "StreamParams":
+        if len(data) < cls.SIZE or data[0] != SCHEME_STREAM:
+            raise ValueError("Corrupt encryption parameters.")
+        kdf = KdfParams.unpack(data[1:])
+        key_nonce, nonce_prefix, segment_size = _TAIL.unpack_from(data, 1 + KdfParams.SIZE)
+        if segment_size == 0:
+            raise ValueError("Corrupt encryption parameters.")
+        return cls(kdf, key_nonce, nonce_prefix, segment_size)
+
+
+def stream_size(n: int, segment_size: int = SEGMENT_SIZE) -> int:
+    # Ciphertext bytes for n plaintext bytes; an empty payload still has one
+    # (empty, final) segment
+    segments = max(1, -(-n // segment_size))
+    return n + segments * TAG_SIZE
+
+
+def _nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    if counter >= MAX_SEGMENTS:
+        raise ValueError("Payload too large for stream encryption.")
+    return prefix + _COUNTER.pack(counter, last)
+
+
+class StreamEncryptor:
+    def __init__(self, key: bytes, params: StreamParams):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        self._aead = AESGCM(message_key(key, params.key_nonce))
+        self.params = params
+
+    def segments(self, data):
+        # Yield the ciphertext of data one segment at a time. data is read
+        # through a memoryview, so no full-size copy is made.
+        view = memoryview(data)
+        size = self.params.segment_size
+        count = max(1, -(-len(view) // size))
+        for counter in range(count):
+            segment = view[counter * size:(counter + 1) * size]
+            nonce = _nonce(self.params.nonce_prefix, counter, counter == count - 1)
+            yield self._aead.encrypt(nonce, segment, None)
+
+
+class StreamDecryptor:
+    # Verifies and releases plaintext segment by segment as ciphertext
+    # arrives. A full segment is held back until more data shows it is not
+    # the last one; finalize() checks the last segment.
+
+    def __init__(self, key: bytes, params: StreamParams):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        self._aead = AESGCM(message_key(key, params.key_nonce))
+        self.params = params
+        self._buffer = bytearray()
+        self._counter = 0
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer += data
+        segment = self.params.segment_size + TAG_SIZE
+        released = []
+        while len(self._buffer) > segment:
+            released.append(self._open(bytes(self._buffer[:segment]), last=False))
+            del self._buffer[:segment]
+        return b"".join(released)
+
+    def finalize(self) -> bytes:
+        plaintext = self._open(bytes(self._buffer), last=True)
+        self._buffer.clear()
+        return plaintext
+
+    def _open(self, segment: bytes, last: bool) -> bytes:
+        from cryptography.exceptions import InvalidTag
+
+        nonce = _nonce(self.params.nonce_prefix, self._counter, last)
+        try:
+            plaintext = self._aead.decrypt(nonce, segment, None)
+        except InvalidTag:
+            raise ValueError(DECRYPTION_FAILED)
+        self._counter += 1
+        return plaintext
@@ -5,9 +5,10 @@ DECODERS = {
     ("audio", "LSB"): LSBDecoder,
 }   
 
-def get_decoder(media_type: str, algorithm: str):
+def get_decoder(media_type: str, algorithm: str, **options):
+    # options are passed to the decoder, e.g. memory_budget
     key = (media_type, algorithm)
     decoder_class = DECODERS.get(key)
     if not decoder_class:
         raise ValueError(f"No decoder for {media_type}/{algorithm}")
-    return decoder_class()
\ No newline at end of file
+    return decoder_class(**options)
\ No newline at end of file
@@ -1,158 +1,269 @@
-from PIL import Image
-
-from core.crypto.encrypt import decrypt_message
-import soundfile as sf
+# PIL, soundfile and cryptography are imported where they are used, so headless
+# callers only load the stack needed for their media type.
+from core.bitplanes import BLOCK_UNITS, DEFAULT_MEMORY_BUDGET, block_units_for_budget, iter_blocks, iter_bytes
+from core.delimiters import DelimiterScanner
+from core.framing import FLAG_COMPRESSED, FLAG_ENCRYPTED, unpack_extra
+from core.inplace import image_layout, map_image, map_wav, wav_layout
+from core.plan import EmbeddingPlan
+from core.progress import ProgressTracker
+from core import metrics
 import numpy as np
+import time
 
 class LSBDecoder:
-    def decode(self, file_path, settings, type) -> str:
-        if type == "image":
-            # Load image and get pixel access
-            img, pixels = self.load_image(settings, file_path)
-            print("Image loaded")
-            # Decode message from image
-            message = self.decode_image(img, pixels, settings)
-            print("Message decoded")
-            return message
-        elif type == "audio":
-            # Load audio and get bit access
-            data, samplerate = self.load_audio(settings, file_path)
-            print("Audio loaded")
-            # Decode message from audio
-            message = self.decode_audio(data, samplerate, settings)
-            print("Message decoded")
-            return message
-
-
-    def decode_image(self, img: Image, pixels, settings) -> str:
-        # Implementation of LSB decoding for images
-        bit_planes = settings.get_setting("bit_planes", 1)
-        print(f"Bit planes: {bit_planes}")
-        
-        # Declare delimiter type
-        delimiter_type = settings.get_setting('delimiter', 'NULL')  
-        magic_seq = "1111111100000000"
-        print(f"Delimiter type: {delimiter_type}")
-        print(f"Magic sequence: {magic_seq}")
-
-        # Extract bits from image
-        extracted_bits = []
-        for y in range(img.height):
-            for x in range(img.width):
-                r, g, b = pixels[x, y]
-                channels = []
-                if "R" in settings.get_setting("color_channels", ["R", "G", "B"]):
-                    channels.append(r)
-                if "G" in settings.get_setting("color_channels", ["R", "G", "B"]):
-                    channels.append(g)
-                if "B" in settings.get_setting("color_channels", ["R", "G", "B"]):
-                    channels.append(b)
-
-                for channel in channels:
-                    for plane in range(bit_planes):
-                        bit = (channel >> plane) & 1  # Extract bit at position 'plane'
-                        extracted_bits.append(str(bit))
-        binary_str = ''.join(extracted_bits)
-
-        # Check for length prefix
-        message_length = None
-        if delimiter_type == "length_prefix":
-            length_bits = binary_str[:8*8]  # First 64 bits for length (8 bits per char * 8 chars)
-            print(int(length_bits))
-            message_length = int(''.join(chr(int(length_bits[i:i+8], 2)) for i in range(0, len(length_bits), 8)))
-            print(message_length)
-
-        # Convert bits to characters
-        message = ""
-        for i in range(0, len(binary_str), 8):
-            byte = binary_str[i:i+8]
-            if len(byte) != 8:
-                break
-            code = int(byte, 2)
-            if magic_seq in message and delimiter_type == "Magic Sequence":
-                message = message[:-len(magic_seq)]
-                break
-            elif code == 0 and delimiter_type == "NULL Terminator":
-                break
-            elif message_length is not None and len(message) >= message_length + 8 and delimiter_type == "length_prefix":
-                message = message[8:]
-                break
-            message += chr(code)
-        binary_output = len(message) * 8
-
-        # decrypt message if encryption is enabled
-        if settings.get_setting("encryption") and settings.get_setting("encryption") != "None":
-            try:
-                message = decrypt_message(message.encode(), settings.get_setting("password", ""))
-                print("Message decrypted")
-            except ValueError as e:
-                print(f"Decryption failed: {e}")
-                return ""
-
-        # Return decoded message
-        return message
-    
-    def decode_audio(self, data, samplerate, settings) -> str:
-        # Implementation of LSB decoding for audio
-        bit_planes = settings.get_setting("bit_planes", 1)
-        print(f"Bit planes: {bit_planes}")
-        
-        # Declare delimiter type
-        delimiter_type = settings.get_setting('delimiter', 'NULL')  
-        magic_seq = "1111111100000000"
-        print(f"Delimiter type: {delimiter_type}")
-        print(f"Magic sequence: {magic_seq}")
-
-        audio_channels = settings.get_setting("audio_channels", ["L", "R"])
-
-        # Extract bits
-        extracted_bits = []
-        for i in range(data.shape[0]):
-            for ch in range(data.shape[1]):
-                if ch == 0 and "L" not in audio_channels:
-                    continue
-                if ch == 1 and "R" not in audio_channels:
-                    continue
-
-                for plane in range(bit_planes):
-                    bit = (data[i, ch] >> plane) & 1
-                    extracted_bits.append(str(bit))
-
-        binary_str = ''.join(extracted_bits)
-
-        # Convert bits to characters — identical to decode_image
-        message = ""
-        for i in range(0, len(binary_str), 8):
-            byte = binary_str[i:i+8]
-            if len(byte) != 8:
-                break
-            code = int(byte, 2)
-            if magic_seq in message and delimiter_type == "Magic Sequence":
-                message = message[:-len(magic_seq)]
-                break
-            elif code == 0 and delimiter_type == "NULL Terminator":
-                break
-            message += chr(code)
-
-        # Decrypt if enabled — identical to decode_image
-        if settings.get_setting("encryption") and settings.get_setting("encryption") != "None":
-            try:
-                message = decrypt_message(message.encode(), settings.get_setting("password", ""))
-            except ValueError as e:
-                print(f"Decryption failed: {e}")
-                return ""
-
-        return message
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        # Peak bytes used per block or strip by the streaming paths
+        self.memory_budget = memory_budget
+
+    def _block_units(self, n_channels: int) -> int:
+        # Units per block for scanning a decoded or mapped carrier: small, so
+        # scanning stops soon after the payload ends, and within memory_budget
+        return min(BLOCK_UNITS, block_units_for_budget(self.memory_budget, n_channels))
+
+    def decode(self, file_path, settings, type, max_bytes=None, progress=None, cancel=None) -> bytes:
+        # progress(done, total) is called as carrier units (pixels or frames)
+        # are scanned; cancel is a CancelToken checked between blocks
+        # settings may already be a compiled EmbeddingPlan
+        return b"".join(self.iter_decode(file_path, settings, type, max_bytes, progress, cancel))
+
+    def iter_decode(self, file_path, settings, type, max_bytes=None, progress=None, cancel=None):
+        # decode, yielding the payload in pieces. A framed payload is released
+        # as it is extracted (a stream-encrypted one segment by segment, each
+        # verified first), so it is never held whole; other payloads come in
+        # one piece once their end is found.
+        with metrics.span("decode", media_type=type, algorithm="LSB") as operation:
+            plan = settings if isinstance(settings, EmbeddingPlan) else EmbeddingPlan.from_settings(settings, type, "LSB", operation="decode")
+            tracker = ProgressTracker(progress, cancel)
+            if type == "image":
+                # Decode message from image strips in the carrier's own mode,
+                # decoding rows lazily where possible. 16-bit TIFFs, which
+                # Pillow would reduce to 8 bits, are memory-mapped instead.
+                from core.raster import band_layout, check_depth, native_mode
+                from core.tiles import iter_strips, open_carrier, strip_rows
+
+                layout = image_layout(file_path)
+                if layout is not None and layout[0] == "tiff":
+                    pixels, names = map_image(file_path, layout, mode="r")
+                    tracker.start(pixels.shape[0] * pixels.shape[1])
+                    blocks = iter_blocks(pixels.reshape(-1, len(names)), self._block_units(len(names)))
+                else:
+                    with open_carrier(file_path) as img:
+                        check_depth(img)
+                        mode = native_mode(img)
+                        tracker.start(img.width * img.height)
+                    names = band_layout(mode)
+                    rows = strip_rows(img.width, self._block_units(len(names)))
+                    blocks = self._image_blocks(iter_strips(file_path, rows), mode)
+                chunks = self._iter_payload(blocks, plan.channel_indices(layout=names), plan, max_bytes, tracker)
+            else:
+                # 16-bit PCM WAVs are memory-mapped, anything else is streamed in blocks
+                layout = wav_layout(file_path)
+                if layout is not None:
+                    data = map_wav(file_path, layout, mode="r")
+                    chunks = self._iter_audio(data, plan, max_bytes, tracker)
+                else:
+                    chunks = self._iter_audio_stream(file_path, plan, max_bytes, tracker)
+
+            size = 0
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+            tracker.finish()
+            operation.set(bytes=size)
+
+    def decode_image(self, img: "Image.Image", plan: EmbeddingPlan, max_bytes=None, tracker=None) -> bytes:
+        # Implementation of LSB decoding for images, strip by strip
+        from core.raster import band_layout, native_mode
+        from core.tiles import crop_strips, strip_rows
+
+        mode = native_mode(img)
+        rows = strip_rows(img.width, self._block_units(len(band_layout(mode))))
+        blocks = self._image_blocks(crop_strips(img, rows), mode)
+        if tracker is not None:
+            tracker.start(img.width * img.height)
+        channels = plan.channel_indices(layout=band_layout(mode))
+        return b"".join(self._iter_payload(blocks, channels, plan, max_bytes, tracker))
+
+    def decode_audio(self, data, samplerate, plan: EmbeddingPlan, max_bytes=None, tracker=None) -> bytes:
+        # Implementation of LSB decoding for audio, block by block
+        return b"".join(self._iter_audio(data, plan, max_bytes, tracker))
+
+    # Read the audio in fixed-size frame blocks, stopping once the payload is found
+    def decode_audio_stream(self, file_path, plan: EmbeddingPlan, max_bytes=None, tracker=None) -> bytes:
+        return b"".join(self._iter_audio_stream(file_path, plan, max_bytes, tracker))
+
+    def _iter_audio(self, data, plan, max_bytes, tracker):
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        if tracker is not None:
+            tracker.start(data.shape[0])
+        blocks = iter_blocks(data, self._block_units(data.shape[1]))
+        return self._iter_payload(blocks, plan.channel_indices(data.shape[1]), plan, max_bytes, tracker)
+
+    def _iter_audio_stream(self, file_path, plan, max_bytes, tracker):
+        import soundfile as sf
+
+        with sf.SoundFile(file_path) as src:
+            channels = plan.channel_indices(src.channels)
+            frames = block_units_for_budget(self.memory_budget, src.channels)
+            blocks = src.blocks(blocksize=frames, dtype='int16', always_2d=True)
+            if tracker is not None:
+                tracker.start(src.frames)
+            yield from self._iter_payload(blocks, channels, plan, max_bytes, tracker)
+
+    # Shared by image and audio: extract bytes until the delimiter, decrypting
+    # and decompressing as the payload header or settings say
+    def _iter_payload(self, blocks, channels, plan: EmbeddingPlan, max_bytes=None, tracker=None):
+        # Extract the selected channels and planes until the delimiter is found
+        # A missing or corrupt payload header raises ValueError to the caller
+        scanner = DelimiterScanner(plan.delimiter, max_bytes)
+        draining = None      # decided once the header is read
+        decryptor = None
+        decompressor = None
+        decrypt_seconds = 0.0
+        ciphertext = 0       # bytes handed to the stream decryptor
+        with metrics.span("extract", delimiter=plan.delimiter) as extract:
+            if tracker is not None:
+                blocks = tracker.track(blocks)
+            for chunk in iter_bytes(metrics.timed_blocks(blocks, "load"), channels, plan.bit_planes, plan.bit_order):
+                done = scanner.feed(chunk)
+                if draining is None and scanner.header is not None:
+                    # Plain and stream-encrypted payloads can be handed on as
+                    # they arrive; a Fernet token is only decrypted whole
+                    decryptor = self._stream_decryptor(scanner.header, plan)
+                    decompressor = self._decompressor(scanner.header)
+                    draining = decryptor is not None or not scanner.header.flags & FLAG_ENCRYPTED
+                if draining:
+                    data = scanner.drain()
+                    if decryptor is not None:
+                        ciphertext += len(data)
+                        start = time.perf_counter()
+                        data = decryptor.update(data)
+                        decrypt_seconds += time.perf_counter() - start
+                    yield from self._inflate(decompressor, data)
+                if done:
+                    break
+            data = scanner.payload()
+            # The payload only: scanning reads past its end to the block's
+            extract.set(bytes=scanner.released + len(data))
+
+        # A header recording more bytes than the carrier holds means a corrupt
+        # or cut-down carrier, not a shorter payload
+        if max_bytes is None and scanner.header is not None and scanner.received < scanner.header.length:
+            raise ValueError(f"The payload is incomplete: the header records {scanner.header.length} bytes "
+                             f"but the carrier holds {scanner.received}.")
 
+        if draining:
+            # The last segment and the end of a compressed stream are checked
+            # only when the payload is whole; a max_bytes prefix ends early
+            complete = scanner.received >= scanner.header.length
+            if decryptor is not None:
+                if complete:
+                    start = time.perf_counter()
+                    data = decryptor.finalize()
+                    decrypt_seconds += time.perf_counter() - start
+                    yield from self._inflate(decompressor, data)
+                metrics.record("decrypt", decrypt_seconds, bytes=ciphertext)
+            if decompressor is not None:
+                if complete:
+                    decompressor.finalize()
+                metrics.record("decompress", decompressor.seconds, bytes=decompressor.produced)
+            return
 
+        # A payload header records whether the payload was encrypted
+        encrypted = plan.encrypted
+        if scanner.header is not None:
+            encrypted = bool(scanner.header.flags & FLAG_ENCRYPTED)
+
+        # decrypt message if encryption is enabled: compact AES-GCM when the
+        # header carries its parameters, else a Fernet token
+        params = self._encryption_params(scanner.header)
+        if encrypted and params is not None:
+            from core.crypto.aead import AeadParams, decrypt_aead
+            from core.crypto.keys import key_cache
+
+            params = AeadParams.unpack(params)
+            with metrics.span("kdf"):
+                key = key_cache.derive(plan.password, params.kdf)
+            with metrics.span("decrypt", bytes=len(data)):
+                data = decrypt_aead(data, key, params)
+        elif encrypted:
+            from core.crypto.encrypt import decrypt_message
+            with metrics.span("decrypt", bytes=len(data)):
+                data = decrypt_message(data, plan.password)
+
+        decompressor = self._decompressor(scanner.header)
+        if decompressor is None:
+            yield data
+            return
+        yield from self._inflate(decompressor, data)
+        if max_bytes is None:
+            decompressor.finalize()
+        metrics.record("decompress", decompressor.seconds, bytes=decompressor.produced)
+
+    @staticmethod
+    def _decompressor(header):
+        # Decompressor for a compressed payload, else None
+        if header is None or not header.flags & FLAG_COMPRESSED:
+            return None
+        from core.compression import CompressionParams, Decompressor
+
+        params = unpack_extra(header.extra).get(FLAG_COMPRESSED)
+        if params is None:
+            raise ValueError("Corrupt payload header.")
+        return Decompressor(CompressionParams.unpack(params))
+
+    @staticmethod
+    def _inflate(decompressor, data):
+        # data, decompressed when the payload is compressed
+        if decompressor is None:
+            if data:
+                yield data
+            return
+        yield from decompressor.update(data)
+
+    @staticmethod
+    def _encryption_params(header):
+        # Packed encryption parameters from the payload header, if any
+        if header is None or not header.flags & FLAG_ENCRYPTED:
+            return None
+        return unpack_extra(header.extra).get(FLAG_ENCRYPTED)
+
+    def _stream_decryptor(self, header, plan: EmbeddingPlan):
+        # StreamDecryptor for a stream-encrypted payload, else None
+        from core.crypto.stream import SCHEME_STREAM
+
+        params = self._encryption_params(header)
+        if params is None or params[0] != SCHEME_STREAM:
+            return None
+        from core.crypto.keys import key_cache
+        from core.crypto.stream import StreamDecryptor, StreamParams
+
+        params = StreamParams.unpack(params)
+        with metrics.span("kdf"):
+            key = key_cache.derive(plan.password, params.kdf)
+        return StreamDecryptor(key, params)
+
+    @staticmethod
+    # Turn image strips into (pixels, channels) arrays of mode
+    def _image_blocks(strips, mode: str = "RGB"):
+        for strip in strips:
+            if strip.mode != mode:
+                strip = strip.convert(mode)
+            pixels = np.asarray(strip)
+            yield pixels.reshape(-1, pixels.shape[2] if pixels.ndim == 3 else 1)
 
     @staticmethod
     def load_image(settings, file_path):
-        img = Image.open(file_path)
-        pixels = img.load()
-        return img, pixels
+        from PIL import Image
+        from core.tiles import carrier_pixel_limit
+        with carrier_pixel_limit():
+            img = Image.open(file_path)
+            img.load()
+        return img
     
     @staticmethod
     def load_audio(settings, path):
+        import soundfile as sf
         data, samplerate = sf.read(path, dtype='int16')
         return data, samplerate
\ No newline at end of file
@@ -0,0 +1,82 @@
+from core.framing import PayloadHeader
+
+MAGIC_SEQUENCE = b"1111111100000000"
+
+
+def delimiter_bytes(delimiter_type: str):
+    # Byte sequence marking the end of the payload, or None
+    if delimiter_type == "Magic Sequence":
+        return MAGIC_SEQUENCE
+    elif delimiter_type == "NULL Terminator":
+        return b"\0"
+    return None
+
+
+class DelimiterScanner:
+    # Assembles extracted bytes and finds the end of the payload as chunks arrive.
+    # Each chunk is searched once, together with the few bytes before it that
+    # could start a delimiter split across chunks, so scanning is linear.
+
+    def __init__(self, delimiter_type: str, max_bytes=None):
+        self.delimiter_type = delimiter_type
+        self.delimiter = delimiter_bytes(delimiter_type)
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.start = 0
+        self.end = None
+        self.header = None
+        self.released = 0   # payload bytes already handed over by drain()
+
+    def feed(self, chunk: bytes) -> bool:
+        # Append a chunk; returns True once the payload end is known
+        if self.end is not None:
+            return True
+
+        search_from = max(0, len(self.buffer) - len(self.delimiter) + 1) if self.delimiter else 0
+        self.buffer += chunk
+
+        if self.delimiter:
+            end = self.buffer.find(self.delimiter, search_from)
+            if end != -1:
+                self.end = end
+        elif self.delimiter_type == "Length Prefix":
+            # The header says exactly how many payload bytes follow it
+            if self.header is None:
+                self.header = PayloadHeader.unpack(self.buffer)
+            if self.header is not None:
+                self.start = self.header.size
+                if self.received >= self.header.length:
+                    self.end = self.start + self.header.length - self.released
+
+        # Cap the payload at max_bytes, whether or not its end was found too
+        framed = self.delimiter_type == "Length Prefix"
+        if self.max_bytes is not None and (self.header is not None or not framed):
+            limit = self.start + self.max_bytes - self.released
+            if self.end is not None:
+                self.end = min(self.end, limit)
+            elif self.received >= self.max_bytes:
+                self.end = limit
+        return self.end is not None
+
+    @property
+    def received(self) -> int:
+        # Payload bytes seen so far, including any already drained
+        return len(self.buffer) - self.start + self.released
+
+    def drain(self) -> bytes:
+        # Hand over the payload bytes found so far and drop them from the
+        # buffer, so a long framed payload need not be held whole. Only
+        # framed payloads can be drained before their end is known.
+        if self.header is None:
+            return b""
+        stop = self.end if self.end is not None else len(self.buffer)
+        data = bytes(self.buffer[self.start:stop])
+        del self.buffer[self.start:stop]
+        self.released += len(data)
+        if self.end is not None:
+            self.end = self.start
+        return data
+
+    def payload(self) -> bytes:
+        # Bytes between the header (if any) and the delimiter, less any drained
+        return bytes(self.buffer[self.start:self.end])
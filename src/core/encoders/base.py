@@ -1,4 +1,6 @@
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
 from dataclasses import dataclass
 from typing import Any
 
@@ -9,6 +11,38 @@ class EncodeResult:
     message: str
     capacity_used: int = 0
     capacity_total: int = 0
+    output_path: str = None
+    preview: Any = None    # when asked for: WaveformEnvelope for audio, the embedded Raster for images
+    saved: Future = None   # resolves to output_path once the file is written
+
+    def wait(self, timeout=None) -> str:
+        # Block until the output file is written; re-raises a failed save
+        if self.saved is not None:
+            return self.saved.result(timeout)
+        return self.output_path
+
+
+def start_save(save, output_path: str, background: bool = False) -> Future:
+    # Run save() now, or on a separate thread when background is set, and
+    # return a Future for output_path. The thread is not a daemon, so the
+    # interpreter waits for a pending save before exiting.
+    future = Future()
+    if not background:
+        save()
+        future.set_result(output_path)
+        return future
+
+    def run():
+        try:
+            save()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(output_path)
+
+    threading.Thread(target=run, name=f"save {output_path}").start()
+    return future
+
 
 class BaseEncoder(ABC):
     @property
@@ -16,4 +50,4 @@ class BaseEncoder(ABC):
     def name(self) -> str: ...
 
     @abstractmethod
-    def encode(self, carrier_path: str, payload: bytes, settings: dict) -> EncodeResult: ...
+    def encode(self, carrier_path: str, payload: bytes, settings, output_path: str, type: str, **options) -> EncodeResult: ...
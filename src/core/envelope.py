@@ -0,0 +1,174 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from core.progress import ProgressTracker
+
+# Min/max waveform envelopes for audio previews. Level 0 holds the minimum and
+# maximum of every BASE_BIN frames; each further level merges LEVEL_FACTOR
+# bins of the level below, down to about MIN_BINS bins. A view of any time
+# range is drawn from the coarsest level that still has a bin per pixel, and
+# zooming in past level 0 reads the raw frames of just that range.
+
+BASE_BIN = 256
+LEVEL_FACTOR = 4
+MIN_BINS = 512
+
+# Frames read per block when building an envelope from a file
+ENVELOPE_BLOCK_FRAMES = BASE_BIN * 4096
+
+# Envelopes kept in memory, most recently used last
+ENVELOPE_CACHE_SIZE = 8
+
+
+def _bin_extrema(samples: np.ndarray, bin_frames: int):
+    # (mins, maxs) of consecutive bins of bin_frames rows; the last bin may be
+    # short. Reducing contiguous channel rows is several times faster than
+    # reducing the interleaved frames directly.
+    n_full = samples.shape[0] // bin_frames
+    columns = np.ascontiguousarray(samples[:n_full * bin_frames].T).reshape(samples.shape[1], n_full, bin_frames)
+    mins, maxs = columns.min(axis=2).T, columns.max(axis=2).T
+    tail = samples[n_full * bin_frames:]
+    if len(tail):
+        mins = np.concatenate((mins, tail.min(axis=0, keepdims=True)))
+        maxs = np.concatenate((maxs, tail.max(axis=0, keepdims=True)))
+    return mins, maxs
+
+
+class WaveformEnvelope:
+    def __init__(self, mins: np.ndarray, maxs: np.ndarray, samplerate: int, frames: int, path: str = None):
+        # mins and maxs are the level 0 extrema, shape (bins, channels)
+        self.samplerate = samplerate
+        self.frames = frames
+        self.channels = mins.shape[1]
+        self.path = path
+        self.levels = [(mins, maxs)]
+        while len(self.levels[-1][0]) > MIN_BINS:
+            lower_mins, lower_maxs = self.levels[-1]
+            self.levels.append((_bin_extrema(lower_mins, LEVEL_FACTOR)[0], _bin_extrema(lower_maxs, LEVEL_FACTOR)[1]))
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.samplerate
+
+    def bin_frames(self, level: int) -> int:
+        return BASE_BIN * LEVEL_FACTOR ** level
+
+    @classmethod
+    def from_array(cls, data: np.ndarray, samplerate: int, path: str = None) -> "WaveformEnvelope":
+        # Build from samples already in memory (or memory-mapped), one block
+        # of whole bins at a time so the working copies stay small
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        builder = EnvelopeBuilder(data.shape[1], samplerate)
+        for start in range(0, data.shape[0], ENVELOPE_BLOCK_FRAMES):
+            builder.add(data[start:start + ENVELOPE_BLOCK_FRAMES])
+        return builder.build(path)
+
+    @classmethod
+    def from_file(cls, path: str, progress=None, cancel=None) -> "WaveformEnvelope":
+        # Build by streaming the file in blocks of whole bins, so memory stays
+        # at one block however long the file is
+        import soundfile as sf
+
+        with sf.SoundFile(path) as src:
+            tracker = ProgressTracker(progress, cancel)
+            tracker.start(src.frames)
+            builder = EnvelopeBuilder(src.channels, src.samplerate)
+            blocks = src.blocks(blocksize=ENVELOPE_BLOCK_FRAMES, dtype='float32', always_2d=True)
+            for block in tracker.track(blocks):
+                builder.add(block)
+            tracker.finish()
+            return builder.build(path)
+
+    def view(self, start: float, end: float, width: int):
+        # (times, mins, maxs) covering start..end seconds with about one bin per
+        # pixel of width. Below level 0 the raw frames are read from the file.
+        start_frame = max(0, int(start * self.samplerate))
+        end_frame = min(self.frames, int(np.ceil(end * self.samplerate)))
+        if end_frame <= start_frame:
+            empty = np.zeros((0, self.channels), dtype=np.float32)
+            return np.zeros(0), empty, empty
+        frames_per_pixel = (end_frame - start_frame) / max(1, width)
+
+        if frames_per_pixel < BASE_BIN and self.path is not None:
+            import soundfile as sf
+            samples, _ = sf.read(self.path, start=start_frame, stop=end_frame, dtype='float32', always_2d=True)
+            times = (start_frame + np.arange(len(samples))) / self.samplerate
+            return times, samples, samples
+
+        level = 0
+        while level + 1 < len(self.levels) and self.bin_frames(level + 1) <= frames_per_pixel:
+            level += 1
+        bin_frames = self.bin_frames(level)
+        first = start_frame // bin_frames
+        last = -(-end_frame // bin_frames)
+        mins, maxs = self.levels[level]
+        times = np.arange(first, min(last, len(mins))) * bin_frames / self.samplerate
+        return times, mins[first:last], maxs[first:last]
+
+
+class EnvelopeBuilder:
+    # Accumulates level 0 extrema from consecutive (frames, channels) blocks of
+    # any size, so an envelope can be built while samples stream past for
+    # another purpose. Integer samples are scaled to -1..1 like float reads.
+
+    def __init__(self, channels: int, samplerate: int):
+        self.channels = channels
+        self.samplerate = samplerate
+        self.frames = 0
+        self._mins = []
+        self._maxs = []
+        self._carry = None
+        self._scale = None
+
+    def add(self, block: np.ndarray):
+        if block.ndim == 1:
+            block = block.reshape(-1, 1)
+        if self._scale is None and np.issubdtype(block.dtype, np.integer):
+            self._scale = np.float32(1.0 / (np.iinfo(block.dtype).max + 1))
+        self.frames += block.shape[0]
+        if self._carry is not None and len(self._carry):
+            block = np.concatenate((self._carry, block))
+        n_full = block.shape[0] // BASE_BIN * BASE_BIN
+        if n_full:
+            self._append(*_bin_extrema(block[:n_full], BASE_BIN))
+        self._carry = block[n_full:].copy()
+
+    def _append(self, mins, maxs):
+        if self._scale is not None:
+            mins, maxs = mins.astype(np.float32) * self._scale, maxs.astype(np.float32) * self._scale
+        self._mins.append(mins)
+        self._maxs.append(maxs)
+
+    def build(self, path: str = None) -> WaveformEnvelope:
+        if self._carry is not None and len(self._carry):
+            self._append(*_bin_extrema(self._carry, BASE_BIN))
+            self._carry = None
+        if not self._mins:
+            empty = np.zeros((0, self.channels), dtype=np.float32)
+            return WaveformEnvelope(empty, empty, self.samplerate, 0, path)
+        return WaveformEnvelope(np.concatenate(self._mins), np.concatenate(self._maxs), self.samplerate, self.frames, path)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_envelope(path: str, progress=None, cancel=None) -> WaveformEnvelope:
+    # Envelope of the audio file at path, cached until the file changes
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    envelope = WaveformEnvelope.from_file(path, progress, cancel)
+    with _cache_lock:
+        _cache[key] = envelope
+        while len(_cache) > ENVELOPE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return envelope
@@ -0,0 +1,74 @@
+import struct
+from dataclasses import dataclass
+
+# Framed payload format used by the "Length Prefix" delimiter:
+#
+#   magic (4) | version (1) | flags (1) | extra length (2) | payload length (8) | extra | payload
+#
+# All integers are big endian. "extra" carries optional per-flag parameters as
+# a sequence of records keyed by the flag they belong to:
+#
+#   flag (1) | length (2) | data
+
+HEADER_MAGIC = b"SPAL"
+HEADER_VERSION = 1
+
+FLAG_ENCRYPTED = 0x01
+FLAG_COMPRESSED = 0x02
+
+_HEADER = struct.Struct(">4sBBHQ")
+HEADER_SIZE = _HEADER.size
+
+_EXTRA_RECORD = struct.Struct(">BH")
+EXTRA_RECORD_SIZE = _EXTRA_RECORD.size
+
+
+@dataclass
+class PayloadHeader:
+    length: int
+    flags: int = 0
+    extra: bytes = b""
+    version: int = HEADER_VERSION
+
+    @property
+    def size(self) -> int:
+        # Bytes taken by the header including its extra data
+        return HEADER_SIZE + len(self.extra)
+
+    def pack(self) -> bytes:
+        return _HEADER.pack(HEADER_MAGIC, self.version, self.flags, len(self.extra), self.length) + self.extra
+
+    @classmethod
+    def unpack(cls, data: bytes):
+        # Parse a header from the start of data; None if more bytes are needed
+        if len(data) < HEADER_SIZE:
+            return None
+        magic, version, flags, extra_length, length = _HEADER.unpack_from(data)
+        if magic != HEADER_MAGIC:
+            raise ValueError("No payload header found. Check the decoding settings.")
+        if version > HEADER_VERSION:
+            raise ValueError(f"Unsupported payload header version {version}.")
+        if len(data) < HEADER_SIZE + extra_length:
+            return None
+        extra = bytes(data[HEADER_SIZE:HEADER_SIZE + extra_length])
+        return cls(length=length, flags=flags, extra=extra, version=version)
+
+
+def pack_extra(records: dict) -> bytes:
+    # Header extra data from a {flag: parameters} dict
+    return b"".join(_EXTRA_RECORD.pack(flag, len(data)) + data for flag, data in records.items())
+
+
+def unpack_extra(extra: bytes) -> dict:
+    records = {}
+    offset = 0
+    while offset < len(extra):
+        if offset + EXTRA_RECORD_SIZE > len(extra):
+            raise ValueError("Corrupt payload header.")
+        flag, length = _EXTRA_RECORD.unpack_from(extra, offset)
+        offset += EXTRA_RECORD_SIZE
+        if offset + length > len(extra):
+            raise ValueError("Corrupt payload header.")
+        records[flag] = bytes(extra[offset:offset + length])
+        offset += length
+    return records
@@ -0,0 +1,139 @@
+import os
+import struct
+
+import numpy as np
+
+# Memory-mapped access to the sample/pixel data of uncompressed carriers, so
+# LSB embedding only touches the pages that hold payload.
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# BMP pixels are stored as B, G, R
+BMP_LAYOUT = "BGR"
+
+# Raw TIFF strips holding 16-bit RGB(A) samples, by the raw mode Pillow gives
+# them; Pillow itself can only load such carriers as 8-bit
+TIFF16_RAWMODES = {
+    "RGB;16L": ("<u2", "RGB"), "RGB;16B": (">u2", "RGB"), "RGB;16N": ("=u2", "RGB"),
+    "RGBA;16L": ("<u2", "RGBA"), "RGBA;16B": (">u2", "RGBA"), "RGBA;16N": ("=u2", "RGBA"),
+}
+
+
+def wav_layout(path: str):
+    # (data offset, frames, channels) of a 16-bit PCM WAV, or None
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                fmt = f.read(size)
+                if len(fmt) < 16:
+                    return None
+            elif chunk_id == b"data":
+                break
+            else:
+                f.seek(size, 1)
+            if size % 2:
+                f.seek(1, 1)
+        data_offset = f.tell()
+
+    if fmt is None:
+        return None
+    format_tag, channels, _, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+    if format_tag != WAVE_FORMAT_PCM or bits != 16 or block_align != 2 * channels:
+        return None
+    size = min(size, os.path.getsize(path) - data_offset)
+    return data_offset, size // block_align, channels
+
+
+def bmp_layout(path: str):
+    # (pixel offset, width, height, row stride, bottom_up) of a 24-bit BI_RGB BMP, or None
+    with open(path, 'rb') as f:
+        header = f.read(34)
+    if len(header) < 34 or header[:2] != b"BM":
+        return None
+    offset, dib_size = struct.unpack("<II", header[10:18])
+    if dib_size < 40:
+        return None
+    width, height, _, bits, compression = struct.unpack("<iiHHI", header[18:34])
+    if bits != 24 or compression != 0 or width <= 0 or height == 0:
+        return None
+    stride = (width * 3 + 3) // 4 * 4
+    return offset, width, abs(height), stride, height > 0
+
+
+def tiff_layout(path: str):
+    # (pixel offset, width, height, dtype, channel layout) of an uncompressed
+    # 16-bit RGB or RGBA TIFF whose strips are stored in order, or None
+    with open(path, 'rb') as f:
+        if f.read(4) not in (b"II*\0", b"MM\0*"):
+            return None
+    from core.tiles import open_carrier
+
+    with open_carrier(path) as img:
+        width, height, tiles = img.width, img.height, img.tile
+    offset = None
+    for tile in tiles:
+        codec, (x0, y0, x1, y1), start, args = tile[:4]
+        rawmode = args[0] if isinstance(args, tuple) else args
+        if codec != "raw" or rawmode not in TIFF16_RAWMODES or (x0, x1) != (0, width):
+            return None
+        dtype, layout = TIFF16_RAWMODES[rawmode]
+        if offset is None:
+            offset = start
+        if start != offset + y0 * width * len(layout) * 2:
+            return None
+    if offset is None:
+        return None
+    return offset, width, height, dtype, layout
+
+
+def map_wav(path: str, layout, mode: str = "r+") -> np.ndarray:
+    # (frames, channels) int16 view of the WAV sample data
+    offset, frames, channels = layout
+    return np.memmap(path, dtype="<i2", mode=mode, offset=offset, shape=(frames, channels))
+
+
+def map_bmp(path: str, layout, mode: str = "r+") -> np.ndarray:
+    # (height, width, 3) view of the BMP pixels, top row first, channels B, G, R
+    offset, width, height, stride, bottom_up = layout
+    rows = np.memmap(path, dtype=np.uint8, mode=mode, offset=offset, shape=(height, stride))
+    pixels = rows[:, :width * 3].reshape(height, width, 3)
+    return pixels[::-1] if bottom_up else pixels
+
+
+def map_tiff(path: str, layout, mode: str = "r+") -> np.ndarray:
+    # (height, width, channels) view of 16-bit TIFF samples, top row first
+    offset, width, height, dtype, channels = layout
+    return np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=(height, width, len(channels)))
+
+
+def image_layout(path: str):
+    # ("bmp", layout) or ("tiff", layout) for image carriers that can be
+    # memory-mapped, or None
+    layout = bmp_layout(path)
+    if layout is not None:
+        return "bmp", layout
+    layout = tiff_layout(path)
+    if layout is not None:
+        return "tiff", layout
+    return None
+
+
+def map_image(path: str, layout, mode: str = "r+"):
+    # (pixels, channel layout) for an image_layout result: a (height, width,
+    # channels) view, top row first, and the names of its channels
+    kind, layout = layout
+    if kind == "bmp":
+        return map_bmp(path, layout, mode), BMP_LAYOUT
+    return map_tiff(path, layout, mode), layout[4]
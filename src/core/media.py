@@ -0,0 +1,14 @@
+import os
+
+IMAGE_EXTENSIONS = {".png", ".bmp", ".tif", ".tiff"}
+AUDIO_EXTENSIONS = {".wav", ".flac"}
+
+
+def detect_media_type(path: str) -> str:
+    # "image" or "audio" from the file extension
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return "image"
+    if ext in AUDIO_EXTENSIONS:
+        return "audio"
+    raise ValueError(f"Cannot tell the media type of {path}.")
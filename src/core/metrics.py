@@ -0,0 +1,304 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+# Timing spans for encode and decode. An operation (encode, decode) opens a
+# root span and its phases (load, encrypt, frame, embed, extract, decrypt,
+# save) open child spans; each finished span is passed to every registered
+# sink as a dict:
+#
+#   {"name": "embed", "operation": "encode", "parent": "encode",
+#    "seconds": 0.0123, "bytes": 4096, "time": 1760000000.0, ...fields}
+#
+# Root spans also carry "peak_bytes" when memory tracking is on. With no
+# sinks registered span() returns a shared no-op span, so instrumented code
+# costs one function call per span.
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_track_memory = False
+
+_current = contextvars.ContextVar("stega_pal_span", default=None)
+
+# Root spans running now; tracemalloc is started by the first and stopped by
+# the last, so concurrent operations report the peak they shared
+_active_roots = 0
+_started_tracing = False
+_roots_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+def add_sink(sink, memory: bool = None):
+    # Register a sink: any object with emit(record). memory turns peak memory
+    # tracking (tracemalloc) on or off for every sink.
+    global _track_memory
+    with _sinks_lock:
+        _sinks.append(sink)
+        if memory is not None:
+            _track_memory = memory
+    return sink
+
+
+def remove_sink(sink):
+    global _track_memory
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+        if not _sinks:
+            _track_memory = False
+
+
+def emit(record: dict):
+    for sink in list(_sinks):
+        sink.emit(record)
+
+
+class Span:
+    __slots__ = ("name", "fields", "parent", "start", "_token", "_root")
+
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        # Attach values known only once the work is done, e.g. bytes=len(data)
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self._token = _current.set(self)
+        self._root = self.parent is None and _track_memory
+        if self._root:
+            _enter_root()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _current.reset(self._token)
+        entry = {
+            "name": self.name,
+            "operation": self.operation,
+            "parent": self.parent.name if self.parent is not None else None,
+            "seconds": seconds,
+            "time": time.time(),
+        }
+        if self._root:
+            entry["peak_bytes"] = _exit_root()
+        if exc_type is not None:
+            entry["error"] = exc_type.__name__
+        entry.update(self.fields)
+        emit(entry)
+        return False
+
+    @property
+    def operation(self) -> str:
+        return self.fields.get("operation") or (self.parent.operation if self.parent is not None else self.name)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **fields):
+    # Context manager timing the enclosed block as a span named name. Extra
+    # fields (bytes, media_type, ...) are copied into the record; passing
+    # operation names the operation of a span opened on another thread.
+    if not _sinks:
+        return _NULL_SPAN
+    return Span(name, fields)
+
+
+def record(name: str, seconds: float, **fields):
+    # Emit a span measured by the caller, e.g. time accumulated over the
+    # blocks of a stream
+    if not _sinks:
+        return
+    _emit_measured(name, seconds, _current.get(), fields)
+
+
+def _emit_measured(name, seconds, parent, fields):
+    emit({
+        "name": name,
+        "operation": parent.operation if parent is not None else name,
+        "parent": parent.name if parent is not None else None,
+        "seconds": seconds,
+        "time": time.time(),
+        **fields,
+    })
+
+
+def timed_blocks(blocks, name: str = "load", **fields):
+    # Yield blocks unchanged, recording the time spent producing them and
+    # their total size as one span once the iteration ends
+    if not _sinks:
+        return blocks
+    # The parent is fixed here: a generator abandoned early is only closed
+    # once collected, outside the span it ran in
+    return _timed_blocks(blocks, name, _current.get(), fields)
+
+
+def _timed_blocks(blocks, name, parent, fields):
+    seconds, size = 0.0, 0
+    iterator = iter(blocks)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                block = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+            size += block.nbytes if hasattr(block, "nbytes") else len(block)
+            yield block
+    finally:
+        _emit_measured(name, seconds, parent, {"bytes": size, **fields})
+
+
+def _enter_root():
+    global _active_roots, _started_tracing
+    with _roots_lock:
+        if _active_roots == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracing = True
+            if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                tracemalloc.reset_peak()
+        _active_roots += 1
+
+
+def _exit_root() -> int:
+    global _active_roots, _started_tracing
+    with _roots_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        _active_roots -= 1
+        if _active_roots == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+        return peak
+
+
+class LoggingSink:
+    # One log line per span
+    def __init__(self, logger: logging.Logger = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger("stega_pal.metrics")
+        self.level = level
+
+    def emit(self, record: dict):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        name = record["name"] if record["parent"] is None else f"{record['operation']}.{record['name']}"
+        message = f"{name} {record['seconds'] * 1000:.1f} ms"
+        if record.get("bytes") is not None:
+            message += f" {record['bytes']} bytes"
+        if record.get("peak_bytes") is not None:
+            message += f" peak {record['peak_bytes'] / (1024 * 1024):.1f} MB"
+        if record.get("error"):
+            message += f" failed: {record['error']}"
+        self.logger.log(self.level, message, extra={"span": record})
+
+
+class JsonLinesSink:
+    # One JSON object per span, appended to a file or written to a stream
+    def __init__(self, target):
+        self._owned = isinstance(target, (str, os.PathLike))
+        self._stream = open(target, "a", encoding="utf-8") if self._owned else target
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._stream.write(line)
+            self._stream.flush()
+
+    def close(self):
+        if self._owned:
+            self._stream.close()
+
+
+class PrometheusSink:
+    # Aggregates spans into Prometheus text exposition format: per operation
+    # and span a seconds summary, a bytes counter and an error counter, plus
+    # the largest peak memory seen per operation
+    PREFIX = "stega_pal"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = {}
+        self._counts = {}
+        self._bytes = {}
+        self._errors = {}
+        self._peaks = {}
+
+    def emit(self, record: dict):
+        key = (record["operation"], record["name"])
+        with self._lock:
+            self._seconds[key] = self._seconds.get(key, 0.0) + record["seconds"]
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if record.get("bytes") is not None:
+                self._bytes[key] = self._bytes.get(key, 0) + record["bytes"]
+            if record.get("error"):
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if record.get("peak_bytes") is not None:
+                operation = record["operation"]
+                self._peaks[operation] = max(self._peaks.get(operation, 0), record["peak_bytes"])
+
+    def render(self) -> str:
+        p = self.PREFIX
+        with self._lock:
+            lines = [
+                f"# HELP {p}_span_seconds Time spent in each span of an operation.",
+                f"# TYPE {p}_span_seconds summary",
+            ]
+            for key in sorted(self._counts):
+                lines.append(f"{p}_span_seconds_sum{_labels(key)} {self._seconds[key]:.6f}")
+                lines.append(f"{p}_span_seconds_count{_labels(key)} {self._counts[key]}")
+            lines += [
+                f"# HELP {p}_span_bytes_total Bytes processed by each span.",
+                f"# TYPE {p}_span_bytes_total counter",
+            ]
+            lines += [f"{p}_span_bytes_total{_labels(key)} {value}" for key, value in sorted(self._bytes.items())]
+            lines += [
+                f"# HELP {p}_span_errors_total Spans that ended with an exception.",
+                f"# TYPE {p}_span_errors_total counter",
+            ]
+            lines += [f"{p}_span_errors_total{_labels(key)} {value}" for key, value in sorted(self._errors.items())]
+            lines += [
+                f"# HELP {p}_operation_peak_bytes Largest traced memory peak of an operation.",
+                f"# TYPE {p}_operation_peak_bytes gauge",
+            ]
+            lines += [f'{p}_operation_peak_bytes{{operation="{operation}"}} {value}'
+                      for operation, value in sorted(self._peaks.items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        # Replace the file atomically, as the node exporter textfile collector expects
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+
+def _labels(key) -> str:
+    operation, name = key
+    return f'{{operation="{operation}",span="{name}"}}'
@@ -0,0 +1,126 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from core.algo_configs import WidgetType, default_settings, get_algorithm_config
+from core.delimiters import delimiter_bytes
+
+# Settings are validated once per operation and compiled into an immutable
+# EmbeddingPlan. Encoders, decoders and the capacity calculator read the plan
+# rather than the settings dict.
+
+IMAGE_CHANNELS = "RGBA"
+AUDIO_CHANNELS = "LR"
+# Channel order of an RGB pixel array, the default image layout
+RGB_LAYOUT = "RGB"
+
+# Encryption modes whose output is raw binary. Only the payload header can
+# say where binary data ends, and it also carries their KDF parameters.
+STREAM_ENCRYPTION = "AES Stream"
+AEAD_ENCRYPTION = "AES-GCM"
+BINARY_ENCRYPTION = (AEAD_ENCRYPTION, STREAM_ENCRYPTION)
+
+
+@dataclass(frozen=True)
+class EmbeddingPlan:
+    media_type: str
+    bit_planes: int
+    channel_names: tuple     # selected channels, e.g. ("R", "B") or ("L",)
+    delimiter: str
+    encryption: str
+    password: str = field(default="", repr=False)
+    compression: str = "None"
+    compression_level: int = 6
+    # Payload bits are taken from each byte most significant first and fill
+    # the planes of a slot least significant first
+    bit_order: str = "big"
+
+    @classmethod
+    def from_settings(cls, settings, media_type: str, algorithm: str = "LSB", operation: str = "encode") -> "EmbeddingPlan":
+        # Validate settings against the algorithm's configuration; unset values
+        # take the same defaults the settings panel shows. Raises ValueError.
+        config = get_algorithm_config(f"{media_type}_{operation}", algorithm)
+        values = default_settings(config)
+        values.update(settings.get_all_settings())
+
+        for setting in config.settings:
+            value = values[setting.key]
+            if setting.widget_type == WidgetType.SPINBOX:
+                if not isinstance(value, (int, np.integer)) or not setting.min_value <= value <= setting.max_value:
+                    raise ValueError(f"{setting.label} must be between {setting.min_value} and {setting.max_value}.")
+            elif setting.widget_type == WidgetType.COMBOBOX:
+                if value not in setting.options:
+                    raise ValueError(f"Unknown {setting.label.lower()} '{value}'.")
+            elif setting.widget_type == WidgetType.MULTI_CHECKBOX:
+                unknown = [name for name in value if name not in setting.options]
+                if unknown:
+                    raise ValueError(f"Unknown {setting.label.lower()}: {', '.join(unknown)}.")
+
+        if values["encryption"] in BINARY_ENCRYPTION and values["delimiter"] != "Length Prefix":
+            raise ValueError(f"{values['encryption']} encryption needs the Length Prefix delimiter.")
+        # Only the payload header can record the codec; decode settings have none
+        compression = values.get("compression", "None")
+        if compression != "None" and values["delimiter"] != "Length Prefix":
+            raise ValueError("Compression needs the Length Prefix delimiter.")
+
+        names = IMAGE_CHANNELS if media_type == "image" else AUDIO_CHANNELS
+        selected = values["color_channels"] if media_type == "image" else values["audio_channels"]
+        return cls(
+            media_type=media_type,
+            bit_planes=int(values["bit_planes"]),
+            channel_names=tuple(name for name in names if name in selected),
+            delimiter=values["delimiter"],
+            encryption=values["encryption"],
+            password=values.get("password") or "",
+            compression=compression,
+            compression_level=int(values.get("compression_level", 6)),
+        )
+
+    @property
+    def plane_mask(self) -> int:
+        # The bits of a sample that carry payload
+        return (1 << self.bit_planes) - 1
+
+    @property
+    def encrypted(self) -> bool:
+        return self.encryption != "None"
+
+    @property
+    def compressed(self) -> bool:
+        # Whether the payload may be compressed; an incompressible one is not
+        return self.compression != "None"
+
+    @property
+    def sealed(self) -> bool:
+        # Whether the payload is encrypted in one piece with compact AES-GCM
+        return self.encryption == AEAD_ENCRYPTION
+
+    @property
+    def streamed(self) -> bool:
+        # Whether the payload is encrypted in authenticated segments
+        return self.encryption == STREAM_ENCRYPTION
+
+    @property
+    def framed(self) -> bool:
+        # Whether the payload is preceded by a PayloadHeader
+        return self.delimiter == "Length Prefix"
+
+    @property
+    def delimiter_bytes(self):
+        return delimiter_bytes(self.delimiter)
+
+    def channel_indices(self, n_channels: int = 3, layout: str = RGB_LAYOUT) -> np.ndarray:
+        # Indices of the selected channels within a unit, in slot order.
+        # layout names the image channels as stored, e.g. "BGR" for BMP or
+        # "LA" for grayscale with alpha; selected channels the carrier lacks
+        # are skipped. Audio channels past L and R are always used.
+        if self.media_type == "image":
+            names = self.channel_names
+            if "L" in layout:
+                # The gray channel stands in for R, G and B
+                gray = ("L",) if set(names) & set("RGB") else ()
+                names = gray + (("A",) if "A" in names else ())
+            indices = [layout.index(name) for name in names if name in layout]
+        else:
+            indices = [ch for ch in range(n_channels) if ch > 1 or AUDIO_CHANNELS[ch] in self.channel_names]
+        return np.array(indices, dtype=np.intp)
@@ -0,0 +1,76 @@
+import threading
+
+# Progress reporting and cooperative cancellation for long-running operations.
+#
+# Callers pass a progress callback, called as progress(done, total), and a
+# CancelToken. The embed/extract loops check the token between blocks, so a
+# cancel takes effect within one block or strip.
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class CarrierModified(OperationCancelled):
+    # Cancelled after an in-place encode had started patching the carrier,
+    # which is left holding part of the payload. Not undone: restoring the
+    # original bits would need a copy of every slot written.
+    pass
+
+
+class CancelToken:
+    # Thread-safe flag set by the caller and polled by the running operation
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise OperationCancelled("Operation cancelled")
+
+
+class ProgressTracker:
+    # Bundles an optional progress callback and cancel token for the inner
+    # loops, so they do not need to check for None themselves
+
+    def __init__(self, callback=None, cancel: CancelToken = None, total: int = 0):
+        self.callback = callback
+        self.cancel = cancel
+        self.total = total
+        self.done = 0
+
+    def start(self, total: int):
+        self.total = total
+        self.done = 0
+        self.check()
+
+    def check(self):
+        if self.cancel is not None:
+            self.cancel.check()
+
+    def update(self, done: int):
+        # Record absolute progress, then honour a pending cancel
+        self.done = min(done, self.total) if self.total else done
+        if self.callback is not None:
+            self.callback(self.done, self.total)
+        self.check()
+
+    def finish(self):
+        # Report completion; too late to cancel
+        self.done = self.total
+        if self.callback is not None:
+            self.callback(self.done, self.total)
+
+    def track(self, blocks):
+        # Pass blocks of units through, counting units as each one is consumed
+        for units in blocks:
+            self.check()
+            yield units
+            self.update(self.done + units.shape[0])
@@ -0,0 +1,213 @@
+import functools
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from core.bitplanes import BLOCK_UNITS
+from core.tiles import carrier_pixel_limit, strip_rows
+
+# Image carriers as writable NumPy arrays sharing memory with a Pillow image.
+# The array is allocated first and Pillow decodes straight into it, and the
+# Image handed back for saving reads the same memory, so embedding into the
+# array needs no copy of the raster in either direction.
+#
+# Sharing memory relies on Pillow internals: writing through a frombuffer
+# image (Image.readonly), relabelling RGBX memory as RGB (ImagingCore.setmode,
+# Image._new) and decoding into an Image.im assigned before load(). Each is
+# tried once on a tiny image (shares_memory, decodes_in_place); where one
+# fails, rasters fall back to the public API: an array of their own, filled
+# from the decoded image and copied into a new image when saved.
+#
+# Carriers keep their own mode where it holds whole samples (gray, gray with
+# alpha, RGB, RGBA and 16-bit gray), so alpha and 16-bit depth survive and no
+# conversion pass is needed. Pillow stores RGB pixels in four bytes, so an RGB
+# raster is a (height, width, 4) array with layout "RGBX": X is padding.
+
+# Pillow mode -> (mode of the mapped buffer, channel layout, sample dtype)
+MAPPED_MODES = {
+    "L": ("L", "L", np.uint8),
+    "RGB": ("RGBX", "RGBX", np.uint8),
+    "RGBA": ("RGBA", "RGBA", np.uint8),
+    "I;16": ("I;16", "L", "<u2"),
+    "I;16L": ("I;16L", "L", "<u2"),
+    "I;16B": ("I;16B", "L", ">u2"),
+}
+# Modes Pillow cannot map onto a buffer: held in an array of their own and
+# copied into an image when saved
+COPIED_MODES = {
+    "LA": ("LA", np.uint8),
+}
+# Mapped modes when memory cannot be shared: the same samples without padding
+FALLBACK_LAYOUTS = {mode: (layout.replace("X", ""), dtype) for mode, (_, layout, dtype) in MAPPED_MODES.items()}
+NATIVE_MODES = tuple(MAPPED_MODES) + tuple(COPIED_MODES)
+
+# Native modes each output format stores as they are; formats not listed
+# (TIFF) store them all. Pillow writes RGBA to BMP without its alpha and
+# reads it back as RGB.
+OUTPUT_MODES = {
+    ".png": {"L", "LA", "RGB", "RGBA", "I;16", "I;16B"},
+    ".bmp": {"L", "RGB"},
+}
+# What a carrier is embedded as when its output format cannot store its mode:
+# the same samples, less the alpha channel
+FALLBACK_MODES = {"I;16L": "I;16", "LA": "L", "RGBA": "RGB"}
+
+
+class Raster:
+    def __init__(self, mode: str, array: np.ndarray, layout: str, image: Image.Image = None):
+        self.mode = mode
+        self.array = array      # (height, width, channels) as stored
+        self.layout = layout    # channel names in storage order
+        self.image = image      # Pillow image over array's memory, if it can have one
+
+    @property
+    def units(self) -> np.ndarray:
+        # The pixels as a (pixels, channels) view
+        return self.array.reshape(-1, self.array.shape[-1])
+
+    def to_image(self) -> Image.Image:
+        # The shared image, or for copied modes a new image of the array
+        if self.image is not None:
+            return self.image
+        return Image.fromarray(self.array[..., 0] if self.array.shape[-1] == 1 else self.array)
+
+
+def native_mode(img: Image.Image) -> str:
+    # The mode a carrier is embedded in: its own where supported, else RGBA if
+    # it has transparency and RGB otherwise
+    if img.mode in NATIVE_MODES:
+        return img.mode
+    if img.mode == "I":
+        return "I;16"
+    if "A" in img.getbands() or "a" in img.getbands() or "transparency" in img.info:
+        return "RGBA"
+    return "RGB"
+
+
+def band_layout(mode: str) -> str:
+    # Channel names of np.asarray(image) for a native mode
+    return "L" if mode.startswith("I;16") else mode
+
+
+def output_mode(mode: str, channel_names, output_path: str) -> str:
+    # The mode to embed a carrier of native mode in when saving to output_path.
+    # Alpha is dropped only if no payload goes in it; otherwise, and for
+    # depths the format cannot hold, the output format is refused.
+    ext = os.path.splitext(output_path)[1].lower()
+    stored = OUTPUT_MODES.get(ext)
+    if stored is None or mode in stored:
+        return mode
+    fallback = FALLBACK_MODES.get(mode)
+    if fallback is None or fallback not in stored:
+        raise ValueError(f"{ext[1:].upper()} output cannot store {mode} carriers; save as PNG or TIFF.")
+    if "A" in channel_names and "A" in mode and "A" not in fallback:
+        raise ValueError(f"{ext[1:].upper()} output cannot store the alpha channel the payload is "
+                         f"embedded in; save as PNG or TIFF.")
+    return fallback
+
+
+def check_depth(img: Image.Image):
+    # Pillow loads 16-bit RGB(A) as 8-bit; refuse instead of losing the depth
+    for tile in img.tile:
+        args = tile[3]
+        rawmode = args[0] if isinstance(args, tuple) else args
+        if img.mode in ("RGB", "RGBA") and isinstance(rawmode, str) and ";16" in rawmode:
+            raise ValueError("16-bit RGB carriers are supported as uncompressed TIFF only, "
+                             "saved to a TIFF output.")
+
+
+def _map(mode: str, array: np.ndarray) -> Image.Image:
+    # A writable image of mode over array's memory (Pillow internals)
+    buffer_mode = MAPPED_MODES[mode][0]
+    height, width = array.shape[:2]
+    image = Image.frombuffer(buffer_mode, (width, height), array, "raw", buffer_mode, 0, 1)
+    if buffer_mode != mode:
+        # Same pixel size, so Pillow can relabel the mapped memory in place
+        core = image.im
+        core.setmode(mode)
+        image = image._new(core)
+    # The buffer is ours to write, so Pillow need not copy it on write
+    image.readonly = 0
+    return image
+
+
+@functools.lru_cache(maxsize=None)
+def shares_memory() -> bool:
+    # Whether this Pillow can map and write through a raster's memory
+    try:
+        array = np.zeros((1, 1, 4), dtype=np.uint8)
+        image = _map("RGB", array)
+        image.paste((1, 2, 3), (0, 0, 1, 1))
+        return image.mode == "RGB" and array[0, 0, :3].tolist() == [1, 2, 3]
+    except Exception:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def decodes_in_place() -> bool:
+    # Whether this Pillow's load() decodes into an Image.im assigned before it
+    if not shares_memory():
+        return False
+    try:
+        buffer = io.BytesIO()
+        Image.new("L", (2, 2), 7).save(buffer, "PNG")
+        array = np.zeros((2, 2, 1), dtype=np.uint8)
+        target = _map("L", array).im
+        with Image.open(buffer) as img:
+            img.im = target
+            img.load()
+            return img.im is target and array.ravel().tolist() == [7] * 4
+    except Exception:
+        return False
+
+
+def new_raster(mode: str, size) -> Raster:
+    # An uninitialised raster of mode and size (width, height)
+    width, height = size
+    if mode in COPIED_MODES or not shares_memory():
+        layout, dtype = COPIED_MODES[mode] if mode in COPIED_MODES else FALLBACK_LAYOUTS[mode]
+        return Raster(mode, np.empty((height, width, len(layout)), dtype=dtype), layout)
+
+    _, layout, dtype = MAPPED_MODES[mode]
+    array = np.empty((height, width, len(layout)), dtype=dtype)
+    return Raster(mode, array, layout, _map(mode, array))
+
+
+def load_raster(path: str, mode: str = None) -> Raster:
+    # Decode the image at path into a new raster in mode, by default its
+    # native mode
+    with carrier_pixel_limit():
+        return _decode_raster(path, mode)
+
+
+def _decode_raster(path: str, mode: str) -> Raster:
+    img = Image.open(path)
+    check_depth(img)
+    mode = mode or native_mode(img)
+    raster = new_raster(mode, img.size)
+    if raster.image is not None and img.mode == mode and decodes_in_place():
+        img.im = raster.image.im
+        img.load()
+        if img.im is raster.image.im:
+            # Decoded in place; keep the opened image for its format info
+            img.readonly = 0
+            raster.image = img
+            return raster
+        # Pillow mapped an uncompressed file itself; copy it over below
+    else:
+        img.load()
+
+    rows = strip_rows(img.width, BLOCK_UNITS)
+    for top in range(0, img.height, rows):
+        box = (0, top, img.width, min(top + rows, img.height))
+        strip = img.crop(box)
+        if strip.mode != mode:
+            strip = strip.convert(mode)
+        if raster.image is not None:
+            raster.image.paste(strip, box)
+        else:
+            raster.array[top:box[3]] = np.asarray(strip).reshape(box[3] - top, img.width, -1)
+    img.close()
+    return raster
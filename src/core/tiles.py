@@ -0,0 +1,194 @@
+import contextlib
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+# Horizontal-strip access to image carriers. The payload is written in
+# row-major order, so only the top strips of a carrier ever hold payload.
+
+# Gigapixel mosaics are legitimate carriers, so carriers are opened with
+# Pillow's decompression-bomb limit lifted to 32768 x 32768 pixels. The limit
+# is only lifted around the opens, loads and crops of a carrier, where Pillow
+# checks it; other images the process opens keep the guard.
+MAX_CARRIER_PIXELS = 1 << 30
+
+
+@contextlib.contextmanager
+def carrier_pixel_limit():
+    previous = Image.MAX_IMAGE_PIXELS
+    if previous is not None:
+        Image.MAX_IMAGE_PIXELS = max(previous, MAX_CARRIER_PIXELS)
+    try:
+        yield
+    finally:
+        Image.MAX_IMAGE_PIXELS = previous
+
+
+def open_carrier(path: str) -> Image.Image:
+    # Image.open for a carrier, allowing up to MAX_CARRIER_PIXELS
+    with carrier_pixel_limit():
+        return Image.open(path)
+
+
+def strip_rows(width: int, units: int) -> int:
+    # Rows per strip so a strip holds about units pixels
+    return max(1, units // max(1, width))
+
+
+def crop_strips(img: Image, rows: int):
+    # Yield consecutive strips of at most rows rows from a loaded image
+    for top in range(0, img.height, rows):
+        with carrier_pixel_limit():
+            strip = img.crop((0, top, img.width, min(top + rows, img.height)))
+        yield strip
+
+
+def read_prefix(path: str, rows: int):
+    # Decode only the first rows rows of a non-interlaced PNG, by cutting its
+    # tile and size short (Pillow internals: ImageFile.tile and Image._size).
+    # Returns None for formats, or Pillow versions, that cannot be decoded
+    # partially; callers then decode the whole image.
+    img = open_carrier(path)
+    if img.format != "PNG" or img.info.get("interlace") or len(img.tile) != 1 or not hasattr(img, "_size"):
+        img.close()
+        return None
+    rows = min(rows, img.height)
+    try:
+        tile = img.tile[0]
+        img._size = (img.width, rows)
+        img.tile = [(tile[0], (0, 0, img.width, rows)) + tuple(tile[2:])]
+        with carrier_pixel_limit():
+            img.load()
+    except (AttributeError, TypeError, ValueError):
+        img.close()
+        return None
+    if img.im.size != (img.width, rows):
+        img.close()
+        return None
+    return img
+
+
+def iter_strips(path: str, rows: int):
+    # Yield strips of the image at path, decoding rows lazily where the format
+    # allows it. The decoded prefix doubles as needed, so total decode work
+    # stays within twice the rows actually consumed.
+    with open_carrier(path) as img:
+        width, height = img.size
+    prefix = read_prefix(path, rows)
+    if prefix is None:
+        with open_carrier(path) as img:
+            with carrier_pixel_limit():
+                img.load()
+            yield from crop_strips(img, rows)
+        return
+
+    for top in range(0, height, rows):
+        bottom = min(top + rows, height)
+        if bottom > prefix.height:
+            prefix = read_prefix(path, max(bottom, 2 * prefix.height))
+        with carrier_pixel_limit():
+            strip = prefix.crop((0, top, width, bottom))
+        yield strip
+
+
+# Streamed PNG rewriting. The rows holding payload are written unfiltered
+# from the embedded strips; every row after them keeps its original filtered
+# bytes, which stay valid because the row above each of them is unchanged.
+# The first row after the payload may be filtered against the last payload
+# row, so callers hand over one row more than the payload needs.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Pillow mode -> raw mode of the PNG rows
+PNG_ROW_MODES = {"L": "L", "LA": "LA", "RGB": "RGB", "RGBA": "RGBA", "I;16": "I;16B"}
+PNG_COMPRESS_LEVEL = 6      # Pillow's default
+IDAT_SIZE = 1024 * 1024     # largest IDAT chunk written, and zlib output step
+
+_CHUNK_HEAD = struct.Struct(">I4s")
+
+
+def png_stream_mode(path: str):
+    # Mode of a PNG whose rows can be streamed (one frame, not interlaced,
+    # whole-byte samples), else None
+    with open_carrier(path) as img:
+        if img.format != "PNG" or img.info.get("interlace") or getattr(img, "n_frames", 1) != 1:
+            return None
+        if img.mode not in PNG_ROW_MODES or len(img.tile) != 1:
+            return None
+        args = img.tile[0][3]
+        rawmode = args[0] if isinstance(args, tuple) else args
+        return img.mode if rawmode == PNG_ROW_MODES[img.mode] else None
+
+
+def _iter_png_chunks(f):
+    # (type, data) for each chunk of an open PNG file, after the signature
+    while True:
+        head = f.read(_CHUNK_HEAD.size)
+        if len(head) < _CHUNK_HEAD.size:
+            raise ValueError("Truncated PNG file.")
+        length, kind = _CHUNK_HEAD.unpack(head)
+        data = f.read(length)
+        f.read(4)   # CRC, checked by Pillow when the rows were decoded
+        yield kind, data
+        if kind == b"IEND":
+            return
+
+
+def _write_png_chunk(out, kind: bytes, data: bytes):
+    out.write(_CHUNK_HEAD.pack(len(data), kind) + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+
+def _png_rows(strip: np.ndarray) -> bytes:
+    # The rows of a (rows, width[, channels]) strip as PNG scanlines, each
+    # with filter type 0 (none) and samples big-endian
+    samples = np.ascontiguousarray(strip, dtype=strip.dtype.newbyteorder(">"))
+    rows = samples.reshape(len(samples), -1).view(np.uint8)
+    return np.hstack([np.zeros((len(rows), 1), dtype=np.uint8), rows]).tobytes()
+
+
+def rewrite_png(path: str, output_path: str, strips):
+    # Write the PNG at path to output_path with its first rows replaced by
+    # strips, (rows, width[, channels]) arrays of the image's samples. Other
+    # chunks are copied as they are.
+    compressor = zlib.compressobj(PNG_COMPRESS_LEVEL)
+    pending = []
+
+    def emit(out, data: bytes, last=False):
+        pending.append(compressor.compress(data) if not last else compressor.flush())
+        if last or sum(map(len, pending)) >= IDAT_SIZE:
+            _write_png_chunk(out, b"IDAT", b"".join(pending))
+            pending.clear()
+
+    with open(path, "rb") as f, open(output_path, "wb") as out:
+        if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise ValueError("Not a PNG file.")
+        out.write(PNG_SIGNATURE)
+        decompressor = zlib.decompressobj()
+        skip = None         # bytes of the replaced rows still to drop
+        for kind, data in _iter_png_chunks(f):
+            if kind != b"IDAT":
+                if skip is not None and not decompressor.eof:
+                    raise ValueError("Truncated PNG image data.")
+                if skip is not None and compressor is not None:
+                    emit(out, b"", last=True)
+                    compressor = None
+                _write_png_chunk(out, kind, data)
+                continue
+            if skip is None:
+                skip = 0
+                for strip in strips:
+                    rows = _png_rows(strip)
+                    skip += len(rows)
+                    emit(out, rows)
+
+            rows = decompressor.decompress(data, IDAT_SIZE)
+            while True:
+                dropped = min(skip, len(rows))
+                skip -= dropped
+                if dropped < len(rows):
+                    emit(out, rows[dropped:])
+                # Input left over, or output held back by the size limit
+                if not decompressor.unconsumed_tail and len(rows) < IDAT_SIZE:
+                    break
+                rows = decompressor.decompress(decompressor.unconsumed_tail, IDAT_SIZE)
@@ -1,19 +1,21 @@
-from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QFrame, QStackedWidget, QSplitter, QSizePolicy, QTextEdit, QScrollArea
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QPixmap
+from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QFrame, QStackedWidget, QSplitter, QSizePolicy, QTextEdit, QScrollArea, QProgressBar
+from PySide6.QtCore import Qt, QThreadPool
+from PySide6.QtGui import QImage, QPixmap
 
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-
-import soundfile as sf
 import numpy as np
+import codecs
 import os
 
 from gui.widgets.file_picker import FilePicker
 from gui.widgets.encoding_panel import EncodingPanel
+from gui.widgets.waveform_view import WaveformView
+from gui.workers import IteratorWorker, OperationWorker
 from core.settings import Settings
 from core.encoders import get_encoder
 from core.decoders import get_decoder
+from core.batch import load_manifest, run_batch
+from core.envelope import load_envelope
+from core.capacity import payload_capacity
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -25,6 +27,16 @@ class MainWindow(QMainWindow):
         self._input_pixmap = None
         self._output_pixmap = None
 
+        # Encode/decode runs on the thread pool; only one operation at a time
+        self._thread_pool = QThreadPool.globalInstance()
+        self._worker = None
+        self._input_waveform_worker = None
+        self._encoded_path = None
+
+        # Batch run tallies, reset when a run starts
+        self._batch_failed = 0
+        self._batch_total = 0
+
         # Section Definitions
         self.sections = {
             "image_encode": {
@@ -66,12 +78,12 @@ class MainWindow(QMainWindow):
             "batch_encode": {
                 "title": "Batch Encoding",
                 "class": "batch",
-                "description": "Encode data across multiple files simultaneously. This feature allows "
-                               "you to split larger payloads across several carrier files for increased "
-                               "capacity and security.",
-                "has_preview": False,
+                "description": "Encode many carriers in one run. Select a JSON manifest listing carrier, "
+                               "payload and settings for each job; jobs run in parallel across all CPU "
+                               "cores and results appear as each one finishes.",
+                "has_preview": True,
                 "is_encoding": True,
-                "file_types": "Multiple",
+                "file_types": ".json manifest",
                 "algorithms": []
             },
             "image_decode": {
@@ -109,12 +121,12 @@ class MainWindow(QMainWindow):
             "batch_decode": {
                 "title": "Batch Decoding",
                 "class": "batch",
-                "description": "Decode data that was split across multiple carrier files. This process "
-                               "reassembles the original payload from its distributed steganographic "
-                               "containers.",
-                "has_preview": False,
+                "description": "Decode many carriers in one run. Select a JSON manifest listing each "
+                               "carrier with its decoding settings; every payload is written to the job's "
+                               "output file.",
+                "has_preview": True,
                 "is_encoding": False,
-                "file_types": "Multiple",
+                "file_types": ".json manifest",
                 "algorithms": []
             },
             "steganalysis": {
@@ -259,8 +271,7 @@ class MainWindow(QMainWindow):
         self.input_stack.addWidget(self.input_image)
 
         # Index 1: Waveform display
-        self._audio_fig = Figure(facecolor='#1e1e1e')
-        self._audio_canvas = FigureCanvasQTAgg(self._audio_fig)
+        self._audio_canvas = WaveformView(colors=("#6d42bd", "#42bd6d"))
         self.input_stack.addWidget(self._audio_canvas)
 
         input_layout.addWidget(self.input_label)
@@ -291,8 +302,7 @@ class MainWindow(QMainWindow):
         self.output_stack.addWidget(self.output_text)
 
         # Audio display (index 2)
-        self._audio_fig_out = Figure(facecolor='#1e1e1e')
-        self._audio_canvas_out = FigureCanvasQTAgg(self._audio_fig_out)
+        self._audio_canvas_out = WaveformView(colors=("#42bd6d", "#6d42bd"))
         self.output_stack.addWidget(self._audio_canvas_out)
 
         output_layout.addWidget(self.output_label)
@@ -415,6 +425,14 @@ class MainWindow(QMainWindow):
         scroll_area.setWidget(scroll_content)
         layout.addWidget(scroll_area, 1)
 
+        # Progress of the running operation
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.setStyleSheet("QProgressBar {background-color: #1e1e1e; border: 1px solid #404040; border-radius: 4px; color: #e0e0e0; text-align: center;} QProgressBar::chunk {background-color: #6d42bd;}")
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
         # Action button
         self.action_button = QPushButton("Encode")
         self.action_button.setEnabled = False
@@ -489,13 +507,19 @@ class MainWindow(QMainWindow):
             self.file_types_label.setVisible(True)
             self.payload_picker.setVisible(True)
             self.payload_types_label.setVisible(True)
-            self.capacity_label.setVisible(False)
+            self.capacity_label.setVisible(True)
         elif section_id == "audio_decode":
             self.file_picker.setVisible(True)
             self.file_types_label.setVisible(True)
             self.payload_picker.setVisible(False)
             self.payload_types_label.setVisible(False)
             self.capacity_label.setVisible(False)
+        elif section_id in ["batch_encode", "batch_decode"]:
+            self.file_picker.setVisible(True)
+            self.file_types_label.setVisible(True)
+            self.payload_picker.setVisible(False)
+            self.payload_types_label.setVisible(False)
+            self.capacity_label.setVisible(False)
         else:
             self.file_picker.setVisible(False)
             self.file_types_label.setVisible(False)
@@ -517,6 +541,8 @@ class MainWindow(QMainWindow):
             self.file_picker.file_selected.connect(self._load_input_image)
         if self.current_section == "audio_encode" or self.current_section == "audio_decode":
             self.file_picker.file_selected.connect(self._load_input_audio)
+        if self.section["class"] == "batch":
+            self.file_picker.file_selected.connect(self._load_manifest)
 
         self.payload_picker.file_selected.connect(self._load_payload_file)
 
@@ -532,57 +558,54 @@ class MainWindow(QMainWindow):
 
 
     def _load_input_audio(self, file_path):
-        # Load audio file for encoding
-        try: 
-            data, sample_rate = sf.read(file_path)
-        except Exception as e:
-            self.input_label.setText(f"Error loading audio file: {e}")
-            return
-        
-        n_samples = len(data)
-        duration = n_samples / sample_rate
-        time = np.linspace(0, duration, n_samples)
-
-        self._audio_fig.clear()
-        ax = self._audio_fig.add_subplot(111)
-
-        ax.set_facecolor('#252525')
-        ax.tick_params(colors='#888888', labelsize=8)
-        ax.xaxis.label.set_color('#888888')
-        ax.yaxis.label.set_color('#888888')
-        for spine in ax.spines.values():
-            spine.set_edgecolor('#404040')
-        self._audio_fig.subplots_adjust(left=0.1, right=0.98, top=0.92, bottom=0.2)
-
-        if data.ndim == 1:
-            # Mono audio
-            ax.plot(time, data, color='#6d42bd', linewidth=0.5)
-        else:
-            # Stereo audio
-            ax.plot(time, data[:, 0], color='#6d42bd', linewidth=0.3, label='L')
-            ax.plot(time, data[:, 1], color='#42bd6d', linewidth=0.3, label='R', alpha=0.7)
-            ax.legend(fontsize=7, facecolor='#2d2d2d', labelcolor='#888888', framealpha=0.5)
+        # Build (or fetch the cached) waveform envelope off the GUI thread
+        self._input_waveform_worker = self._load_waveform(file_path, self._on_input_envelope)
+        self._calculate_capacity()
 
-        ax.set_xlabel("Time (s)", fontsize=8, color='#888888')
-        ax.set_ylabel("Amplitude", fontsize=8, color='#888888')
-        ax.set_title(file_path.split("/")[-1], fontsize=9, color='#e0e0e0', pad=6)
-        ax.set_xlim(0, duration)
+    def _load_waveform(self, file_path, on_result):
+        worker = OperationWorker(load_envelope, file_path)
+        worker.signals.result.connect(on_result)
+        worker.signals.error.connect(self._on_waveform_error)
+        self._thread_pool.start(worker)
+        return worker
 
-        self._audio_canvas.draw()
+    def _on_input_envelope(self, envelope):
+        self._audio_canvas.set_envelope(envelope, os.path.basename(envelope.path))
         self.input_stack.setCurrentIndex(1)
 
+    def _on_waveform_error(self, message):
+        self.input_label.setText(f"Error loading audio file: {message}")
+
+    def _load_manifest(self, file_path):
+        # Summarise the jobs in a batch manifest
+        try:
+            jobs = load_manifest(file_path, self.type)
+        except (OSError, ValueError) as e:
+            self.input_image.setText(f"Failed to load manifest: {e}")
+            return
+        self.input_label.setText(os.path.basename(file_path))
+        self.input_image.setText("\n".join(os.path.basename(job.carrier) for job in jobs[:20])
+                                 + (f"\n... {len(jobs)} jobs" if len(jobs) > 20 else ""))
 
     def _load_payload_file(self, file_path):
         # Load payload file (for encoding)
         # display txt file content in output preview for now
         try:
-            with open(file_path, 'r') as f:
+            with open(file_path, 'rb') as f:
                 content = f.read()
-            self.output_text.setText(content)
+            self.output_text.setText(self._payload_preview(content))
             self.output_stack.setCurrentIndex(1)  # Switch to text view
         except Exception as e:
             self.output_image.setText("Failed to load payload")
 
+    @staticmethod
+    def _payload_preview(content: bytes) -> str:
+        # Show text payloads as text and summarise binary ones
+        try:
+            return content.decode('utf-8')
+        except UnicodeDecodeError:
+            return f"Binary payload: {len(content)} bytes"
+
     def _update_image_display(self):
         # Update the displayed image to fit current size
         if self._input_pixmap and not self._input_pixmap.isNull():
@@ -607,39 +630,197 @@ class MainWindow(QMainWindow):
         self._update_image_display()
 
     def _on_action_button_clicked(self):
-        # Handle encode/decode action when button clicked
+        # Handle encode/decode action when button clicked.
+        # While an operation runs the button cancels it instead
+        if self._worker is not None:
+            self._worker.cancel()
+            self.action_button.setText("Cancelling...")
+            return
+
+        if self.section["class"] == "batch":
+            self._run_batch()
+            return
+
         f_path = self.file_picker.get_file_path()
         p_path = self.payload_picker.get_file_path()
         ffname, ext = os.path.splitext(f_path)
         o_path = f"{ffname}_steg{ext}"
-        print(f"Output path: {o_path}")
         settings = Settings()
         settings.update_settings(self.encoding_panel.get_settings())
-        print(settings.get_all_settings())
 
         # Select and run encoder/decoder
         if self.type == "encode":
-            # Load payload data
-            with open(p_path, 'r') as f:
+            # Load payload data as raw bytes so binary files survive
+            with open(p_path, 'rb') as f:
                 payload = f.read()
 
             encoder = get_encoder(self.section["class"], self.encoding_panel.get_selected_algorithm())
-            result = encoder.encode(f_path, payload, settings, o_path, self.section["class"])
-            if self.section["class"] == "audio":
-                self._display_output_audio(result)
-            elif self.section["class"] == "image":
-                self.display_output(result, "image")
+            worker = IteratorWorker(self._encode_steps, encoder, f_path, payload, settings, o_path, self.section["class"])
+            worker.signals.item.connect(self._show_encoded)
+            self._start_worker(worker, self._on_encode_saved)
         else:
             decoder = get_decoder(self.section["class"], self.encoding_panel.get_selected_algorithm())
-            result = decoder.decode(f_path, settings, self.section["class"])
-            print(result)
-            self.display_output(result, "text")
+            worker = IteratorWorker(self._decode_steps, decoder, f_path, settings, self.section["class"],
+                                    f"{ffname}_payload.bin")
+            worker.signals.item.connect(self._show_decoded)
+            self._start_worker(worker)
+
+    def _start_worker(self, worker, on_result=None):
+        # Run an operation on the thread pool and turn the button into Cancel.
+        # Slots are MainWindow methods so Qt delivers them on the GUI thread
+        worker.signals.progress.connect(self._on_worker_progress)
+        if on_result is not None:
+            worker.signals.result.connect(on_result)
+        worker.signals.error.connect(self._on_worker_error)
+        worker.signals.cancelled.connect(self._on_worker_cancelled)
+        worker.signals.finished.connect(self._on_worker_finished)
+        self._worker = worker
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.action_button.setText("Cancel")
+        self._thread_pool.start(worker)
+
+    def _on_worker_progress(self, done, total):
+        self.progress_bar.setValue(100 * done // total if total else 0)
+
+    def _on_worker_error(self, message):
+        action = "Encoding" if self.type == "encode" else "Decoding"
+        self._show_status(f"{action} failed: {message}")
+
+    def _on_worker_cancelled(self):
+        self._show_status("Operation cancelled")
+
+    def _show_status(self, message):
+        # Batch runs keep their result list and append; others replace the output
+        if self.section["class"] == "batch":
+            self.output_text.append(f"\n{message}")
+        else:
+            self.display_output(message, "text")
+
+    def _on_worker_finished(self):
+        # Restore the action button once the worker is done, whatever the outcome
+        self._worker = None
+        self.progress_bar.setVisible(False)
+        self.action_button.setText("Encode" if self.type == "encode" else "Decode")
+
+    @staticmethod
+    def _encode_steps(encoder, *args, progress=None, cancel=None):
+        # Hand the in-memory result to the preview first, then wait for the
+        # output file, which is written while the preview is built
+        result = encoder.encode(*args, progress=progress, cancel=cancel, preview=True)
+        yield result
+        result.wait()
+
+    def _show_encoded(self, result):
+        # Preview straight from the encoder's buffers instead of re-reading the file
+        self._encoded_path = result.output_path
+        if self.section["class"] == "audio":
+            self._audio_canvas_out.set_envelope(result.preview, os.path.basename(result.output_path))
+            self.output_stack.setCurrentIndex(2)
+        elif self.section["class"] == "image":
+            source = result.preview if result.preview is not None else result.data
+            self.display_output(self._pixmap_from_array(source), "image")
+
+    def _on_encode_saved(self, count):
+        self.output_label.setText(f"Encoded Output (saved to {os.path.basename(self._encoded_path)})")
+
+    @staticmethod
+    def _pixmap_from_array(data) -> QPixmap:
+        # Wrap a Raster or a (height, width[, channels]) array in a QImage,
+        # sharing its memory where Qt has a matching format, then copy it out
+        # before the array can be freed: a pixmap may keep sharing the
+        # QImage's buffer rather than convert it. Gray with alpha is shown
+        # without the alpha, and 16-bit color by the top byte of each sample.
+        layout = getattr(data, "layout", None)
+        pixels = data.array if layout is not None else np.asarray(data)
+        if pixels.ndim == 3 and pixels.shape[2] in (1, 2):
+            pixels = pixels[..., 0]
+        if pixels.ndim == 2 and pixels.dtype.itemsize == 2:
+            pixels, image_format = pixels.astype(np.uint16, copy=False), QImage.Format.Format_Grayscale16
+        else:
+            if pixels.dtype != np.uint8:
+                pixels = (pixels >> 8).astype(np.uint8)
+            formats = {3: QImage.Format.Format_RGB888,
+                       4: QImage.Format.Format_RGBX8888 if layout == "RGBX" else QImage.Format.Format_RGBA8888}
+            image_format = formats[pixels.shape[2]] if pixels.ndim == 3 else QImage.Format.Format_Grayscale8
+        pixels = np.ascontiguousarray(pixels)
+        height, width = pixels.shape[:2]
+        image = QImage(pixels.data, width, height, pixels.strides[0], image_format).copy()
+        return QPixmap.fromImage(image)
+
+    @staticmethod
+    def _decode_steps(decoder, f_path, settings, media_type, out_path, progress=None, cancel=None):
+        # Decode on the worker thread and yield the text to show. A payload
+        # that is UTF-8 throughout is shown as it is; once a piece is not, the
+        # payload is binary and is written to out_path as it is extracted.
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        held, out, size = [], None, 0
+        try:
+            for chunk in decoder.iter_decode(f_path, settings, media_type, progress=progress, cancel=cancel):
+                size += len(chunk)
+                if out is None:
+                    try:
+                        utf8.decode(chunk)
+                        held.append(chunk)
+                        continue
+                    except UnicodeDecodeError:
+                        out = open(out_path, 'wb')
+                        out.writelines(held)
+                out.write(chunk)
+            if out is None:
+                try:
+                    utf8.decode(b"", final=True)
+                except UnicodeDecodeError:
+                    out = open(out_path, 'wb')
+                    out.writelines(held)
+        except BaseException:
+            # Leave no partial payload behind a failed or cancelled decode
+            if out is not None:
+                out.close()
+                os.remove(out_path)
+            raise
+        if out is None:
+            yield b"".join(held).decode('utf-8')
+        else:
+            out.close()
+            yield f"Binary payload ({size} bytes) saved to {out_path}"
+
+    def _show_decoded(self, text):
+        self.display_output(text, "text")
 
 
+    def _run_batch(self):
+        # Run the manifest's jobs on the batch engine, listing results as they finish
+        try:
+            jobs = load_manifest(self.file_picker.get_file_path(), self.type)
+        except (OSError, ValueError) as e:
+            self.display_output(f"Failed to load manifest: {e}", "text")
+            return
+
+        self.output_text.clear()
+        self.output_stack.setCurrentIndex(1)
+        self._batch_failed = 0
+        self._batch_total = len(jobs)
+        worker = IteratorWorker(run_batch, jobs)
+        worker.signals.item.connect(self._on_batch_result)
+        self._start_worker(worker, self._on_batch_finished)
+
+    def _on_batch_result(self, result):
+        # List each batch job as it finishes
+        name = os.path.basename(result.job.carrier)
+        if result.ok:
+            self.output_text.append(f"{name} -> {result.output} ({result.seconds:.2f} s)")
+        else:
+            self._batch_failed += 1
+            self.output_text.append(f"{name} failed: {result.error}")
+
+    def _on_batch_finished(self, count):
+        self.output_text.append(f"\n{count - self._batch_failed} of {self._batch_total} jobs succeeded")
+
     def display_output(self, result, type):
         # Display output of operation
         if type == "image":
-            pixmap = QPixmap(result)
+            pixmap = result if isinstance(result, QPixmap) else QPixmap(result)
             if not pixmap.isNull():
                 self._output_pixmap = pixmap
                 self._update_image_display()
@@ -652,56 +833,23 @@ class MainWindow(QMainWindow):
             self.output_text.setText(result)
             self.output_stack.setCurrentIndex(1)  # Switch to text view
 
-    def _display_output_audio(self, file_path):
-        data, sample_rate = sf.read(file_path)
-        n_samples = len(data)
-        time = np.linspace(0, n_samples / sample_rate, n_samples)
-
-        self._audio_fig_out.clear()
-        ax = self._audio_fig_out.add_subplot(111)
-
-        ax.set_facecolor('#252525')
-        ax.tick_params(colors='#888888', labelsize=8)
-        ax.xaxis.label.set_color('#888888')
-        ax.yaxis.label.set_color('#888888')
-        for spine in ax.spines.values():
-            spine.set_edgecolor('#404040')
-        self._audio_fig_out.subplots_adjust(left=0.1, right=0.98, top=0.92, bottom=0.2)
-
-        if data.ndim == 1:
-            ax.plot(time, data, color='#6d42bd', linewidth=0.5)
-        else:
-            ax.plot(time, data[:, 0], color='#42bd6d', linewidth=0.3, label='L')
-            ax.plot(time, data[:, 1], color='#6d42bd', linewidth=0.3, label='R', alpha=0.7)
-            ax.legend(fontsize=7, facecolor='#2d2d2d', labelcolor='#888888', framealpha=0.5)
-
-        ax.set_xlabel("Time (s)", fontsize=8, color='#888888')
-        ax.set_ylabel("Amplitude", fontsize=8, color='#888888')
-        ax.set_title(file_path.split("/")[-1], fontsize=9, color='#e0e0e0', pad=6)
-
-        self._audio_canvas_out.draw()
-        self.output_stack.setCurrentIndex(2)
-
-
     def _calculate_capacity(self):
-        # Calculate and display maximum payload capacity
-        if not self._input_pixmap:
-            self.capacity_label.setText("Estimated Payload Capacity: N/A. Load an image to calculate.")
+        # Calculate and display the largest payload for the current settings,
+        # from the carrier's header only
+        if self.type != "encode" or self.section["class"] not in ["image", "audio"]:
+            return
+        file_path = self.file_picker.get_file_path()
+        if not file_path:
+            self.capacity_label.setText("Estimated Payload Capacity: N/A. Load a carrier to calculate.")
             return
-        
-        width = self._input_pixmap.width()
-        height = self._input_pixmap.height()
-        total_pixels = width * height
 
         settings = Settings()
         settings.update_settings(self.encoding_panel.get_settings())
-        bit_planes = settings.get_setting("bit_planes", 1)
-        color_channels = settings.get_setting("color_channels", ["R", "G", "B"])
-        num_channels = len(color_channels)
-        
-        bits_per_pixel = bit_planes * num_channels
-        total_bits = total_pixels * bits_per_pixel
-        total_bytes = total_bits // 8
+        try:
+            total_bytes = payload_capacity(file_path, self.section["class"], settings)
+        except Exception as e:
+            self.capacity_label.setText(f"Estimated Payload Capacity: N/A ({e})")
+            return
 
         if total_bytes < 1024:
             capacity_str = f"{total_bytes} bytes"
@@ -0,0 +1,116 @@
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+
+from core.envelope import WaveformEnvelope
+
+# Fraction of the canvas width taken by the plot area
+AXES_LEFT = 0.1
+AXES_RIGHT = 0.98
+
+# Zoom step per mouse wheel notch
+ZOOM_STEP = 0.8
+
+# Narrowest view, in frames
+MIN_VIEW_FRAMES = 64
+
+
+class WaveformView(FigureCanvasQTAgg):
+    # Audio preview drawn from a WaveformEnvelope. Only about one min/max bin
+    # per pixel is plotted. The mouse wheel zooms around the cursor, dragging
+    # pans, and a double click shows the whole file again.
+
+    def __init__(self, colors=("#6d42bd", "#42bd6d"), parent=None):
+        self._figure = Figure(facecolor='#1e1e1e')
+        super().__init__(self._figure)
+        self.setParent(parent)
+        self._colors = colors
+        self._envelope = None
+        self._title = ""
+        self._view = (0.0, 0.0)
+        self._drag = None
+
+        self.mpl_connect("scroll_event", self._on_scroll)
+        self.mpl_connect("button_press_event", self._on_press)
+        self.mpl_connect("motion_notify_event", self._on_motion)
+        self.mpl_connect("button_release_event", self._on_release)
+
+    def set_envelope(self, envelope: WaveformEnvelope, title: str = ""):
+        self._envelope = envelope
+        self._title = title
+        self._view = (0.0, envelope.duration)
+        self._redraw()
+
+    def _plot_width(self) -> int:
+        # Plot area width in device pixels
+        return max(1, int(self.width() * self.devicePixelRatioF() * (AXES_RIGHT - AXES_LEFT)))
+
+    def _redraw(self):
+        self._figure.clear()
+        ax = self._figure.add_subplot(111)
+
+        ax.set_facecolor('#252525')
+        ax.tick_params(colors='#888888', labelsize=8)
+        ax.xaxis.label.set_color('#888888')
+        ax.yaxis.label.set_color('#888888')
+        for spine in ax.spines.values():
+            spine.set_edgecolor('#404040')
+        self._figure.subplots_adjust(left=AXES_LEFT, right=AXES_RIGHT, top=0.92, bottom=0.2)
+
+        if self._envelope is not None:
+            start, end = self._view
+            times, mins, maxs = self._envelope.view(start, end, self._plot_width())
+            stereo = self._envelope.channels > 1
+            for ch, name in enumerate("LR"[:min(2, self._envelope.channels)]):
+                style = dict(color=self._colors[ch], label=name if stereo else None, alpha=0.7 if ch else 1.0)
+                if mins is maxs:
+                    # Zoomed in to single frames
+                    ax.plot(times, mins[:, ch], linewidth=0.5, **style)
+                else:
+                    ax.fill_between(times, mins[:, ch], maxs[:, ch], step="post", linewidth=0, **style)
+            if stereo:
+                ax.legend(fontsize=7, facecolor='#2d2d2d', labelcolor='#888888', framealpha=0.5)
+            ax.set_xlim(start, end)
+
+        ax.set_xlabel("Time (s)", fontsize=8, color='#888888')
+        ax.set_ylabel("Amplitude", fontsize=8, color='#888888')
+        ax.set_title(self._title, fontsize=9, color='#e0e0e0', pad=6)
+        self.draw_idle()
+
+    def _set_view(self, start: float, end: float):
+        # Clamp to the file and to the narrowest view, keeping the span if possible
+        duration = self._envelope.duration
+        span = min(max(end - start, MIN_VIEW_FRAMES / self._envelope.samplerate), duration)
+        start = min(max(0.0, start), duration - span)
+        self._view = (start, start + span)
+        self._redraw()
+
+    def _on_scroll(self, event):
+        if self._envelope is None or event.xdata is None:
+            return
+        start, end = self._view
+        factor = ZOOM_STEP if event.button == "up" else 1 / ZOOM_STEP
+        self._set_view(event.xdata - (event.xdata - start) * factor, event.xdata + (end - event.xdata) * factor)
+
+    def _on_press(self, event):
+        if self._envelope is None or event.inaxes is None:
+            return
+        if event.dblclick:
+            self._set_view(0.0, self._envelope.duration)
+        elif event.button == 1:
+            self._drag = (event.x, self._view, event.inaxes.bbox.width)
+
+    def _on_motion(self, event):
+        if self._drag is None:
+            return
+        press_x, (start, end), axes_width = self._drag
+        shift = (press_x - event.x) / axes_width * (end - start)
+        self._set_view(start + shift, end + shift)
+
+    def _on_release(self, event):
+        self._drag = None
+
+    def resizeEvent(self, event):
+        # A wider plot gets a finer envelope level
+        super().resizeEvent(event)
+        if self._envelope is not None:
+            self._redraw()
@@ -0,0 +1,62 @@
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from core.progress import CancelToken, CarrierModified, OperationCancelled
+
+
+class WorkerSignals(QObject):
+    # Signals emitted from a worker thread; Qt queues them onto the GUI thread
+    # 64-bit: slot and frame totals pass 2**31 for large payloads and long audio
+    progress = Signal('qlonglong', 'qlonglong')
+    item = Signal(object)
+    result = Signal(object)
+    error = Signal(str)
+    cancelled = Signal()
+    finished = Signal()
+
+
+class OperationWorker(QRunnable):
+    # Runs fn(*args, progress=..., cancel=..., **kwargs) on a QThreadPool thread.
+    # fn is a core encode/decode style call taking a progress callback and a
+    # CancelToken; its return value is emitted through signals.result.
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancel_token = CancelToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, progress=self.signals.progress.emit, cancel=self.cancel_token, **self.kwargs)
+        except CarrierModified as e:
+            # Not a clean cancel: the carrier file was changed, so report it
+            self.signals.error.emit(str(e))
+        except OperationCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class IteratorWorker(OperationWorker):
+    # Like OperationWorker for generator functions such as run_batch: each
+    # yielded value is emitted through signals.item as soon as it is produced
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__(self._drain, *args, **kwargs)
+        self.iter_fn = fn
+
+    def _drain(self, *args, **kwargs):
+        count = 0
+        for value in self.iter_fn(*args, **kwargs):
+            self.signals.item.emit(value)
+            count += 1
+        return count
@@ -0,0 +1,30 @@
+import numpy as np
+from PIL import Image
+
+from core.settings import Settings
+from core.plan import EmbeddingPlan
+
+# Helpers shared by the test modules; carriers are generated from fixed seeds
+
+CHANNEL_SETS = [["R", "G", "B"], ["R"], ["G"], ["B"], ["R", "G"], ["R", "B"], ["G", "B"]]
+
+
+def make_settings(**values):
+    settings = Settings()
+    settings.update_settings(values)
+    return settings
+
+
+def make_plan(media="image", **values):
+    return EmbeddingPlan.from_settings(make_settings(**values), media)
+
+
+def make_image(width=23, height=17, seed=0):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), "RGB")
+
+
+def make_audio(frames=4000, n_channels=2, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (frames,) if n_channels == 1 else (frames, n_channels)
+    return rng.integers(-32768, 32768, shape).astype(np.int16)
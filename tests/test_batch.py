@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from core.batch import BatchJob, load_manifest, run_batch
+from tests.conftest import make_image
+
+
+def test_batch_round_trip(tmp_path):
+    for i in range(3):
+        make_image(40, 30, seed=i).save(tmp_path / f"c{i}.png")
+        (tmp_path / f"p{i}.txt").write_bytes(f"payload {i}".encode() * 5)
+    manifest = tmp_path / "encode.json"
+    manifest.write_text(json.dumps({
+        "defaults": {"settings": {"delimiter": "Length Prefix", "bit_planes": 2, "encryption": "AES-GCM",
+                                  "password": "pw"}},
+        "jobs": [{"carrier": f"c{i}.png", "payload": f"p{i}.txt"} for i in range(3)]
+                + [{"carrier": "missing.png", "payload": "p0.txt"}],
+    }))
+
+    results = list(run_batch(load_manifest(str(manifest), "encode"), workers=2, retries=1))
+    assert sorted(r.index for r in results) == [0, 1, 2, 3]
+    failed = [r for r in results if not r.ok]
+    assert [(r.index, r.attempts) for r in failed] == [(3, 2)]
+
+    settings = {"delimiter": "Length Prefix", "bit_planes": 2, "password": "pw"}
+    jobs = [BatchJob("decode", str(tmp_path / f"c{i}_steg.png"), settings=settings) for i in range(3)]
+    for result in run_batch(jobs):
+        assert result.ok
+        assert open(result.output, "rb").read() == f"payload {result.index}".encode() * 5
+
+
+def test_batch_rejects_oversized_payload(tmp_path):
+    from core.batch import run_job
+
+    make_image(16, 16).save(tmp_path / "carrier.png")
+    (tmp_path / "payload.bin").write_bytes(bytes(1000))
+    job = BatchJob("encode", str(tmp_path / "carrier.png"), payload=str(tmp_path / "payload.bin"),
+                   settings={"delimiter": "Length Prefix"})
+    result = run_job(job)
+    assert not result.ok and "carrier holds" in result.error and not os.path.exists(job.output_path())
+
+
+def test_load_manifest_rejects_bad_jobs(tmp_path):
+    manifest = tmp_path / "bad.json"
+    manifest.write_text(json.dumps([{"carrier": "a.png"}]))
+    with pytest.raises(ValueError):
+        load_manifest(str(manifest))
+    with pytest.raises(ValueError):
+        load_manifest(str(manifest), "encode")
+    assert load_manifest(str(manifest), "decode")[0].carrier == str(tmp_path / "a.png")
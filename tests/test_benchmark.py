@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+
+def test_benchmark_case_and_compare(tmp_path):
+    from benchmarks.bench import BenchCase, build_cases, compare, run_case
+
+    cases = build_cases("quick", ["audio"], "1s-p2-LR-length")
+    assert [case.name for case in cases] == ["audio-1s-p2-LR-length-none", "audio-1s-p2-LR-length-aes",
+                                             "audio-1s-p2-LR-length-aes-gcm", "audio-1s-p2-LR-length-aes-stream"]
+    entry = run_case(BenchCase("image", (64, 48), 2, ("R", "B"), "NULL Terminator", "None"), str(tmp_path))
+    assert entry["ok"] and entry["payload_bytes"] > 0
+    assert entry["encode"]["seconds"] > 0 and entry["decode"]["peak_mb"] > 0
+
+    slower = {**entry, "encode": {"seconds": entry["encode"]["seconds"] * 2}, "decode": entry["decode"]}
+    rows = compare([slower], [entry], tolerance=0.5)
+    assert [row["regressed"] for row in rows] == [True, False]
+
+
+def test_benchmark_entry_point(tmp_path, capsys):
+    import cli
+    from benchmarks import bench
+
+    # Its own script now; the application CLI has no bench command
+    args = ["--media", "image", "--filter", "image-256x256-p4-G-length-none", "--repeat", "1", "--no-memory"]
+    assert bench.main([*args, "-o", str(tmp_path / "baseline.json")]) == 0
+    assert bench.main([*args, "--baseline", str(tmp_path / "baseline.json"), "--tolerance", "100"]) == 0
+    captured = capsys.readouterr()
+    assert [entry["name"] for entry in json.loads(captured.out)["results"]] == ["image-256x256-p4-G-length-none"]
+    assert "0 of 2 timings regressed" in captured.err
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(["bench"])
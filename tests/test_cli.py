@@ -0,0 +1,118 @@
+import json
+import os
+import sys
+
+import pytest
+
+from core.batch import load_manifest
+from core.capacity import payload_capacity
+from core.decoders.lsb import LSBDecoder
+from tests.conftest import make_settings, make_image
+
+
+def test_cli_round_trip(tmp_path, capsysbinary, monkeypatch):
+    import cli
+
+    carrier = tmp_path / "carrier.png"
+    make_image(64, 48).save(carrier)
+    payload = bytes(range(256)) * 2     # NUL and newline bytes must reach stdout intact
+    (tmp_path / "payload.bin").write_bytes(payload)
+    monkeypatch.setenv("STEGA_PAL_PASSWORD", "secret")
+    flags = ["--bit-planes", "2", "--channels", "r, g", "--delimiter", "Length Prefix", "--encryption", "AES-GCM"]
+
+    assert cli.main(["capacity", str(carrier), *flags]) == 0
+    settings = make_settings(bit_planes=2, color_channels=["R", "G"], delimiter="Length Prefix",
+                             encryption="AES-GCM", password="secret")
+    assert int(capsysbinary.readouterr().out) == payload_capacity(str(carrier), "image", settings)
+    assert cli.main(["capacity", str(carrier), "--raw", *flags]) == 0
+    assert int(capsysbinary.readouterr().out) == 64 * 48 * 2 * 2 // 8
+
+    assert cli.main(["encode", str(carrier), str(tmp_path / "payload.bin"), *flags, "--compression", "zlib"]) == 0
+    output = tmp_path / "carrier_steg.png"
+    assert capsysbinary.readouterr().out.decode().strip() == str(output)
+    assert LSBDecoder().decode(str(output), settings, "image") == payload
+
+    # Decoded bytes go to stdout unchanged, or to a file with -o
+    assert cli.main(["decode", str(output), *flags]) == 0
+    assert capsysbinary.readouterr().out == payload
+    assert cli.main(["decode", str(output), *flags, "-o", str(tmp_path / "out.bin")]) == 0
+    assert (tmp_path / "out.bin").read_bytes() == payload
+
+
+def test_cli_batch_keeps_stdout_for_results(tmp_path, capsys):
+    import cli
+
+    make_image(40, 30).save(tmp_path / "carrier.png")
+    (tmp_path / "payload.txt").write_bytes(b"batch payload")
+    manifest = tmp_path / "encode.json"
+    manifest.write_text(json.dumps({"defaults": {"settings": {"delimiter": "Length Prefix"}},
+                                    "jobs": [{"carrier": "carrier.png", "payload": "payload.txt"}]}))
+
+    # One JSON line per job on stdout; the summary is a diagnostic on stderr
+    assert cli.main(["batch", str(manifest), "--operation", "encode", "--workers", "1"]) == 0
+    captured = capsys.readouterr()
+    assert [json.loads(line)["ok"] for line in captured.out.splitlines()] == [True]
+    assert captured.err.strip() == "1 of 1 jobs succeeded"
+
+
+def test_memory_budget_reaches_engines(tmp_path, monkeypatch):
+    import cli
+    import core.decoders.lsb
+    import core.encoders.lsb
+    from core.batch import run_job
+
+    budgets = []
+    for module in (core.encoders.lsb, core.decoders.lsb):
+        original = module.block_units_for_budget
+        monkeypatch.setattr(module, "block_units_for_budget",
+                            lambda budget, n, original=original: budgets.append(budget) or original(budget, n))
+    make_image(64, 48).save(tmp_path / "carrier.tif")
+    (tmp_path / "payload.bin").write_bytes(b"budget" * 10)
+    flags = ["--delimiter", "Length Prefix", "--memory-budget", "3"]
+
+    assert cli.main(["encode", str(tmp_path / "carrier.tif"), str(tmp_path / "payload.bin"), *flags]) == 0
+    assert cli.main(["decode", str(tmp_path / "carrier_steg.tif"), *flags, "-o", str(tmp_path / "out.bin")]) == 0
+    assert budgets and set(budgets) == {3 * 1024 * 1024}
+
+    manifest = tmp_path / "decode.json"
+    manifest.write_text(json.dumps({"defaults": {"memory_budget": 5000, "settings": {"delimiter": "Length Prefix"}},
+                                    "jobs": [{"carrier": "carrier_steg.tif"}]}))
+    budgets.clear()
+    assert run_job(load_manifest(str(manifest), "decode")[0]).ok
+    assert set(budgets) == {5000}
+
+
+def test_cli_exit_codes(tmp_path, capsys):
+    import cli
+
+    carrier = tmp_path / "carrier.png"
+    make_image(16, 16).save(carrier)
+    (tmp_path / "payload.bin").write_bytes(bytes(1000))
+    # Errors are reported on stderr with status 1; no output is left behind
+    assert cli.main(["encode", str(carrier), str(tmp_path / "payload.bin"), "--delimiter", "Length Prefix"]) == 1
+    assert "error" in capsys.readouterr().err and not (tmp_path / "carrier_steg.png").exists()
+    assert cli.main(["decode", str(carrier), "--delimiter", "Length Prefix", "-o", str(tmp_path / "out.bin")]) == 1
+    assert not (tmp_path / "out.bin").exists()
+    assert cli.main(["capacity", str(tmp_path / "missing.png")]) == 1
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(["encode", str(carrier), str(tmp_path / "payload.bin"), "--bit-planes", "9"])
+    assert exit_info.value.code == 2
+
+
+def test_cli_stays_headless(tmp_path):
+    import subprocess
+
+    make_image(16, 16).save(tmp_path / "carrier.png")
+    (tmp_path / "payload.bin").write_bytes(b"headless")
+    script = (
+        "import sys; import cli\n"
+        "assert cli.main(['encode', 'carrier.png', 'payload.bin', '--delimiter', 'Length Prefix']) == 0\n"
+        "assert cli.main(['decode', 'carrier_steg.png', '--delimiter', 'Length Prefix', '-o', 'out.bin']) == 0\n"
+        "assert cli.main(['capacity', 'carrier.png']) == 0\n"
+        "loaded = [name for name in ('PySide6', 'matplotlib') if name in sys.modules]\n"
+        "assert not loaded, loaded\n"
+    )
+    src = os.path.join(os.path.dirname(__file__), "..", "src")
+    env = dict(os.environ, PYTHONPATH=src)
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env, check=True, capture_output=True)
+    assert (tmp_path / "out.bin").read_bytes() == b"headless"
@@ -0,0 +1,43 @@
+import json
+import os
+
+import pytest
+
+from core.encoders.lsb import LSBEncoder
+from core.decoders.lsb import LSBDecoder
+from tests.conftest import make_settings, make_plan, make_image
+
+
+@pytest.mark.parametrize("compression", ["zlib", "bz2", "lzma", "Auto"])
+@pytest.mark.parametrize("encryption", ["None", "AES", "AES Stream"])
+def test_compressed_round_trip(tmp_path, compression, encryption):
+    carrier, output = tmp_path / "carrier.png", tmp_path / "carrier_steg.png"
+    make_image(96, 64).save(carrier)
+    payload = json.dumps([{"id": i, "level": "info", "message": f"request {i % 7} served"} for i in range(400)]).encode()
+    settings = make_settings(delimiter="Length Prefix", encryption=encryption, password="pw", bit_planes=2,
+                             compression=compression, compression_level=9)
+
+    # Far larger than the carrier holds, but small once compressed
+    result = LSBEncoder().encode(str(carrier), payload, settings, str(output), "image")
+    assert result.capacity_used < len(payload) / 5
+    decode_settings = make_settings(delimiter="Length Prefix", password="pw", bit_planes=2)
+    assert LSBDecoder().decode(str(output), decode_settings, "image") == payload
+
+
+def test_compression_choice_and_corruption():
+    from core.compression import CompressionParams, Decompressor, choose_codec, compress, compress_payload
+
+    assert choose_codec(os.urandom(100_000)) is None
+    assert compress_payload(b"short", "zlib") is None
+    assert choose_codec(b"abc" * 100_000)[0] in ("zlib", "bz2", "lzma")
+
+    data = b"log line\n" * 10_000
+    decompressor = Decompressor(CompressionParams("lzma", 6, len(data) - 1))
+    with pytest.raises(ValueError):
+        list(decompressor.update(compress(data, "lzma")))
+    decompressor = Decompressor(CompressionParams("zlib", 6, len(data)))
+    assert data.startswith(b"".join(decompressor.update(compress(data, "zlib")[:-4])))
+    with pytest.raises(ValueError):
+        decompressor.finalize()
+    with pytest.raises(ValueError):
+        make_plan(delimiter="NULL Terminator", compression="zlib")
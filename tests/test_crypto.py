@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.encoders.lsb import LSBEncoder
+from core.decoders.lsb import LSBDecoder
+from core.framing import EXTRA_RECORD_SIZE, HEADER_SIZE
+from tests.conftest import make_settings, make_plan, make_image
+
+
+@pytest.mark.parametrize("delimiter", ["NULL Terminator", "Length Prefix"])
+def test_encrypted_round_trip(tmp_path, delimiter):
+    carrier = tmp_path / "carrier.png"
+    output = tmp_path / "carrier_steg.png"
+    make_image(64, 48).save(carrier)
+    settings = make_settings(delimiter=delimiter, encryption="AES", password="hunter2")
+
+    LSBEncoder().encode(str(carrier), b"attack at dawn", settings, str(output), "image")
+    assert LSBDecoder().decode(str(output), settings, "image") == b"attack at dawn"
+
+
+def test_stream_encryption_round_trip(tmp_path):
+    from core.crypto.stream import StreamParams, stream_size
+
+    carrier, output = tmp_path / "carrier.png", tmp_path / "carrier_steg.png"
+    make_image(400, 300).save(carrier)
+    settings = make_settings(delimiter="Length Prefix", encryption="AES Stream", password="pw", bit_planes=4)
+    payload = bytes((i * 7) % 251 for i in range(150_000))   # three segments
+
+    result = LSBEncoder().encode(str(carrier), payload, settings, str(output), "image")
+    assert result.capacity_used == HEADER_SIZE + EXTRA_RECORD_SIZE + StreamParams.SIZE + stream_size(len(payload))
+    chunks = list(LSBDecoder().iter_decode(str(output), settings, "image"))
+    assert len(chunks) > 1 and b"".join(chunks) == payload
+    assert LSBDecoder().decode(str(output), settings, "image", max_bytes=70_000) == payload[:65536]
+
+    with pytest.raises(ValueError):
+        LSBDecoder().decode(str(output), make_settings(delimiter="Length Prefix", password="wrong", bit_planes=2), "image")
+    # Flipping one bit deep in the payload fails that segment's tag
+    pixels = np.array(Image.open(output))
+    pixels[200, 10, 0] ^= 1
+    Image.fromarray(pixels).save(output)
+    with pytest.raises(ValueError):
+        LSBDecoder().decode(str(output), settings, "image")
+    with pytest.raises(ValueError):
+        make_plan(delimiter="NULL Terminator", encryption="AES Stream")
+
+
+def test_compact_encryption_round_trip(tmp_path):
+    carrier, output = tmp_path / "carrier.png", tmp_path / "carrier_steg.png"
+    make_image(64, 48).save(carrier)
+    payload = bytes(range(256)) * 4
+    used = {}
+    for encryption in ("AES", "AES-GCM"):
+        settings = make_settings(delimiter="Length Prefix", encryption=encryption, password="pw", bit_planes=2)
+        used[encryption] = LSBEncoder().encode(str(carrier), payload, settings, str(output), "image").capacity_used
+        assert LSBDecoder().decode(str(output), make_settings(delimiter="Length Prefix", password="pw", bit_planes=2), "image") == payload
+
+    # Raw ciphertext, one nonce and tag, and the KDF parameters in the header
+    from core.crypto.aead import AeadParams
+    assert used["AES-GCM"] == HEADER_SIZE + EXTRA_RECORD_SIZE + AeadParams.SIZE + len(payload) + 16
+    assert used["AES-GCM"] < used["AES"] * 0.6
+    with pytest.raises(ValueError):
+        LSBDecoder().decode(str(output), make_settings(delimiter="Length Prefix", password="wrong", bit_planes=2), "image")
+
+
+def test_key_cache_reuses_zeroes_and_expires(tmp_path, monkeypatch):
+    from core.crypto import keys
+    from core.crypto.kdf import KdfParams
+
+    derived = []
+    monkeypatch.setattr(keys, "derive_key", lambda password, params: derived.append(password) or bytes([len(derived)]) * 32)
+    now = [0.0]
+    cache = keys.KeyCache(max_entries=2, ttl=10.0, clock=lambda: now[0])
+
+    params = cache.encryption_params("pw")
+    assert cache.encryption_params("pw") == params and cache.encryption_params("other") != params
+    key = cache.derive("pw", params)
+    assert cache.derive("pw", params) == key and (cache.hits, cache.misses) == (1, 1)
+
+    # Least recently used entries are evicted, and zeroed
+    first = cache._keys[(cache._digest("pw"), params)][0]
+    cache.derive("a", KdfParams.generate())
+    cache.derive("b", KdfParams.generate())
+    assert len(cache) == 2 and first == bytes(32)
+    # Expired keys and salts are dropped
+    now[0] = 11.0
+    assert cache.encryption_params("pw") != params
+    cache.derive("pw", params)
+    assert derived == ["pw", "a", "b", "pw"]
+    entry = cache._keys[(cache._digest("pw"), params)][0]
+    cache.clear()
+    assert len(cache) == 0 and entry == bytes(32)
+
+    # Two carriers encrypted with one password share one derivation
+    derived.clear()
+    monkeypatch.setattr(keys, "key_cache", keys.KeyCache())
+    carrier = tmp_path / "carrier.png"
+    make_image(64, 48).save(carrier)
+    settings = make_settings(delimiter="Length Prefix", encryption="AES-GCM", password="pw", bit_planes=2)
+    for i in range(2):
+        output = str(tmp_path / f"steg{i}.png")
+        LSBEncoder().encode(str(carrier), b"secret %d" % i, settings, output, "image")
+        assert LSBDecoder().decode(output, settings, "image") == b"secret %d" % i
+    assert derived == ["pw"]
+
+    # Workers are seeded with digests, never passwords, and derive nothing
+    secret, entries = keys.key_cache.export_entries(["pw"])
+    assert "pw" not in [value for entry in entries for value in entry]
+    worker = keys.KeyCache()
+    worker.import_entries(secret, entries)
+    params = worker.encryption_params("pw")
+    assert params == keys.key_cache.encryption_params("pw") and worker.derive("pw", params) == entries[0][2]
+    assert derived == ["pw"]
+
+
+def test_messages_get_their_own_subkeys():
+    from core.crypto.aead import AeadParams, decrypt_aead, encrypt_aead
+    from core.crypto.kdf import KdfParams, message_key
+    from core.crypto.stream import StreamDecryptor, StreamEncryptor, StreamParams
+
+    # One shared password key, as within the key cache TTL, but a subkey per message
+    key, kdf = os.urandom(32), KdfParams.generate()
+    first, second = AeadParams.generate(kdf), AeadParams.generate(kdf)
+    assert first.kdf == second.kdf and message_key(key, first.key_nonce) != message_key(key, second.key_nonce)
+    assert AeadParams.unpack(first.pack()) == first
+    sealed = encrypt_aead(b"message", key, first)
+    assert decrypt_aead(sealed, key, first) == b"message"
+    with pytest.raises(ValueError):
+        decrypt_aead(sealed, key, AeadParams(kdf, second.key_nonce, first.nonce))
+
+    params = StreamParams.generate(kdf, segment_size=16)
+    assert StreamParams.unpack(params.pack()) == params
+    decryptor = StreamDecryptor(key, params)
+    plaintext = b"".join(decryptor.update(segment) for segment in StreamEncryptor(key, params).segments(bytes(40)))
+    assert plaintext + decryptor.finalize() == bytes(40)
@@ -0,0 +1,308 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from PIL import Image
+
+from core.capacity import payload_capacity
+from core.envelope import WaveformEnvelope, load_envelope
+from core.encoders.lsb import LSBEncoder
+from core.decoders.lsb import LSBDecoder
+from core.delimiters import DelimiterScanner
+from core.framing import FLAG_ENCRYPTED, HEADER_SIZE, PayloadHeader
+from core.plan import EmbeddingPlan
+from core.progress import CancelToken, OperationCancelled
+from tests.conftest import CHANNEL_SETS, make_settings, make_plan, make_image, make_audio
+
+
+@pytest.mark.parametrize("bit_planes", [1, 2, 3, 4])
+@pytest.mark.parametrize("channels", CHANNEL_SETS)
+@pytest.mark.parametrize("n_chars", [0, 1, 7, 40, 500])
+def test_encode_message_matches_reference(bit_planes, channels, n_chars):
+    encoder = LSBEncoder()
+    settings = make_settings(color_channels=channels)
+    plan = make_plan(bit_planes=bit_planes, color_channels=channels)
+    payload = bytes((i * 37) % 256 for i in range(n_chars))
+    binary_output = "".join(f"{byte:08b}" for byte in payload)
+
+    expected = make_image()
+    encoder.encode_message_reference(expected, expected.load(), binary_output, bit_planes, settings)
+    result = encoder.encode_message(make_image(), payload, plan)
+
+    assert np.array_equal(np.asarray(result), np.asarray(expected))
+
+
+@pytest.mark.parametrize("bit_planes", [1, 2, 3, 4])
+@pytest.mark.parametrize("channels", CHANNEL_SETS)
+@pytest.mark.parametrize("delimiter", ["NULL Terminator", "Magic Sequence", "Length Prefix"])
+def test_image_round_trip(tmp_path, bit_planes, channels, delimiter):
+    carrier = tmp_path / "carrier.png"
+    output = tmp_path / "carrier_steg.png"
+    make_image(64, 48).save(carrier)
+    settings = make_settings(bit_planes=bit_planes, color_channels=channels, delimiter=delimiter)
+    text = b"The quick brown fox jumps over the lazy dog."
+
+    LSBEncoder().encode(str(carrier), text, settings, str(output), "image")
+    assert LSBDecoder().decode(str(output), settings, "image") == text
+
+
+@pytest.mark.parametrize("bit_planes", [1, 2, 3, 4])
+@pytest.mark.parametrize("n_channels, channels", [(1, ["L"]), (2, ["L", "R"]), (2, ["L"]), (2, ["R"])])
+def test_audio_round_trip(tmp_path, bit_planes, n_channels, channels):
+    carrier = tmp_path / "carrier.wav"
+    output = tmp_path / "carrier_steg.wav"
+    sf.write(carrier, make_audio(n_channels=n_channels), 8000, subtype="PCM_16")
+    settings = make_settings(bit_planes=bit_planes, audio_channels=channels, delimiter="NULL Terminator")
+    text = b"The quick brown fox jumps over the lazy dog."
+
+    LSBEncoder().encode(str(carrier), text, settings, str(output), "audio")
+    assert LSBDecoder().decode(str(output), settings, "audio") == text
+
+
+@pytest.mark.parametrize("delimiter", ["NULL Terminator", "Magic Sequence", "Length Prefix"])
+def test_decode_spans_blocks(tmp_path, delimiter):
+    carrier = tmp_path / "carrier.png"
+    output = tmp_path / "carrier_steg.png"
+    make_image(300, 300).save(carrier)
+    settings = make_settings(delimiter=delimiter)
+    text = bytes(32 + (i * 7) % 90 for i in range(30000))
+
+    LSBEncoder().encode(str(carrier), text, settings, str(output), "image")
+    assert LSBDecoder().decode(str(output), settings, "image") == text
+    assert LSBDecoder().decode(str(output), settings, "image", max_bytes=100) == text[:100]
+
+
+@pytest.mark.parametrize("delimiter", ["NULL Terminator", "Magic Sequence", "Length Prefix"])
+def test_max_bytes_caps_payload_ending_in_first_chunk(tmp_path, delimiter):
+    # The delimiter is found in the same chunk as the cap is reached
+    carrier = tmp_path / "carrier.png"
+    output = tmp_path / "carrier_steg.png"
+    make_image(150, 150).save(carrier)
+    settings = make_settings(delimiter=delimiter)
+    text = bytes(32 + (i * 7) % 90 for i in range(5000))
+
+    LSBEncoder().encode(str(carrier), text, settings, str(output), "image")
+    assert LSBDecoder().decode(str(output), settings, "image", max_bytes=100) == text[:100]
+    assert LSBDecoder().decode(str(output), settings, "image", max_bytes=5000) == text
+
+
+@pytest.mark.parametrize("delimiter", ["NULL Terminator", "Magic Sequence"])
+def test_delimiter_split_across_chunks(delimiter):
+    data = b"payload" + (b"\0" if delimiter == "NULL Terminator" else b"1111111100000000") + b"trailing"
+    for split in range(1, len(data)):
+        scanner = DelimiterScanner(delimiter)
+        done = scanner.feed(data[:split]) or scanner.feed(data[split:])
+        assert done and scanner.payload() == b"payload"
+
+
+def test_binary_payload_round_trip(tmp_path):
+    carrier = tmp_path / "carrier.png"
+    output = tmp_path / "carrier_steg.png"
+    make_image(128, 128).save(carrier)
+    settings = make_settings(delimiter="Length Prefix")
+    payload = bytes(range(256)) * 8 + "naïve ✓".encode("utf-8")
+
+    LSBEncoder().encode(str(carrier), payload, settings, str(output), "image")
+    assert LSBDecoder().decode(str(output), settings, "image") == payload
+
+
+def test_payload_header_round_trip():
+    header = PayloadHeader(length=1234, flags=FLAG_ENCRYPTED, extra=b"params")
+    packed = header.pack()
+    assert PayloadHeader.unpack(packed[:HEADER_SIZE - 1]) is None
+    assert PayloadHeader.unpack(packed[:-1]) is None
+    assert PayloadHeader.unpack(packed + b"payload") == header
+    with pytest.raises(ValueError):
+        PayloadHeader.unpack(b"x" * HEADER_SIZE)
+
+
+@pytest.mark.parametrize("flags", [0, FLAG_ENCRYPTED])
+def test_header_longer_than_carrier_is_refused(tmp_path, flags):
+    # Plain payloads are drained as they arrive, Fernet tokens held whole
+    plan = make_plan(delimiter="Length Prefix")
+    forged = PayloadHeader(length=10**9, flags=flags).pack() + b"x" * 100
+    LSBEncoder().encode_message(make_image(60, 60), forged, plan).save(tmp_path / "forged.png")
+    settings = make_settings(delimiter="Length Prefix")
+    with pytest.raises(ValueError, match="incomplete"):
+        LSBDecoder().decode(str(tmp_path / "forged.png"), settings, "image")
+    if not flags:
+        assert LSBDecoder().decode(str(tmp_path / "forged.png"), settings, "image", max_bytes=50) == b"x" * 50
+
+
+@pytest.mark.parametrize("bit_planes", [1, 3])
+@pytest.mark.parametrize("suffix", [".bmp", ".wav"])
+def test_mapped_encode_matches_full_rewrite(tmp_path, bit_planes, suffix):
+    carrier = tmp_path / f"carrier{suffix}"
+    if suffix == ".bmp":
+        make_image(61, 37).save(carrier)
+        media, settings = "image", make_settings(bit_planes=bit_planes, color_channels=["R", "B"])
+    else:
+        sf.write(carrier, make_audio(), 8000, subtype="PCM_16")
+        media, settings = "audio", make_settings(bit_planes=bit_planes, audio_channels=["R"])
+    settings.update_settings({"delimiter": "Length Prefix"})
+    payload = bytes(range(200))
+    encoder = LSBEncoder()
+    plan = EmbeddingPlan.from_settings(settings, media)
+
+    mapped = tmp_path / f"mapped{suffix}"
+    assert encoder.encode_mapped(str(carrier), payload, plan, str(mapped), media) == str(mapped)
+    unused = tmp_path / f"unused{suffix}"
+    if media == "image":
+        expected = encoder.encode_message(Image.open(carrier).convert("RGB"), payload, plan)
+        assert np.array_equal(np.asarray(Image.open(mapped)), np.asarray(expected))
+    else:
+        expected = encoder.encode_message_audio(sf.read(carrier, dtype="int16")[0], payload, plan)
+        assert np.array_equal(sf.read(mapped, dtype="int16")[0], expected)
+
+    encoder.encode(str(carrier), b"in place", settings, str(unused), media, in_place=True)
+    assert not unused.exists()
+    assert LSBDecoder().decode(str(carrier), settings, media) == b"in place"
+
+
+# A tiny budget forces the payload across many blocks; a long tail after a
+# short payload is copied in the larger tail blocks
+@pytest.mark.parametrize("frames, size, budget", [(20000, 8000, 1), (50000, 500, 8192)])
+def test_streamed_audio_round_trip(tmp_path, frames, size, budget):
+    carrier = tmp_path / "carrier.flac"
+    output = tmp_path / "carrier_steg.flac"
+    sf.write(carrier, make_audio(frames=frames), 8000, subtype="PCM_16")
+    settings = make_settings(bit_planes=2, audio_channels=["L", "R"], delimiter="Length Prefix")
+    payload = bytes((i * 13) % 256 for i in range(size))
+
+    LSBEncoder(memory_budget=budget).encode(str(carrier), payload, settings, str(output), "audio")
+    original, _ = sf.read(carrier, dtype="int16")
+    encoded, _ = sf.read(output, dtype="int16")
+    expected = LSBEncoder().encode_message_audio(original.copy(), PayloadHeader(len(payload)).pack() + payload, EmbeddingPlan.from_settings(settings, "audio"))
+    assert np.array_equal(encoded, expected)
+    assert LSBDecoder(memory_budget=1).decode(str(output), settings, "audio") == payload
+
+
+@pytest.mark.parametrize("suffix", [".png", ".flac"])
+def test_progress_and_cancel(tmp_path, suffix):
+    carrier = tmp_path / f"carrier{suffix}"
+    output = tmp_path / f"carrier_steg{suffix}"
+    if suffix == ".png":
+        make_image(200, 150).save(carrier)
+        media = "image"
+    else:
+        sf.write(carrier, make_audio(frames=20000), 8000, subtype="PCM_16")
+        media = "audio"
+    settings = make_settings(delimiter="Length Prefix")
+    payload = bytes(range(256)) * 8
+
+    calls = []
+    LSBEncoder(memory_budget=1).encode(str(carrier), payload, settings, str(output), media, progress=lambda *p: calls.append(p))
+    assert len(calls) > 2 and calls[-1][0] == calls[-1][1]
+    assert [done for done, _ in calls] == sorted(done for done, _ in calls)
+
+    calls.clear()
+    assert LSBDecoder().decode(str(output), settings, media, progress=lambda *p: calls.append(p)) == payload
+    assert calls[-1][0] == calls[-1][1]
+
+    # Cancelling after the first block stops the encode and removes the partial output
+    output.unlink()
+    cancel = CancelToken()
+    with pytest.raises(OperationCancelled):
+        LSBEncoder(memory_budget=1).encode(str(carrier), payload, settings, str(output), media,
+                                           progress=lambda done, total: cancel.cancel(), cancel=cancel)
+    assert not output.exists()
+
+
+def test_cancel_in_place_reports_modified_carrier(tmp_path):
+    from core.progress import CarrierModified
+
+    carrier = tmp_path / "carrier.wav"
+    sf.write(carrier, make_audio(frames=20000), 8000, subtype="PCM_16")
+    original = carrier.read_bytes()
+    settings = make_settings(delimiter="Length Prefix")
+
+    # Cancelled before any block is written: a plain cancel, carrier untouched
+    cancel = CancelToken()
+    cancel.cancel()
+    with pytest.raises(OperationCancelled) as raised:
+        LSBEncoder().encode(str(carrier), b"payload", settings, str(tmp_path / "unused.wav"), "audio", in_place=True,
+                            cancel=cancel)
+    assert not isinstance(raised.value, CarrierModified)
+    assert carrier.read_bytes() == original
+
+    cancel = CancelToken()
+    with pytest.raises(CarrierModified, match="carrier.wav"):
+        LSBEncoder().encode(str(carrier), b"payload", settings, str(tmp_path / "unused.wav"), "audio", in_place=True,
+                            progress=lambda done, total: cancel.cancel(), cancel=cancel)
+    assert carrier.read_bytes() != original
+
+
+def test_waveform_envelope(tmp_path):
+    path = tmp_path / "long.wav"
+    data = make_audio(frames=300000)
+    sf.write(path, data, 8000, subtype="PCM_16")
+
+    envelope = load_envelope(str(path))
+    assert load_envelope(str(path)) is envelope
+    assert np.array_equal(envelope.levels[0][0], WaveformEnvelope.from_array(data, 8000).levels[0][0])
+    assert len(envelope.levels[-1][0]) <= 512 < len(envelope.levels[-2][0])
+
+    # The whole file at 500 px comes from a coarse level, with the true extremes
+    times, mins, maxs = envelope.view(0, envelope.duration, 500)
+    assert 500 <= len(times) < 4 * 500
+    assert np.isclose(mins.min(), data.min() / 32768) and np.isclose(maxs.max(), data.max() / 32768)
+
+    # Zoomed in below one bin per pixel, raw frames are read
+    times, mins, maxs = envelope.view(10, 10.01, 500)
+    assert mins is maxs and np.allclose(mins * 32768, data[80000:80080])
+
+
+@pytest.mark.parametrize("suffix", [".png", ".bmp", ".wav", ".flac"])
+def test_encode_result_holds_output(tmp_path, suffix):
+    carrier = tmp_path / f"carrier{suffix}"
+    output = tmp_path / f"carrier_steg{suffix}"
+    media = "image" if suffix in (".png", ".bmp") else "audio"
+    if media == "image":
+        make_image(64, 48).save(carrier)
+    else:
+        sf.write(carrier, make_audio(frames=5000), 8000, subtype="PCM_16")
+    settings = make_settings(delimiter="Length Prefix", bit_planes=2, color_channels=["R", "G"], audio_channels=["L"])
+    payload = bytes(range(200))
+
+    result = LSBEncoder().encode(str(carrier), payload, settings, str(output), media, preview=True)
+    assert result.wait() == str(output)
+    assert result.capacity_used == HEADER_SIZE + len(payload)
+    assert result.capacity_total == (64 * 48 * 2 * 2 if media == "image" else 5000 * 2) // 8
+    if media == "image":
+        assert np.array_equal(np.asarray(result.data), np.asarray(Image.open(output)))
+        if suffix == ".png":
+            # The preview is the raster the image was embedded in, not a copy
+            assert result.preview.layout == "RGBX" and result.preview.image is result.data
+            assert np.array_equal(result.preview.array[..., :3], np.asarray(result.data))
+    else:
+        assert np.allclose(result.preview.levels[0][1], load_envelope(str(output)).levels[0][1])
+
+
+@pytest.mark.parametrize("delimiter,encryption", [
+    (delimiter, encryption)
+    for delimiter in ["NULL Terminator", "Magic Sequence", "Length Prefix", "None"]
+    for encryption in ["None", "AES"]
+] + [("Length Prefix", "AES-GCM"), ("Length Prefix", "AES Stream")])
+def test_payload_capacity_is_exact(tmp_path, delimiter, encryption):
+    carrier = tmp_path / "carrier.png"
+    output = tmp_path / "carrier_steg.png"
+    make_image(37, 29).save(carrier)
+    settings = make_settings(delimiter=delimiter, encryption=encryption, password="pw", bit_planes=3, color_channels=["R", "B"])
+
+    capacity = payload_capacity(str(carrier), "image", settings)
+    assert capacity > 0
+    LSBEncoder().encode(str(carrier), b"\xff" * capacity, settings, str(output), "image")
+    if delimiter != "None":
+        assert LSBDecoder().decode(str(output), settings, "image") == b"\xff" * capacity
+    with pytest.raises(ValueError):
+        LSBEncoder().encode(str(carrier), b"\xff" * (capacity + 1), settings, str(output), "image")
+
+
+def test_embedding_plan_validates_settings():
+    plan = make_plan("audio", bit_planes=2, audio_channels=["R"])
+    assert (plan.bit_planes, plan.plane_mask, plan.delimiter) == (2, 0b11, "NULL Terminator")
+    assert plan.channel_indices(4).tolist() == [1, 2, 3]
+    assert make_plan(color_channels=["B", "R"]).channel_indices(layout="BGR").tolist() == [2, 0]
+
+    for values in ({"bit_planes": 9}, {"delimiter": "Comma"}, {"color_channels": ["R", "X"]}):
+        with pytest.raises(ValueError):
+            make_plan(**values)
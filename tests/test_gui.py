@@ -0,0 +1,167 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PySide6")
+pytest.importorskip("pytestqt")
+
+from PySide6.QtCore import QThreadPool
+
+from core.decoders.lsb import LSBDecoder
+from core.encoders.lsb import LSBEncoder
+from core.progress import CarrierModified, OperationCancelled
+from gui.main_window import MainWindow
+from gui.workers import IteratorWorker, OperationWorker
+from tests.conftest import make_image, make_settings
+
+LARGE = 1 << 33     # past a 32-bit int, as slot totals for large carriers are
+
+
+def run_worker(qtbot, worker, cancel=False):
+    # Start worker on the thread pool, optionally cancel it once it is
+    # running, and return every signal it emitted by name
+    emitted = {name: [] for name in ("progress", "item", "result", "error", "cancelled")}
+    for name, values in emitted.items():
+        getattr(worker.signals, name).connect(lambda *args, values=values: values.append(args))
+    with qtbot.waitSignal(worker.signals.finished, timeout=5000):
+        QThreadPool.globalInstance().start(worker)
+        if cancel:
+            worker.started.wait(5)
+            worker.cancel()
+    return emitted
+
+
+def wait_for_cancel(started, progress, cancel):
+    # A long operation: report progress, then poll the token as the core loops do
+    progress(1, LARGE)
+    started.set()
+    while True:
+        cancel.check()
+        threading.Event().wait(0.01)
+
+
+def test_operation_worker_completes(qtbot):
+    def double(value, progress=None, cancel=None):
+        progress(LARGE - 1, LARGE)
+        return 2 * value
+
+    emitted = run_worker(qtbot, OperationWorker(double, 21))
+    assert emitted["progress"] == [(LARGE - 1, LARGE)]
+    assert emitted["result"] == [(42,)]
+    assert not emitted["error"] and not emitted["cancelled"]
+
+
+def test_operation_worker_cancels_and_fails(qtbot):
+    started = threading.Event()
+    worker = OperationWorker(wait_for_cancel, started)
+    worker.started = started
+    emitted = run_worker(qtbot, worker, cancel=True)
+    assert emitted["cancelled"] == [()] and emitted["progress"] == [(1, LARGE)]
+    assert not emitted["result"] and not emitted["error"]
+
+    def fail(progress=None, cancel=None):
+        raise ValueError("bad carrier")
+
+    assert run_worker(qtbot, OperationWorker(fail))["error"] == [("bad carrier",)]
+
+    # A cancel that left the carrier modified is reported, not swallowed
+    def modified(progress=None, cancel=None):
+        raise CarrierModified("carrier.wav was modified")
+
+    emitted = run_worker(qtbot, OperationWorker(modified))
+    assert emitted["error"] == [("carrier.wav was modified",)] and not emitted["cancelled"]
+
+
+def test_iterator_worker(qtbot):
+    def count(n, progress=None, cancel=None):
+        for i in range(n):
+            progress(i + 1, n)
+            yield i
+
+    emitted = run_worker(qtbot, IteratorWorker(count, 3))
+    assert emitted["item"] == [(0,), (1,), (2,)] and emitted["result"] == [(3,)]
+    assert emitted["progress"] == [(1, 3), (2, 3), (3, 3)]
+
+    def first_then_wait(started, progress=None, cancel=None):
+        yield "first"
+        yield from wait_for_cancel(started, progress, cancel)
+
+    started = threading.Event()
+    worker = IteratorWorker(first_then_wait, started)
+    worker.started = started
+    emitted = run_worker(qtbot, worker, cancel=True)
+    assert emitted["item"] == [("first",)] and emitted["cancelled"] == [()] and not emitted["result"]
+
+
+@pytest.mark.parametrize("payload", [b"plain text payload", bytes(range(256)) * 4])
+def test_decode_steps_write_binary_payloads(qtbot, tmp_path, payload):
+    settings = make_settings(delimiter="Length Prefix")
+    make_image(80, 60).save(tmp_path / "carrier.png")
+    LSBEncoder().encode(str(tmp_path / "carrier.png"), payload, settings, str(tmp_path / "steg.png"), "image")
+
+    out_path = tmp_path / "steg_payload.bin"
+    worker = IteratorWorker(MainWindow._decode_steps, LSBDecoder(), str(tmp_path / "steg.png"), settings, "image",
+                            str(out_path))
+    emitted = run_worker(qtbot, worker)
+    assert emitted["result"] == [(1,)]
+    if payload.isascii():
+        assert emitted["item"] == [(payload.decode(),)] and not out_path.exists()
+    else:
+        assert emitted["item"] == [(f"Binary payload ({len(payload)} bytes) saved to {out_path}",)]
+        assert out_path.read_bytes() == payload
+
+
+def test_decode_steps_remove_partial_payload(tmp_path):
+    # A decode failing after the payload file was started leaves no file behind
+    class FailingDecoder:
+        def iter_decode(self, *args, progress=None, cancel=None):
+            yield b"\xff\xfe"
+            raise OperationCancelled("Operation cancelled")
+
+    out_path = tmp_path / "payload.bin"
+    with pytest.raises(OperationCancelled):
+        list(MainWindow._decode_steps(FailingDecoder(), "carrier.png", None, "image", str(out_path)))
+    assert not out_path.exists()
+
+
+def test_main_window_starts(qtbot):
+    window = MainWindow()
+    qtbot.addWidget(window)
+    assert window._worker is None and (window._batch_failed, window._batch_total) == (0, 0)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "LA", "I;16", "RGBX"])
+def test_pixmap_outlives_array(qtbot, mode):
+    import gc
+
+    from core.raster import new_raster
+
+    rng = np.random.default_rng(5)
+    width, height = 37, 11     # odd width: rows are not 4-byte aligned
+    if mode == "RGBX":
+        data = new_raster("RGB", (width, height))
+        data.array[...] = rng.integers(0, 256, data.array.shape, dtype=np.uint8)
+        expected = data.array[..., :3].copy()
+    else:
+        shape = {"RGB": (height, width, 3), "RGBA": (height, width, 4), "L": (height, width),
+                 "LA": (height, width, 2), "I;16": (height, width)}[mode]
+        dtype = np.uint16 if mode == "I;16" else np.uint8
+        data = rng.integers(0, np.iinfo(dtype).max + 1, shape, dtype=dtype)
+        if mode == "RGBA":
+            data[..., 3] = 255      # pixmaps premultiply; opaque keeps colors exact
+        expected = data[..., 0] if mode == "LA" else data.copy()
+        if mode == "I;16":
+            expected = expected >> 8
+    pixmap = MainWindow._pixmap_from_array(data)
+    del data
+    gc.collect()
+
+    image = pixmap.toImage()
+    assert (image.width(), image.height()) == (width, height)
+    for x, y in [(0, 0), (width - 1, 0), (3, height - 1), (width - 1, height - 1)]:
+        color = image.pixelColor(x, y)
+        if expected.ndim == 3:
+            assert (color.red(), color.green(), color.blue()) == tuple(expected[y, x, :3])
+        else:
+            assert color.red() == expected[y, x]
@@ -0,0 +1,65 @@
+import pytest
+
+from core.encoders.lsb import LSBEncoder
+from core.decoders.lsb import LSBDecoder
+from tests.conftest import make_settings, make_image
+
+
+class ListSink:
+    # Metrics sink keeping every span record
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_metrics_spans(tmp_path):
+    from core import metrics
+
+    assert metrics.span("encode") is metrics.span("decode")  # shared no-op while disabled
+    carrier, output = tmp_path / "carrier.png", tmp_path / "carrier_steg.png"
+    make_image(40, 30).save(carrier)
+    settings = make_settings(delimiter="Length Prefix", encryption="AES", password="pw")
+    sink, prometheus = metrics.add_sink(ListSink(), memory=True), metrics.add_sink(metrics.PrometheusSink())
+    try:
+        LSBEncoder().encode(str(carrier), b"secret" * 10, settings, str(output), "image")
+        assert LSBDecoder().decode(str(output), settings, "image") == b"secret" * 10
+    finally:
+        metrics.remove_sink(sink)
+        metrics.remove_sink(prometheus)
+
+    spans = [(r["operation"], r["name"]) for r in sink.records]
+    for name in ("encrypt", "frame", "load", "embed", "save", "encode"):
+        assert ("encode", name) in spans
+    for name in ("load", "extract", "decrypt", "decode"):
+        assert ("decode", name) in spans
+    root = next(r for r in sink.records if r["name"] == "encode")
+    assert root["parent"] is None and root["bytes"] == 60 and root["peak_bytes"] > 0
+    assert 'stega_pal_span_seconds_count{operation="decode",span="extract"} 1' in prometheus.render()
+
+
+@pytest.mark.parametrize("delimiter,encryption", [
+    ("Length Prefix", "None"), ("Length Prefix", "AES Stream"), ("NULL Terminator", "None"),
+])
+def test_decode_metrics_count_payload_bytes(tmp_path, delimiter, encryption):
+    from core import metrics
+    from core.crypto.stream import stream_size
+
+    # The carrier holds far more than the payload, and is scanned in one block
+    carrier, output = tmp_path / "carrier.png", tmp_path / "carrier_steg.png"
+    make_image(200, 150).save(carrier)
+    settings = make_settings(delimiter=delimiter, encryption=encryption, password="pw")
+    payload = b"payload " * 300
+    LSBEncoder().encode(str(carrier), payload, settings, str(output), "image")
+    sink = metrics.add_sink(ListSink())
+    try:
+        assert LSBDecoder().decode(str(output), settings, "image") == payload
+    finally:
+        metrics.remove_sink(sink)
+
+    spans = {r["name"]: r for r in sink.records}
+    embedded = stream_size(len(payload)) if encryption != "None" else len(payload)
+    assert spans["extract"]["bytes"] == embedded
+    if encryption != "None":
+        assert spans["decrypt"]["bytes"] == embedded
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.capacity import payload_capacity
+from core.encoders.lsb import LSBEncoder
+from core.decoders.lsb import LSBDecoder
+from core.framing import HEADER_SIZE
+from tests.conftest import make_settings, make_image
+
+
+def test_raster_shares_memory_with_image(tmp_path):
+    from core.raster import load_raster
+
+    pixels = np.asarray(make_image(50, 40))
+    gray = np.asarray(make_image(50, 40).convert("L"))
+    sources = [(Image.fromarray(pixels), "RGBX", (1, 2, 3)), (Image.fromarray(gray), "L", 7),
+               (Image.fromarray(gray.astype(np.uint16) * 257), "L", 40000)]
+    for source, layout, first in sources:
+        source.save(tmp_path / "in.png")
+        raster = load_raster(str(tmp_path / "in.png"))
+        assert raster.image.mode == source.mode and raster.layout == layout
+        assert np.array_equal(raster.array[..., :3] if layout == "RGBX" else raster.array[..., 0], np.asarray(source))
+
+        # Writes to the array are what the image saves
+        raster.array[0, 0, :len(layout) - layout.count("X")] = first
+        raster.image.save(tmp_path / "out.png")
+        assert Image.open(tmp_path / "out.png").getpixel((0, 0)) == first
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "LA", "I;16"])
+def test_encode_without_pillow_internals(tmp_path, monkeypatch, mode):
+    import core.raster
+    import core.tiles
+
+    rng = np.random.default_rng(11)
+    shape = {"RGB": (30, 40, 3), "RGBA": (30, 40, 4), "LA": (30, 40, 2), "I;16": (30, 40)}[mode]
+    dtype = np.uint16 if mode == "I;16" else np.uint8
+    Image.fromarray(rng.integers(0, np.iinfo(dtype).max + 1, shape, dtype=dtype)).save(tmp_path / "carrier.png")
+    settings = make_settings(delimiter="Length Prefix", color_channels=["R", "G", "A"])
+    payload = bytes(range(100))
+    for suffix in (".png", ".tif"):
+        LSBEncoder().encode(str(tmp_path / "carrier.png"), payload, settings, str(tmp_path / f"shared{suffix}"), "image")
+
+    # Public Pillow API only: rasters hold their own arrays, PNGs are decoded whole
+    for check in ("shares_memory", "decodes_in_place"):
+        monkeypatch.setattr(core.raster, check, lambda: False)
+    monkeypatch.setattr(core.tiles, "read_prefix", lambda path, rows: None)
+    assert core.raster.new_raster(mode, (4, 3)).image is None
+    for suffix in (".png", ".tif"):
+        output = tmp_path / f"public{suffix}"
+        LSBEncoder().encode(str(tmp_path / "carrier.png"), payload, settings, str(output), "image")
+        assert Image.open(output).mode == Image.open(tmp_path / f"shared{suffix}").mode
+        assert np.array_equal(np.asarray(Image.open(output)), np.asarray(Image.open(tmp_path / f"shared{suffix}")))
+        assert LSBDecoder().decode(str(output), settings, "image") == payload
+
+
+def write_tiff16(path, pixels):
+    # Minimal uncompressed little-endian TIFF of a (height, width, 3 or 4) uint16 array
+    import struct
+
+    height, width, channels = pixels.shape
+    data = pixels.astype("<u2").tobytes()
+    blob_offset = 8 + len(data)
+    bits = struct.pack("<" + "H" * channels, *[16] * channels)
+    entries = [(256, 4, 1, width), (257, 4, 1, height), (258, 3, channels, blob_offset), (259, 3, 1, 1),
+               (262, 3, 1, 2), (273, 4, 1, 8), (277, 3, 1, channels), (278, 4, 1, height),
+               (279, 4, 1, len(data)), (284, 3, 1, 1)] + [(338, 3, 1, 2)] * (channels == 4)
+    ifd = struct.pack("<H", len(entries)) + b"".join(struct.pack("<HHII", *entry) for entry in entries) + bytes(4)
+    with open(path, "wb") as f:
+        f.write(b"II*\0" + struct.pack("<I", blob_offset + len(bits)) + data + bits + ifd)
+
+
+@pytest.mark.parametrize("mode", ["L", "LA", "I;16", "RGBA", "RGB;16", "RGBA;16"])
+def test_native_mode_round_trip(tmp_path, mode):
+    rng = np.random.default_rng(3)
+    settings = make_settings(delimiter="Length Prefix", bit_planes=2, color_channels=["R", "A"])
+    payload = bytes(range(200))
+    if mode in ("RGB;16", "RGBA;16"):
+        carrier, output = tmp_path / "carrier.tif", tmp_path / "carrier_steg.tif"
+        pixels = rng.integers(0, 65536, (30, 40, 4 if mode == "RGBA;16" else 3), dtype=np.uint16)
+        write_tiff16(carrier, pixels)
+        read = lambda path: np.memmap(path, dtype="<u2", mode="r", offset=8, shape=pixels.shape)
+    else:
+        carrier, output = tmp_path / "carrier.png", tmp_path / "carrier_steg.png"
+        shape = {"L": (30, 40), "LA": (30, 40, 2), "RGBA": (30, 40, 4), "I;16": (30, 40)}[mode]
+        dtype = np.uint16 if mode == "I;16" else np.uint8
+        Image.fromarray(rng.integers(0, np.iinfo(dtype).max + 1, shape, dtype=dtype)).save(carrier)
+        assert Image.open(carrier).mode == mode
+        read = lambda path: np.asarray(Image.open(path))
+        pixels = read(carrier)
+
+    result = LSBEncoder().encode(str(carrier), payload, settings, str(output), "image")
+    assert LSBDecoder().decode(str(output), settings, "image") == payload
+    embedded = read(output)
+    assert embedded.dtype == pixels.dtype and embedded.shape == pixels.shape
+    # Only the two lowest bit planes of the gray or red and the alpha samples change
+    assert np.all((embedded ^ pixels) < 4)
+    if pixels.ndim == 3:
+        used = {"LA": {0, 1}, "RGBA": {0, 3}, "RGB;16": {0}, "RGBA;16": {0, 3}}[mode]
+        assert set(np.nonzero(embedded != pixels)[2]) == used
+    has_alpha = "A" in mode
+    assert payload_capacity(str(carrier), "image", settings) == 30 * 40 * (1 + has_alpha) * 2 // 8 - HEADER_SIZE
+    assert result.capacity_total == 30 * 40 * (1 + has_alpha) * 2 // 8
+
+
+def test_sixteen_bit_rgb_png_is_refused(tmp_path):
+    import zlib, struct
+
+    # A 2x2 RGB PNG with 16-bit samples, which Pillow can only load as 8-bit
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\0" + bytes(range(12)) for _ in range(2))
+    png = (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 2, 2, 16, 2, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+    (tmp_path / "deep.png").write_bytes(png)
+    settings = make_settings(delimiter="Length Prefix")
+    with pytest.raises(ValueError, match="16-bit"):
+        LSBEncoder().encode(str(tmp_path / "deep.png"), b"x", settings, str(tmp_path / "out.png"), "image")
+
+
+@pytest.mark.parametrize("channels", [["A"], ["R", "A"], ["R", "G", "B"]])
+def test_rgba_to_bmp_round_trip(tmp_path, channels):
+    # BMP output holds no alpha: refused while payload goes in it, else the
+    # carrier is embedded as RGB
+    rng = np.random.default_rng(5)
+    carrier, output = tmp_path / "carrier.png", tmp_path / "carrier_steg.bmp"
+    Image.fromarray(rng.integers(0, 256, (30, 40, 4), dtype=np.uint8), "RGBA").save(carrier)
+    settings = make_settings(delimiter="Length Prefix", color_channels=channels)
+    payload = bytes(range(100))
+    if "A" in channels:
+        with pytest.raises(ValueError, match="alpha"):
+            LSBEncoder().encode(str(carrier), payload, settings, str(output), "image")
+        assert not output.exists()
+        return
+    LSBEncoder().encode(str(carrier), payload, settings, str(output), "image")
+    assert Image.open(output).mode == "RGB"
+    assert LSBDecoder().decode(str(output), settings, "image") == payload
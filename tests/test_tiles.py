@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.encoders.lsb import LSBEncoder
+from core.decoders.lsb import LSBDecoder
+from tests.conftest import make_settings, make_plan, make_image
+
+
+def test_tiled_encode_matches_whole_image(tmp_path):
+    carrier = tmp_path / "carrier.png"
+    output = tmp_path / "carrier_steg.png"
+    make_image(97, 80).save(carrier)
+    plan = make_plan(bit_planes=3, color_channels=["G", "B"])
+    payload = bytes(range(256)) * 4
+
+    # A tiny budget gives one-row strips
+    LSBEncoder(memory_budget=1).encode_image_tiled(str(carrier), payload, plan, str(output))
+    expected = LSBEncoder().encode_message(Image.open(carrier).convert("RGB"), payload, plan)
+    assert np.array_equal(np.asarray(Image.open(output)), np.asarray(expected))
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "I;16"])
+def test_png_stream_matches_decoded_encode(tmp_path, monkeypatch, mode):
+    import core.tiles
+    from PIL import PngImagePlugin
+
+    # Smooth rows, so Pillow filters most of them against the row above
+    rng = np.random.default_rng(7)
+    ramp = np.add.outer(np.arange(80), np.arange(97)) * (200 if mode == "I;16" else 1)
+    shape = {"RGB": (80, 97, 3), "RGBA": (80, 97, 4)}.get(mode, (80, 97))
+    pixels = (ramp.reshape(80, 97, *[1] * (len(shape) - 2)) + rng.integers(0, 3, shape)).astype(
+        np.uint16 if mode == "I;16" else np.uint8)
+    carrier = tmp_path / "carrier.png"
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Comment", "kept")
+    Image.fromarray(pixels).save(carrier, pnginfo=info)
+    settings = make_settings(delimiter="Length Prefix", bit_planes=2, color_channels=["G", "A"])
+    payload = bytes(range(256)) * 3
+
+    # Small IDAT chunks and one-row strips
+    monkeypatch.setattr(core.tiles, "IDAT_SIZE", 512)
+    LSBEncoder(memory_budget=1).encode(str(carrier), payload, settings, str(tmp_path / "streamed.png"), "image")
+    LSBEncoder().encode(str(carrier), payload, settings, str(tmp_path / "decoded.tif"), "image")
+    streamed = Image.open(tmp_path / "streamed.png")
+    assert streamed.mode == Image.open(carrier).mode and streamed.text == {"Comment": "kept"}
+    assert np.array_equal(np.asarray(streamed), np.asarray(Image.open(tmp_path / "decoded.tif")))
+    assert LSBDecoder().decode(str(tmp_path / "streamed.png"), settings, "image") == payload
+
+
+def test_decode_without_partial_png_decode(tmp_path, monkeypatch):
+    import core.tiles
+
+    make_image(120, 90).save(tmp_path / "carrier.png")
+    settings = make_settings(delimiter="Length Prefix", bit_planes=2)
+    payload = os.urandom(2000)
+    LSBEncoder().encode(str(tmp_path / "carrier.png"), payload, settings, str(tmp_path / "steg.png"), "image")
+    assert core.tiles.read_prefix(str(tmp_path / "steg.png"), 3).size == (120, 3)
+    partial = LSBDecoder(memory_budget=4096).decode(str(tmp_path / "steg.png"), settings, "image")
+
+    # Without the Pillow internals read_prefix falls back and strips are cut
+    # from the fully decoded image
+    fallbacks = []
+    monkeypatch.setattr(core.tiles, "read_prefix", lambda path, rows: fallbacks.append(rows))
+    full = LSBDecoder(memory_budget=4096).decode(str(tmp_path / "steg.png"), settings, "image")
+    assert fallbacks and full == partial == payload
+
+
+def test_carrier_pixel_limit_is_scoped(tmp_path, monkeypatch):
+    from core.tiles import open_carrier
+
+    # Carriers open past Pillow's bomb limit; the limit itself is left alone
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    make_image(96, 64).save(tmp_path / "carrier.png")
+    settings = make_settings(delimiter="Length Prefix")
+    for suffix in (".png", ".tif"):
+        output = tmp_path / f"carrier_steg{suffix}"
+        LSBEncoder().encode(str(tmp_path / "carrier.png"), b"payload", settings, str(output), "image")
+        assert LSBDecoder().decode(str(output), settings, "image") == b"payload"
+        assert open_carrier(str(output)).size == (96, 64)
+    assert Image.MAX_IMAGE_PIXELS == 1000
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(tmp_path / "carrier.png")